@@ -0,0 +1,55 @@
+# =========================================
+# Tiempos de arranque
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Mide cuánto tarda la app en importarse y prepararse, y
+# cuánto tarda la primera petición de cada proceso (el arranque en frío
+# que ve quien escribe justo después de un despliegue)
+# =========================================
+#
+# Fases (segundos):
+#   importacion       desde la primera línea de bot_credito hasta que
+#                     terminó de cargarse
+#   preparacion       crear_app(): calentamiento antes del fork
+#   primera_peticion  la primera petición que atiende cada worker
+# Se exponen en /metrics como bot_arranque_segundos{fase, pid} y se
+# registran una vez en el log (nivel INFO).
+
+import logging
+import os
+import time
+
+registro = logging.getLogger(__name__)
+
+
+class TiemposArranque:
+    def __init__(self, inicio):
+        self.inicio = inicio  # time.perf_counter() al empezar a importar
+        self.fases = {}
+        self._pid_primera = None
+
+    def marcar(self, fase, desde=None):
+        # Segundos desde "desde" (o desde que empezó la importación)
+        segundos = time.perf_counter() - (self.inicio if desde is None else desde)
+        self.fases[fase] = segundos
+        registro.info("Arranque (%d): %s en %.1f ms", os.getpid(), fase, segundos * 1000)
+        return segundos
+
+    def envolver_wsgi(self, wsgi_app):
+        # Mide solo la primera petición de cada proceso; las demás pagan
+        # una comparación
+        def aplicacion(environ, start_response):
+            if self._pid_primera == os.getpid():
+                return wsgi_app(environ, start_response)
+            self._pid_primera = os.getpid()
+            inicio = time.perf_counter()
+            try:
+                return wsgi_app(environ, start_response)
+            finally:
+                self.marcar("primera_peticion", inicio)
+
+        return aplicacion
+
+    def valores(self):
+        # Para un medidor con etiquetas (fase, pid)
+        pid = str(os.getpid())
+        return {(fase, pid): segundos for fase, segundos in self.fases.items()}
@@ -0,0 +1,311 @@
+# =========================================
+# Benchmarks del bot de crédito
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Mide los cálculos financieros y el flujo completo del
+# webhook, guarda los resultados en JSON y los compara con una línea base
+# =========================================
+#
+# Uso (desde la raíz del repositorio):
+#   python benchmarks/benchmarks_credito.py                      # corre y compara
+#   python benchmarks/benchmarks_credito.py --guardar-linea-base # fija la línea base
+#   python benchmarks/benchmarks_credito.py --solo micro         # solo cálculos
+#
+# La corrida falla (código de salida 1) si algún caso pierde más de
+# --tolerancia-rendimiento de operaciones por segundo, o si su p99 crece
+# más de --tolerancia-p99, respecto a la línea base. Cada caso se corre
+# --rondas veces y se reporta la mediana, porque el p99 de una sola ronda
+# varía demasiado entre corridas.
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from calculos import (  # noqa: E402
+    calcular_pago_fijo_excel,
+    calcular_ahorro_por_abonos,
+    calcular_costo_credito_tienda
+)
+
+LINEA_BASE = os.path.join(RAIZ, "benchmarks", "linea_base.json")
+SEMILLA = 20240601
+
+# =========================================
+# Distribuciones de datos realistas
+# =========================================
+
+TASAS_MENSUALES = ["0.008", "0.012", "0.015", "0.02", "0.025", "0.03", "0.045"]
+TASAS_HIPOTECARIAS = ["0.006", "0.0075", "0.0085", "0.0095", "0.011"]  # Plazos largos
+PLAZOS_CORTOS = [6, 12, 18, 24, 36, 48]
+
+
+def _monto(rng):
+    # Montos de consumo con cola larga hacia créditos grandes
+    return round(min(rng.lognormvariate(10.5, 1.0), 5_000_000), 2)
+
+
+def datos_pago_fijo(rng, cantidad):
+    datos = []
+    for _ in range(cantidad):
+        plazo = rng.choice(PLAZOS_CORTOS + [120, 240, 360])
+        tasas = TASAS_HIPOTECARIAS if plazo > 60 else TASAS_MENSUALES
+        datos.append((_monto(rng), rng.choice(tasas), plazo))
+    return datos
+
+
+def datos_ahorro(rng, cantidad, plazo, desde):
+    tasas = TASAS_HIPOTECARIAS if plazo > 60 else TASAS_MENSUALES
+    datos = []
+    for _ in range(cantidad):
+        monto = _monto(rng)
+        tasa = rng.choice(tasas)
+        abono = round(monto * rng.uniform(0.002, 0.02), 2)
+        datos.append((monto, tasa, plazo, abono, desde(plazo, rng)))
+    return datos
+
+
+def datos_tienda(rng, cantidad):
+    datos = []
+    for _ in range(cantidad):
+        precio = round(rng.uniform(800, 60000), 2)
+        num_pagos = rng.choice([6, 12, 18, 24, 52, 104])
+        sobreprecio = rng.uniform(1.05, 2.2)
+        datos.append((precio, round(precio * sobreprecio / num_pagos, 2), num_pagos))
+    return datos
+
+# =========================================
+# Medición
+# =========================================
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return 0.0
+    indice = min(len(valores_ordenados) - 1, int(round(p / 100 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+def resumir(duraciones_ns, segundos_totales):
+    duraciones = sorted(duraciones_ns)
+    return {
+        "operaciones": len(duraciones),
+        "ops_por_segundo": round(len(duraciones) / segundos_totales, 1) if segundos_totales else 0.0,
+        "p50_us": round(percentil(duraciones, 50) / 1000, 2),
+        "p95_us": round(percentil(duraciones, 95) / 1000, 2),
+        "p99_us": round(percentil(duraciones, 99) / 1000, 2),
+        "max_us": round(duraciones[-1] / 1000, 2) if duraciones else 0.0,
+    }
+
+
+def mediana_de_rondas(rondas):
+    # Cada métrica se reporta como la mediana entre rondas, para que una
+    # ronda con ruido (otro proceso, el recolector de basura) no decida
+    return {
+        clave: sorted(ronda[clave] for ronda in rondas)[len(rondas) // 2]
+        for clave in rondas[0]
+    }
+
+
+def medir(funcion, datos, rondas):
+    # Una vuelta de calentamiento y luego se mide cada llamada
+    for argumentos in datos[:50]:
+        funcion(*argumentos)
+    resultados = []
+    for _ in range(rondas):
+        duraciones = []
+        inicio = time.perf_counter()
+        for argumentos in datos:
+            t0 = time.perf_counter_ns()
+            funcion(*argumentos)
+            duraciones.append(time.perf_counter_ns() - t0)
+        resultados.append(resumir(duraciones, time.perf_counter() - inicio))
+    return mediana_de_rondas(resultados)
+
+
+def benchmarks_micro(cantidad, rondas):
+    rng = random.Random(SEMILLA)
+    temprano = lambda plazo, rng: rng.randint(1, 3)
+    tardio = lambda plazo, rng: rng.randint(plazo * 2 // 3, plazo - 1)
+    casos = {
+        "pago_fijo": (calcular_pago_fijo_excel, datos_pago_fijo(rng, cantidad)),
+        "ahorro_12_temprano": (calcular_ahorro_por_abonos, datos_ahorro(rng, cantidad, 12, temprano)),
+        "ahorro_12_tardio": (calcular_ahorro_por_abonos, datos_ahorro(rng, cantidad, 12, tardio)),
+        "ahorro_360_temprano": (calcular_ahorro_por_abonos, datos_ahorro(rng, cantidad, 360, temprano)),
+        "ahorro_360_tardio": (calcular_ahorro_por_abonos, datos_ahorro(rng, cantidad, 360, tardio)),
+        "costo_tienda": (calcular_costo_credito_tienda, datos_tienda(rng, cantidad)),
+    }
+    return {nombre: medir(funcion, datos, rondas) for nombre, (funcion, datos) in casos.items()}
+
+# =========================================
+# Flujo completo por /webhook
+# =========================================
+
+CONVERSACIONES = [
+    ["hola", "1", "{monto}", "{plazo}", "{tasa}", "sí", "{abono}", "{desde}"],
+    ["hola", "1", "{monto}", "12/24/36/48", "0.015/0.02/0.025/0.03"],
+    ["3", "{precio}", "{cuota}", "{pagos}"],
+    ["4", "{ingreso}", "1800", "5000", "2", "1", "{plazo}", "{tasa}"],
+    ["4", "{ingreso}", "1800", "5000", "1", "2", "{monto}", "{plazo}", "{tasa}"],
+    ["8", "sí", "reporte"],
+    ["5"],
+]
+
+
+def _conversacion(rng):
+    plantilla = rng.choice(CONVERSACIONES)
+    valores = {
+        "monto": str(_monto(rng)),
+        "plazo": str(rng.choice(PLAZOS_CORTOS)),
+        "tasa": rng.choice(TASAS_MENSUALES),
+        "abono": str(rng.choice([200, 500, 1000, 2500])),
+        "desde": str(rng.randint(1, 6)),
+        "precio": str(rng.randint(800, 30000)),
+        "cuota": str(rng.randint(150, 3000)),
+        "pagos": str(rng.choice([6, 12, 18, 24])),
+        "ingreso": str(rng.randint(8000, 60000)),
+    }
+    return [paso.format(**valores) for paso in plantilla]
+
+
+def _payload(numero, texto, timestamp):
+    return {"object": "whatsapp_business_account", "entry": [{"changes": [{"value": {
+        "messaging_product": "whatsapp",
+        "messages": [{
+            "from": numero, "id": f"wamid.{numero}.{timestamp}", "timestamp": str(timestamp),
+            "type": "text", "text": {"body": texto}
+        }],
+    }}]}]}
+
+
+def benchmark_webhook(usuarios, rondas):
+    rondas_post = []
+    rondas_completo = []
+    for ronda in range(rondas):
+        post, completo = _ronda_webhook(usuarios, ronda)
+        rondas_post.append(post)
+        rondas_completo.append(completo)
+    return {
+        "webhook_post": mediana_de_rondas(rondas_post),
+        "webhook_completo": mediana_de_rondas(rondas_completo),
+    }
+
+
+def _ronda_webhook(usuarios, ronda):
+    import bot_credito
+
+    rng = random.Random(SEMILLA + ronda)
+    conversaciones = {f"521{ronda:02d}{i:07d}": _conversacion(rng) for i in range(usuarios)}
+
+    # Envío simulado: registra cuándo sale cada respuesta para medir la
+    # latencia completa (POST -> respuesta enviada)
+    enviados_en = {}
+    candado = threading.Lock()
+    latencias_completas = []
+
+    def enviar_simulado(numero, texto):
+        ahora = time.perf_counter_ns()
+        with candado:
+            latencias_completas.append(ahora - enviados_en[numero].pop(0))
+
+    bot_credito.enviar_mensaje = enviar_simulado
+    cliente = bot_credito.app.test_client()
+
+    # Los usuarios avanzan intercalados, un paso a la vez, como en la vida real
+    latencias_post = []
+    inicio = time.perf_counter()
+    paso = 0
+    pendientes = True
+    while pendientes:
+        pendientes = False
+        for numero, mensajes in conversaciones.items():
+            if paso >= len(mensajes):
+                continue
+            pendientes = True
+            t0 = time.perf_counter_ns()
+            with candado:
+                enviados_en.setdefault(numero, []).append(t0)
+            respuesta = cliente.post("/webhook", json=_payload(numero, mensajes[paso], paso))
+            latencias_post.append(time.perf_counter_ns() - t0)
+            if respuesta.status_code != 200:
+                raise RuntimeError(f"/webhook respondió {respuesta.status_code}")
+        paso += 1
+    bot_credito.cola_mensajes.esperar_vacia(timeout=120)
+    segundos = time.perf_counter() - inicio
+
+    return resumir(latencias_post, segundos), resumir(latencias_completas, segundos)
+
+# =========================================
+# Comparación con la línea base
+# =========================================
+
+def comparar(resultados, linea_base, tolerancia_rendimiento, tolerancia_p99):
+    regresiones = []
+    for nombre, actual in resultados["casos"].items():
+        base = linea_base.get("casos", {}).get(nombre)
+        if base is None:
+            continue
+        if actual["ops_por_segundo"] < base["ops_por_segundo"] * (1 - tolerancia_rendimiento):
+            regresiones.append(
+                f"{nombre}: {actual['ops_por_segundo']} ops/s contra {base['ops_por_segundo']} de la línea base"
+            )
+        if actual["p99_us"] > base["p99_us"] * (1 + tolerancia_p99):
+            regresiones.append(f"{nombre}: p99 de {actual['p99_us']} µs contra {base['p99_us']} µs de la línea base")
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del bot de crédito")
+    parser.add_argument("--solo", choices=["micro", "webhook"], help="Corre solo un grupo de benchmarks")
+    parser.add_argument("--cantidad", type=int, default=2000, help="Entradas por caso de micro-benchmark")
+    parser.add_argument("--usuarios", type=int, default=300, help="Conversaciones simuladas en /webhook")
+    parser.add_argument("--rondas", type=int, default=5, help="Rondas por caso (se reporta la mediana)")
+    parser.add_argument("--salida", default=os.path.join(RAIZ, "benchmarks", "resultados.json"))
+    parser.add_argument("--linea-base", default=LINEA_BASE)
+    parser.add_argument("--guardar-linea-base", action="store_true")
+    parser.add_argument("--tolerancia-rendimiento", type=float, default=0.20)
+    parser.add_argument("--tolerancia-p99", type=float, default=0.30)
+    args = parser.parse_args(argv)
+
+    casos = {}
+    if args.solo in (None, "micro"):
+        casos.update(benchmarks_micro(args.cantidad, args.rondas))
+    if args.solo in (None, "webhook"):
+        casos.update(benchmark_webhook(args.usuarios, args.rondas))
+
+    resultados = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "maquina": platform.machine(),
+        "casos": casos,
+    }
+    with open(args.salida, "w", encoding="utf-8") as archivo:
+        json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+
+    for nombre, caso in casos.items():
+        print(f"{nombre:22} {caso['ops_por_segundo']:>12} ops/s   p50 {caso['p50_us']:>10} µs   p99 {caso['p99_us']:>10} µs")
+
+    if args.guardar_linea_base:
+        with open(args.linea_base, "w", encoding="utf-8") as archivo:
+            json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+        print(f"Línea base guardada en {args.linea_base}")
+        return 0
+
+    if not os.path.exists(args.linea_base):
+        print("No hay línea base para comparar (usa --guardar-linea-base)")
+        return 0
+    with open(args.linea_base, encoding="utf-8") as archivo:
+        linea_base = json.load(archivo)
+    regresiones = comparar(resultados, linea_base, args.tolerancia_rendimiento, args.tolerancia_p99)
+    for regresion in regresiones:
+        print(f"REGRESIÓN {regresion}")
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
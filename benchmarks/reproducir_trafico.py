@@ -0,0 +1,308 @@
+# =========================================
+# Reproducción de tráfico grabado contra /webhook
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Vuelve a mandar al bot el tráfico grabado con
+# GRABAR_TRAFICO (ver grabacion.py), al ritmo original, a una tasa fija
+# o multiplicado, y reporta rendimiento, errores y latencias por paso
+# de la conversación
+# =========================================
+#
+# Uso (desde la raíz del repositorio):
+#   GRABAR_TRAFICO=trafico.ndjson SAL_GRABACION=secreto gunicorn bot_credito:app
+#   python benchmarks/reproducir_trafico.py trafico.ndjson                 # ritmo original
+#   python benchmarks/reproducir_trafico.py trafico.ndjson --velocidad 10  # 10 veces más rápido
+#   python benchmarks/reproducir_trafico.py trafico.ndjson --tasa 200      # 200 entregas por segundo
+#   python benchmarks/reproducir_trafico.py trafico.ndjson --copias 5      # 5 veces el tráfico
+#   python benchmarks/reproducir_trafico.py trafico.ndjson --generar-sintetico 300
+#
+# La app corre en este mismo proceso (cliente de pruebas de Flask) con
+# el envío a WhatsApp simulado. Con --copias cada copia usa números
+# nuevos y un pequeño desfase, así que son conversaciones distintas.
+# Los mensajes de cada número se mandan siempre desde el mismo hilo y
+# en su orden original, igual que los escribió la persona.
+#
+# La latencia va desde que se manda el POST hasta que la respuesta del
+# mensaje está lista para enviarse, y se agrupa por el paso en que iba
+# la conversación al llegar el mensaje ("menu" si no iba en ninguno).
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from benchmarks_credito import SEMILLA, _conversacion, percentil  # noqa: E402
+from grabacion import GrabadorTrafico, leer_grabacion  # noqa: E402
+from metricas import LIMITES_SEGUNDOS  # noqa: E402
+
+PERCENTILES = (50, 95, 99, 99.9)
+
+# =========================================
+# Plan de envío
+# =========================================
+
+def cargar_entregas(ruta):
+    # [(segundos desde la primera entrega, [(numero, texto), ...])]. Con
+    # varios workers las líneas pueden quedar un poco desordenadas.
+    entregas = sorted(leer_grabacion(ruta), key=lambda entrega: entrega[0])
+    if not entregas:
+        raise SystemExit(f"La grabación {ruta} no tiene entregas")
+    inicio = entregas[0][0]
+    return [
+        (momento - inicio, [(numero, texto) for numero, texto, _ in mensajes])
+        for momento, mensajes in entregas
+    ]
+
+
+def _numero_copia(numero, copia):
+    return numero if copia == 0 else f"{numero}{copia:03d}"
+
+
+def planear(entregas, velocidad=1.0, tasa=None, copias=1, semilla=SEMILLA):
+    # Regresa [(segundo de envío, numero, [texto, ...])] ordenado por
+    # tiempo. Una entrega con mensajes de varios números se separa por
+    # número, para que cada número tenga un solo hilo de envío.
+    if tasa:
+        # La tasa es el total de entregas por segundo, sumando las copias
+        tiempos = [i * copias / tasa for i in range(len(entregas))]
+    else:
+        tiempos = [momento / velocidad for momento, _ in entregas]
+    hueco = tiempos[-1] / len(tiempos)
+
+    rng = random.Random(semilla)
+    plan = []
+    for copia in range(copias):
+        desfase = rng.uniform(0, hueco) if copia else 0.0
+        for tiempo, (_, mensajes) in zip(tiempos, entregas):
+            por_numero = {}
+            for numero, texto in mensajes:
+                por_numero.setdefault(_numero_copia(numero, copia), []).append(texto)
+            for numero, textos in por_numero.items():
+                plan.append((tiempo + desfase, numero, textos))
+    plan.sort(key=lambda envio: envio[0])
+    return plan
+
+
+def _payload(numero, textos, consecutivo):
+    # Ids nuevos en cada corrida, para que la deduplicación no descarte
+    # nada al repetir la misma grabación
+    return {"object": "whatsapp_business_account", "entry": [{"changes": [{"value": {
+        "messaging_product": "whatsapp",
+        "messages": [
+            {
+                "from": numero, "id": f"wamid.replay.{consecutivo}.{i}", "timestamp": str(consecutivo),
+                "type": "text", "text": {"body": texto}
+            }
+            for i, texto in enumerate(textos)
+        ],
+    }}]}]}
+
+# =========================================
+# Reproducción
+# =========================================
+
+class Medicion:
+    def __init__(self):
+        self.candado = threading.Lock()
+        self.enviados = {}      # numero -> deque de perf_counter_ns de cada mensaje en camino
+        self.latencias = {}     # estado -> [ns]
+        self.latencias_post = []
+        self.entregas = 0
+        self.rechazadas = 0     # /webhook respondió algo distinto de 200
+        self.errores = 0        # excepciones al procesar un mensaje
+
+    def registrar_envio(self, numero, cantidad, inicio_ns):
+        with self.candado:
+            fila = self.enviados.setdefault(numero, deque())
+            fila.extend([inicio_ns] * cantidad)
+
+    def cancelar_envio(self, numero, cantidad):
+        # La entrega no se encoló: sus mensajes son los últimos de la fila
+        with self.candado:
+            fila = self.enviados[numero]
+            for _ in range(cantidad):
+                fila.pop()
+
+    def registrar_respuesta(self, numero, estado, fallo):
+        ahora = time.perf_counter_ns()
+        with self.candado:
+            inicio = self.enviados[numero].popleft()
+            self.latencias.setdefault(estado, []).append(ahora - inicio)
+            if fallo:
+                self.errores += 1
+
+
+def preparar_app(medicion):
+    # Importa la app sin grabar y con el envío simulado; cada mensaje
+    # procesado se mide con el paso en que iba su conversación
+    import bot_credito
+
+    bot_credito.grabador_trafico = None
+    bot_credito.enviar_mensaje = lambda numero, texto: None
+    procesar_original = bot_credito.procesar_mensaje
+
+    def procesar_medido(mensaje, numero):
+        guardado = bot_credito.almacen_sesiones.obtener(numero)
+        estado = (guardado or {}).get("esperando") or "menu"
+        fallo = True
+        try:
+            respuesta = procesar_original(mensaje, numero)
+            fallo = False
+            return respuesta
+        finally:
+            medicion.registrar_respuesta(numero, estado, fallo)
+
+    bot_credito.procesar_mensaje = procesar_medido
+    return bot_credito
+
+
+def reproducir(plan, hilos=8, timeout=300):
+    medicion = Medicion()
+    bot_credito = preparar_app(medicion)
+
+    # Cada número siempre cae en el mismo hilo
+    porciones = [[] for _ in range(hilos)]
+    for consecutivo, (tiempo, numero, textos) in enumerate(plan):
+        porciones[zlib.crc32(numero.encode("utf-8")) % hilos].append((tiempo, numero, textos, consecutivo))
+
+    inicio = time.perf_counter()
+
+    def enviar(porcion):
+        cliente = bot_credito.app.test_client()
+        for tiempo, numero, textos, consecutivo in porcion:
+            espera = inicio + tiempo - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            t0 = time.perf_counter_ns()
+            medicion.registrar_envio(numero, len(textos), t0)
+            respuesta = cliente.post("/webhook", json=_payload(numero, textos, consecutivo))
+            with medicion.candado:
+                medicion.latencias_post.append(time.perf_counter_ns() - t0)
+                medicion.entregas += 1
+            if respuesta.status_code != 200:
+                medicion.cancelar_envio(numero, len(textos))
+                with medicion.candado:
+                    medicion.rechazadas += 1
+
+    trabajadores = [threading.Thread(target=enviar, args=(porcion,)) for porcion in porciones if porcion]
+    for trabajador in trabajadores:
+        trabajador.start()
+    for trabajador in trabajadores:
+        trabajador.join()
+    bot_credito.cola_mensajes.esperar_vacia(timeout=timeout)
+    return medicion, time.perf_counter() - inicio
+
+# =========================================
+# Resultados
+# =========================================
+
+def resumir_latencias(duraciones_ns):
+    duraciones = sorted(duraciones_ns)
+    resumen = {"mensajes": len(duraciones)}
+    for p in PERCENTILES:
+        resumen[f"p{p:g}_ms".replace(".", "")] = round(percentil(duraciones, p) / 1e6, 3)
+    resumen["max_ms"] = round(duraciones[-1] / 1e6, 3) if duraciones else 0.0
+    # Histograma con las mismas cubetas que /metrics (sin acumular)
+    cubetas = [0] * (len(LIMITES_SEGUNDOS) + 1)
+    limite = 0
+    for duracion in duraciones:
+        while limite < len(LIMITES_SEGUNDOS) and duracion / 1e9 > LIMITES_SEGUNDOS[limite]:
+            limite += 1
+        cubetas[limite] += 1
+    resumen["cubetas"] = dict(zip([f"{limite:g}" for limite in LIMITES_SEGUNDOS] + ["+Inf"], cubetas))
+    return resumen
+
+
+def resultados(medicion, segundos):
+    procesados = sum(len(latencias) for latencias in medicion.latencias.values())
+    mensajes = procesados + sum(len(fila) for fila in medicion.enviados.values())
+    todas = [duracion for latencias in medicion.latencias.values() for duracion in latencias]
+    return {
+        "segundos": round(segundos, 3),
+        "entregas": medicion.entregas,
+        "mensajes_procesados": procesados,
+        "mensajes_por_segundo": round(procesados / segundos, 1) if segundos else 0.0,
+        "entregas_rechazadas": medicion.rechazadas,
+        "errores_proceso": medicion.errores,
+        "tasa_error": round((medicion.rechazadas + medicion.errores) / max(medicion.entregas, 1), 4),
+        "sin_respuesta": mensajes - procesados,
+        "post": resumir_latencias(medicion.latencias_post),
+        "total": resumir_latencias(todas),
+        "por_estado": {
+            estado: resumir_latencias(latencias) for estado, latencias in sorted(medicion.latencias.items())
+        },
+    }
+
+
+def imprimir(resumen):
+    print(
+        f"{resumen['entregas']} entregas, {resumen['mensajes_procesados']} mensajes en {resumen['segundos']} s "
+        f"({resumen['mensajes_por_segundo']} mensajes/s), tasa de error {resumen['tasa_error']:.2%}"
+    )
+    columnas = [f"p{p:g}_ms".replace(".", "") for p in PERCENTILES] + ["max_ms"]
+    print(f"{'estado':24} {'mensajes':>9} " + " ".join(f"{columna:>10}" for columna in columnas))
+    filas = [("POST /webhook", resumen["post"]), ("total", resumen["total"])] + list(resumen["por_estado"].items())
+    for nombre, latencias in filas:
+        print(f"{nombre:24} {latencias['mensajes']:>9} " + " ".join(f"{latencias[c]:>10}" for c in columnas))
+
+# =========================================
+# Grabación sintética (para probar sin tráfico real)
+# =========================================
+
+def generar_sintetico(ruta, usuarios, entregas_por_segundo=20, semilla=SEMILLA):
+    # Conversaciones de benchmarks_credito intercaladas, grabadas con el
+    # mismo formato que usa el bot
+    rng = random.Random(semilla)
+    grabador = GrabadorTrafico(ruta, sal="sintetico")
+    conversaciones = [(f"5215{i:08d}", _conversacion(rng)) for i in range(usuarios)]
+    momento = 0.0
+    lineas = []
+    paso = 0
+    while any(paso < len(mensajes) for _, mensajes in conversaciones):
+        for numero, mensajes in conversaciones:
+            if paso < len(mensajes):
+                momento += rng.expovariate(entregas_por_segundo)
+                lineas.append([round(momento, 3), [[grabador.anonimizar(numero), mensajes[paso], int(momento)]]])
+        paso += 1
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        for linea in lineas:
+            archivo.write(json.dumps(linea, ensure_ascii=False, separators=(",", ":")) + "\n")
+    return len(lineas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reproduce tráfico grabado contra /webhook")
+    parser.add_argument("grabacion", help="Archivo grabado con GRABAR_TRAFICO")
+    parser.add_argument("--velocidad", type=float, default=1.0, help="Factor sobre el ritmo original")
+    parser.add_argument("--tasa", type=float, help="Entregas por segundo en total (ignora el ritmo original)")
+    parser.add_argument("--copias", type=int, default=1, help="Veces que se multiplica el tráfico")
+    parser.add_argument("--hilos", type=int, default=8, help="Hilos que mandan las entregas")
+    parser.add_argument("--salida", help="Guarda el resumen en JSON")
+    parser.add_argument("--generar-sintetico", type=int, metavar="USUARIOS",
+                        help="Crea una grabación sintética con ese número de usuarios y termina")
+    args = parser.parse_args(argv)
+
+    if args.generar_sintetico:
+        cantidad = generar_sintetico(args.grabacion, args.generar_sintetico)
+        print(f"Grabación sintética con {cantidad} entregas en {args.grabacion}")
+        return 0
+
+    plan = planear(cargar_entregas(args.grabacion), args.velocidad, args.tasa, args.copias)
+    medicion, segundos = reproducir(plan, args.hilos)
+    resumen = resultados(medicion, segundos)
+    imprimir(resumen)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(resumen, archivo, indent=2, ensure_ascii=False)
+    return 1 if resumen["tasa_error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
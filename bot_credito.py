@@ -4,40 +4,155 @@
 # Descripción: Bot educativo para temas de crédito
 # =========================================
 
-from flask import Flask, request
-import json
-from decimal import Decimal, getcontext
-from math import log
+import time
+
+# Antes de cualquier otra importación, para medir el arranque en frío
+INICIO_IMPORTACION = time.perf_counter()
+
+from flask import Flask, Response, request, stream_with_context
+import gc
+import hmac
+import logging
+import os
+import re
+from datetime import date
+from decimal import Decimal, localcontext
+
+from calculos import (
+    CONTEXTO_EXCEL,
+    calcular_pago_fijo_excel,
+    punto_de_control_ahorro,
+    detalle_ahorro_desde_punto,
+    calcular_costo_credito_tienda,
+    calcular_monto_maximo
+)
+from calculos_lote import malla_pagos
+from sesiones import crear_almacen_sesiones, AlmacenMemoria
+from cola_mensajes import ColaMensajes
+from mensajes_webhook import recorrer_mensajes, agrupar_mensajes
+from deduplicacion import crear_indice_mensajes
+from grabacion import crear_grabador
+from exportacion import FORMATOS, preparar_tablas, exportar_tablas
+from deudas import validar_deudas, comparar_estrategias
+from ofertas import FRECUENCIAS, preparar_oferta, comparar_ofertas
+from capacidad import (
+    PORCENTAJE_POR_RIESGO,
+    PAGO_REVOLVENTE,
+    PLAZOS_ESTANDAR,
+    calcular_capacidad_mensual,
+    tabla_montos_maximos,
+    plazos_minimos,
+    tasas_maximas
+)
+from tasa_variable import simular_tasa_variable
+from simulaciones import MAX_SIMULACIONES, simular_bloque, simular_lote
+from envio_whatsapp import ClienteWhatsApp, TextoPreparado
+from metricas import Registro
+from perfilado import Perfilador, TOKEN_PERFILADO
+from arranque import TiemposArranque
+from validacion import (
+    ErrorValidacion,
+    validar_monto,
+    validar_tasa,
+    validar_plazo,
+    validar_lista
+)
 
 # =========================================
 # Configuración general
 # =========================================
 
+# Los módulos registran con logging (tiempos de arranque, diferencias
+# del modo de verificación); NIVEL_LOG=WARNING los calla
+logging.basicConfig(
+    level=os.environ.get("NIVEL_LOG", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+registro = logging.getLogger(__name__)
+
 app = Flask(__name__)
-getcontext().prec = 17  # Precisión tipo Excel
+tiempos_arranque = TiemposArranque(INICIO_IMPORTACION)
+app.wsgi_app = tiempos_arranque.envolver_wsgi(app.wsgi_app)
+
+# Estado de cada usuario (memoria, SQLite o Redis según ALMACEN_SESIONES)
+almacen_sesiones = crear_almacen_sesiones()
 
-estado_usuario = {}  # Diccionario para estados de usuarios
+# IDs de mensajes ya recibidos, para ignorar reintentos de WhatsApp
+# (memoria, SQLite o Redis según INDICE_MENSAJES)
+indice_mensajes = crear_indice_mensajes()
+
+# Grabación opcional del tráfico para pruebas de carga (GRABAR_TRAFICO)
+grabador_trafico = crear_grabador()
 
 # =========================================
-# Función: Cálculo de pago fijo (validado estilo Excel)
+# Métricas (/metrics)
 # =========================================
 
-def calcular_pago_fijo_excel(monto, tasa, plazo):
-    P = Decimal(str(monto))
-    r = Decimal(str(tasa))
-    n = Decimal(str(plazo))
-    uno_mas_r = Decimal('1') + r
-    base_elevada = uno_mas_r ** n
-    inverso = Decimal('1') / base_elevada
-    denominador = Decimal('1') - inverso
-    numerador = P * r
-    pago = numerador / denominador
-    return pago.quantize(Decimal('0.01'))
+metricas = Registro()
+duracion_mensajes = metricas.histograma(
+    "bot_mensaje_segundos", "Tiempo para responder un mensaje, por paso de la conversación", ("estado",)
+)
+errores_paso = metricas.contador(
+    "bot_errores_paso_total", "Respuestas que no se pudieron leer o calcular, por paso", ("estado", "tipo")
+)
+rechazos = metricas.contador(
+    "bot_rechazos_total", "Datos rechazados por estar fuera de los límites, por paso y motivo", ("estado", "motivo")
+)
+mensajes_duplicados = metricas.contador(
+    "bot_mensajes_duplicados_total", "Mensajes descartados porque WhatsApp los volvió a entregar"
+)
+duracion_calculos = metricas.histograma(
+    "bot_calculo_segundos", "Tiempo de cada función de cálculo", ("funcion",)
+)
+entregas_webhook = metricas.contador(
+    "bot_webhook_total", "Entregas recibidas en /webhook, por resultado", ("resultado",)
+)
+duracion_webhook = metricas.histograma(
+    "bot_webhook_segundos", "Tiempo para leer y encolar una entrega del webhook"
+)
+metricas.medidor(
+    "bot_sesiones_activas", "Conversaciones con un paso pendiente", almacen_sesiones.contar,
+    por_proceso=isinstance(almacen_sesiones, AlmacenMemoria)
+)
+if isinstance(almacen_sesiones, AlmacenMemoria):
+    metricas.medidor(
+        "bot_sesiones_memoria",
+        "Sesiones en memoria creadas, completadas, expiradas y desalojadas desde que inició el proceso",
+        lambda: {(evento,): valor for evento, valor in almacen_sesiones.estadisticas().items() if evento != "activas"},
+        ("evento",), por_proceso=True
+    )
+
+metricas.medidor(
+    "bot_arranque_segundos", "Importación, preparación y primera petición de cada worker",
+    tiempos_arranque.valores, ("fase", "pid"), por_proceso=True
+)
+
+# Perfilado opcional por flujo (ver perfilado.py y /perfilado)
+perfilador = Perfilador()
+
+
+def instrumentar(funcion):
+    # Cada llamada a las funciones de cálculo queda medida y se puede perfilar
+    return perfilador.envolver(duracion_calculos.medir_funcion(funcion))
+
+
+calcular_pago_fijo_excel = instrumentar(calcular_pago_fijo_excel)
+punto_de_control_ahorro = instrumentar(punto_de_control_ahorro)
+detalle_ahorro_desde_punto = instrumentar(detalle_ahorro_desde_punto)
+calcular_costo_credito_tienda = instrumentar(calcular_costo_credito_tienda)
+calcular_monto_maximo = instrumentar(calcular_monto_maximo)
+malla_pagos = instrumentar(malla_pagos)
+comparar_estrategias = instrumentar(comparar_estrategias)
+comparar_ofertas = instrumentar(comparar_ofertas)
+tabla_montos_maximos = instrumentar(tabla_montos_maximos)
+plazos_minimos = instrumentar(plazos_minimos)
+tasas_maximas = instrumentar(tasas_maximas)
+simular_tasa_variable = instrumentar(simular_tasa_variable)
+
 # =========================================
 # Saludo inicial con menú principal
 # =========================================
 
-saludo_inicial = (
+saludo_inicial = TextoPreparado(
     "👋 Hola 😊, soy tu asistente virtual de Educación Financiera para el Mundo, creado por la Dra. Jazmín Sandoval.\n"
     "Estoy aquí para ayudarte a comprender mejor cómo funcionan los créditos y tomar decisiones informadas 💳📊\n\n"
     "¿Sobre qué aspecto del crédito necesitas ayuda hoy?\n"
@@ -49,7 +164,149 @@ saludo_inicial = (
     "5️⃣ Consejos para pagar un crédito sin ahogarte\n"
     "6️⃣ Cómo identificar un crédito caro\n"
     "7️⃣ Errores comunes al solicitar un crédito\n"
-    "8️⃣ Entender el Buró de Crédito"
+    "8️⃣ Entender el Buró de Crédito\n"
+    "9️⃣ Planear cómo pagar varias deudas\n"
+    "🔟 Simular un crédito con tasa variable"
+)
+
+# =========================================
+# Textos educativos (opciones 5 a 8)
+# =========================================
+
+texto_consejos = TextoPreparado(
+    "🟡 *Consejos para pagar un crédito sin ahogarte*\n"
+    "Pagar un crédito no tiene que sentirse como una carga eterna. Aquí van algunos consejos sencillos para ayudarte a pagar con más tranquilidad y menos estrés:\n"
+    "________________________________________\n"
+    "✅ 1. Haz pagos anticipados cuando puedas\n"
+    "📌 Aunque no sea obligatorio, abonar un poco más al capital te ahorra intereses y reduce el plazo.\n"
+    "💡 Incluso $200 o $500 adicionales hacen una gran diferencia con el tiempo.\n"
+    "________________________________________\n"
+    "✅ 2. Programa tus pagos en automático\n"
+    "📌 Evitas atrasos, recargos y estrés.\n"
+    "💡 Si no tienes domiciliación, pon recordatorios para no fallar.\n"
+    "________________________________________\n"
+    "✅ 3. Revisa si puedes cambiar tu crédito por uno mejor\n"
+    "📌 A esto se le llama “reestructura” o “portabilidad”.\n"
+    "💡 Si tu historial ha mejorado, podrías conseguir mejores condiciones.\n"
+    "________________________________________\n"
+    "✅ 4. Haz un presupuesto mensual\n"
+    "📌 Saber cuánto entra y cuánto sale te ayuda a organizar tus pagos sin descuidar otras necesidades.\n"
+    "💡 Apóyate en apps, papel o Excel, lo que te funcione.\n"
+    "________________________________________\n"
+    "✅ 5. Prioriza las deudas más caras\n"
+    "📌 Si tienes varias, enfócate primero en las que tienen interés más alto, como tarjetas de crédito.\n"
+    "________________________________________\n"
+    "¿Te gustaría simular cuánto podrías ahorrar si haces pagos extra?\n"
+    "Solo dime *simular crédito* o escribe *menú* para regresar al inicio."
+)
+
+texto_credito_caro = TextoPreparado(
+    "🟡 *Cómo identificar un crédito caro*\n"
+    "Muchas veces un crédito parece accesible… hasta que ves lo que terminas pagando. Aquí te doy algunas claves para detectar si un crédito es caro:\n"
+    "________________________________________\n"
+    "🔍 1. CAT (Costo Anual Total)\n"
+    "Es una medida que incluye la tasa de interés, comisiones y otros cargos.\n"
+    "📌 Entre más alto el CAT, más caro te saldrá el crédito.\n"
+    "💡 Compara el CAT entre diferentes instituciones, no solo la tasa.\n"
+    "________________________________________\n"
+    "🔍 2. Comisiones escondidas\n"
+    "Algunos créditos cobran por apertura, por manejo, por pagos tardíos o por pagos anticipados 😵\n"
+    "📌 Lee siempre el contrato antes de firmar.\n"
+    "________________________________________\n"
+    "🔍 3. Tasa de interés variable\n"
+    "📌 Algunos créditos no tienen tasa fija, sino que pueden subir.\n"
+    "💡 Revisa si tu tasa es fija o variable. Las variables pueden volverse muy caras si sube la inflación.\n"
+    "________________________________________\n"
+    "🔍 4. Pago mensual bajo con plazo largo\n"
+    "Parece atractivo, pero terminas pagando muchísimo más en intereses.\n"
+    "________________________________________\n"
+    "❗ Si el crédito parece demasiado fácil o rápido, pero no entiendes bien cuánto vas a pagar en total... ¡es una señal de alerta!\n\n"
+    "¿Te gustaría que te ayude a comparar los créditos que estés considerando?\n"
+    "Escribe *sí* y lo vemos junt@s 😊"
+)
+
+texto_errores_comunes = TextoPreparado(
+    "🟡 *Errores comunes al solicitar un crédito*\n"
+    "Solicitar un crédito es una gran responsabilidad. Aquí te comparto algunos errores comunes que muchas personas cometen… ¡y cómo evitarlos!\n"
+    "________________________________________\n"
+    "❌ 1. No saber cuánto terminarás pagando en total\n"
+    "Muchas personas solo se fijan en el pago mensual y no en el costo total del crédito.\n"
+    "✅ Usa simuladores (como el que tengo 😎) para saber cuánto pagarás realmente.\n"
+    "________________________________________\n"
+    "❌ 2. Pedir más dinero del que realmente necesitas\n"
+    "📌 Entre más pidas, más intereses pagas.\n"
+    "✅ Pide solo lo necesario y asegúrate de poder pagarlo.\n"
+    "________________________________________\n"
+    "❌ 3. Aceptar el primer crédito que te ofrecen\n"
+    "📌 Hay diferencias enormes entre una institución y otra.\n"
+    "✅ Compara tasas, comisiones y condiciones antes de decidir.\n"
+    "________________________________________\n"
+    "❌ 4. No leer el contrato completo\n"
+    "Sí, puede ser largo, pero ahí están los detalles importantes:\n"
+    "📌 ¿Hay comisiones por pagar antes de tiempo?\n"
+    "📌 ¿Qué pasa si te atrasas?\n"
+    "✅ Lee con calma o pide que te lo expliquen.\n"
+    "________________________________________\n"
+    "❌ 5. Usar un crédito sin un plan de pago\n"
+    "📌 Si no sabes cómo lo vas a pagar, puedes meterte en problemas.\n"
+    "✅ Haz un presupuesto antes de aceptar cualquier crédito.\n"
+    "________________________________________\n\n"
+    "¿Te gustaría que te ayude a planear cómo pagar tu crédito sin agobios?\n"
+    "Solo dime y con gusto te oriento ✨"
+)
+
+texto_buro = TextoPreparado(
+    "🟡 *Entender el Buró de Crédito*\n"
+    "El Buró de Crédito no es un enemigo, es solo un registro de cómo has manejado tus créditos. Y sí, puede ayudarte o perjudicarte según tu comportamiento.\n"
+    "________________________________________\n"
+    "📊 ¿Qué es el Buró de Crédito?\n"
+    "Es una empresa que guarda tu historial de pagos.\n"
+    "📌 Si pagas bien, tu historial será positivo.\n"
+    "📌 Si te atrasas, se reflejará ahí.\n"
+    "________________________________________\n"
+    "💡 *Tener historial no es malo.*\n"
+    "De hecho, si nunca has pedido un crédito, no aparecerás en Buró y eso puede dificultar que te aprueben uno.\n"
+    "________________________________________\n"
+    "📈 *Tu comportamiento crea un “score” o puntaje.*\n"
+    "• Pagar a tiempo te ayuda\n"
+    "• Deber mucho o atrasarte te baja el score\n"
+    "• Tener muchas tarjetas al tope también afecta\n"
+    "________________________________________\n"
+    "❗ *Cuidado con estas ideas falsas:*\n"
+    "• “Estoy en Buró” no siempre es malo\n"
+    "• No es una lista negra\n"
+    "• No te borran tan fácil (los registros duran años)\n"
+    "________________________________________\n\n"
+    "¿Te gustaría saber cómo mejorar tu historial crediticio o qué pasos tomar para subir tu puntaje?\n"
+    "Solo dime *sí* y lo revisamos junt@s 😊"
+)
+
+texto_submenu_buro = TextoPreparado(
+    "📂 *Submenú: ¿Cómo mejorar mi historial crediticio?*\n"
+    "Aquí tienes algunos consejos prácticos para mejorar tu score en Buró de Crédito y tener un historial más saludable 📈\n"
+    "________________________________________\n"
+    "🔹 1. *Paga a tiempo, siempre*\n"
+    "📌 Aunque sea el pago mínimo, evita atrasarte.\n"
+    "✅ La puntualidad pesa mucho en tu historial.\n"
+    "________________________________________\n"
+    "🔹 2. *Usa tus tarjetas con moderación*\n"
+    "📌 Trata de no usar más del 30%-40% del límite de tu tarjeta.\n"
+    "✅ Usarlas hasta el tope te resta puntos, aunque pagues.\n"
+    "________________________________________\n"
+    "🔹 3. *No abras muchos créditos al mismo tiempo*\n"
+    "📌 Si pides varios préstamos en poco tiempo, parecerá que estás desesperado/a por dinero.\n"
+    "✅ Ve uno a la vez y maneja bien el que tienes.\n"
+    "________________________________________\n"
+    "🔹 4. *Usa algún crédito, aunque sea pequeño*\n"
+    "📌 Si no tienes historial, nunca tendrás score.\n"
+    "✅ Una tarjeta departamental o un plan telefónico pueden ser un buen inicio si los manejas bien.\n"
+    "________________________________________\n"
+    "🔹 5. *Revisa tu historial al menos una vez al año*\n"
+    "📌 Puedes pedir un reporte gratuito en www.burodecredito.com.mx\n"
+    "✅ Asegúrate de que no haya errores y de que tus datos estén correctos.\n"
+    "________________________________________\n"
+    "💡 ¿Quieres que te dé el link para pedir tu reporte de Buró gratis?\n"
+    "Solo dime *reporte* y te lo comparto."
 )
 
 # =========================================
@@ -66,565 +323,1091 @@ def webhook():
         return "Token inválido", 403
 
     if request.method == "POST":
-        data = request.get_json()
+        with duracion_webhook.cronometrar():
+            resultado = recibir_entrega(request.get_json(silent=True))
+        entregas_webhook.incrementar(resultado)
+        if resultado == "ocupado":
+            return "Ocupado, intenta más tarde", 503
+        return "ok", 200
+
+
+def recibir_entrega(data):
+    # Una entrega puede traer varias entradas y mensajes (avisos de
+    # estado y mensajes sin texto se ignoran)
+    mensajes = list(recorrer_mensajes(data))
+    if not mensajes:
+        return "sin_mensajes"
+
+    # Los mensajes cuyo id ya se vio son reintentos: no se procesan otra vez
+    ids = [mensaje[3] for mensaje in mensajes if mensaje[3]]
+    reclamados = indice_mensajes.reclamar(ids) if ids else set()
+    nuevos = []
+    for mensaje in mensajes:
+        id_mensaje = mensaje[3]
+        if id_mensaje:
+            if id_mensaje not in reclamados:
+                continue
+            reclamados.discard(id_mensaje)  # Repetido dentro de la misma entrega
+        nuevos.append(mensaje)
+    if len(nuevos) < len(mensajes):
+        mensajes_duplicados.incrementar(cantidad=len(mensajes) - len(nuevos))
+    if not nuevos:
+        return "duplicado"
+    if grabador_trafico is not None:
+        grabador_trafico.grabar(nuevos)
+
+    # Se responde de inmediato; el cálculo y el envío van en segundo
+    # plano, en paralelo entre remitentes y en orden para cada uno.
+    # Si la cola está llena se olvidan los ids para que el reintento de
+    # Meta sí se procese.
+    if not cola_mensajes.encolar_lote(agrupar_mensajes(nuevos)):
+        indice_mensajes.liberar([mensaje[3] for mensaje in nuevos if mensaje[3]])
+        return "ocupado"
+    return "encolado"
+
+
+@app.route("/cola", methods=["GET"])
+def estado_cola():
+    return cola_mensajes.estadisticas()
+
+
+@app.route("/metrics", methods=["GET"])
+def exponer_metricas():
+    return metricas.exponer(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+# =========================================
+# Perfilado en producción
+# =========================================
+#
+# GET  /perfilado  configuración y llamadas perfiladas por flujo (de este worker)
+# POST /perfilado  con {"activo": true, "muestreo": 0.05, "modo": "pilas",
+#                  "seleccion": ["opcion_3", "calcular_costo_credito_tienda"],
+#                  "volcar": true} (todos los campos son opcionales)
+# Piden el encabezado X-Token-Perfilado con el valor de TOKEN_PERFILADO;
+# sin token configurado no existe.
+
+CAMPOS_PERFILADO = ("activo", "muestreo", "seleccion", "modo", "volcar")
+
+
+@app.route("/perfilado", methods=["GET", "POST"])
+def perfilado_api():
+    if not TOKEN_PERFILADO:
+        return {"error": "No encontrado"}, 404
+    token = request.headers.get("X-Token-Perfilado", "")
+    if not hmac.compare_digest(token.encode("utf-8"), TOKEN_PERFILADO.encode("utf-8")):
+        return {"error": "Token inválido"}, 403
+
+    archivos = []
+    if request.method == "POST":
+        datos = request.get_json(silent=True)
+        if not isinstance(datos, dict):
+            return {"error": "Se esperaba un objeto JSON"}, 400
         try:
-            mensaje = data['entry'][0]['changes'][0]['value']['messages'][0]['text']['body'].strip().lower()
-            numero = data['entry'][0]['changes'][0]['value']['messages'][0]['from']
-        except:
-            return "ok", 200
+            archivos = perfilador.configurar(**{campo: datos[campo] for campo in CAMPOS_PERFILADO if campo in datos})
+        except (ValueError, TypeError) as e:
+            return {"error": str(e)}, 400
+    return {**perfilador.estado(), "archivos": archivos}
 
-        respuesta = procesar_mensaje(mensaje, numero)
-        enviar_mensaje(numero, respuesta)
-        return "ok", 200
 
-def enviar_mensaje(numero, texto):
-    print(f"Enviando a {numero}: {texto}")
 # =========================================
-# Cálculo de pagos con fórmula tipo Excel
+# Comparación de ofertas de crédito (JSON)
 # =========================================
+#
+# POST /comparar-ofertas con {"ofertas": [{...}, ...]} (ver ofertas.py).
+# Responde las ofertas ordenadas por CAT y, aparte, las que traen datos
+# inválidos.
+
+@app.route("/comparar-ofertas", methods=["POST"])
+def comparar_ofertas_api():
+    datos = request.get_json(silent=True)
+    ofertas = datos.get("ofertas") if isinstance(datos, dict) else None
+    if not isinstance(ofertas, list):
+        return {"error": "Se esperaba un objeto con la lista \"ofertas\""}, 400
+    try:
+        return comparar_ofertas(ofertas)
+    except ErrorValidacion as e:
+        return {"error": e.mensaje, "motivo": e.motivo}, 400
 
-def calcular_pago_fijo_excel(monto, tasa, plazo):
-    getcontext().prec = 17
-    P = Decimal(str(monto))
-    r = Decimal(str(tasa))
-    n = Decimal(str(plazo))
-    uno_mas_r = Decimal('1') + r
-    base_elevada = uno_mas_r ** n
-    inverso = Decimal('1') / base_elevada
-    denominador = Decimal('1') - inverso
-    numerador = P * r
-    pago = numerador / denominador
-    return pago.quantize(Decimal('0.01'))
 
 # =========================================
-# Procesar mensajes - Parte de simulación (Opción 1)
+# Tabla de amortización completa (CSV o NDJSON en streaming)
 # =========================================
+#
+# GET  /tabla-amortizacion?monto=100000&tasa=0.02&plazo=24&abono=500&desde=3
+# POST /tabla-amortizacion con {"creditos": [{...}, ...]} para muchos a la vez
+# En ambos casos ?formato=csv (por defecto) o ?formato=ndjson
 
-estado_usuario = {}  # Seguimiento por usuario
+@app.route("/tabla-amortizacion", methods=["GET", "POST"])
+def exportar_tabla_amortizacion():
+    formato = request.args.get("formato", "csv")
+    if formato not in FORMATOS:
+        return {"error": "Formato desconocido (usa csv o ndjson)"}, 400
 
-def procesar_mensaje(mensaje, numero):
-    if mensaje in ["hola", "menú", "menu"]:
-        estado_usuario[numero] = {}
-        return saludo_inicial
-
-    if mensaje in ["1", "simular un crédito"]:
-        estado_usuario[numero] = {"esperando": "monto_credito"}
-        return "Perfecto. Para comenzar, dime el monto del crédito que deseas simular."
-
-    if numero in estado_usuario and "esperando" in estado_usuario[numero]:
-        contexto = estado_usuario[numero]
-
-        if contexto["esperando"] == "monto_credito":
-            contexto["monto"] = Decimal(mensaje.replace(",", ""))
-            contexto["esperando"] = "plazo_credito"
-            return "¿A cuántos pagos (periodos) lo piensas pagar?"
-
-        if contexto["esperando"] == "plazo_credito":
-            contexto["plazo"] = Decimal(mensaje.replace(",", ""))
-            contexto["esperando"] = "tasa_credito"
-            return (
-                "¿Cuál es la tasa de interés en el mismo periodo en que harás los pagos?\n"
-                "📌 Por ejemplo, si pagarás cada mes, la tasa debe ser mensual."
+    if request.method == "GET":
+        creditos = [request.args.to_dict()]
+    else:
+        datos = request.get_json(silent=True)
+        creditos = datos.get("creditos") if isinstance(datos, dict) else None
+        if not isinstance(creditos, list):
+            return {"error": "Se esperaba un objeto con la lista \"creditos\""}, 400
+
+    try:
+        tablas = preparar_tablas(creditos)
+    except ErrorValidacion as e:
+        return {"error": e.mensaje, "motivo": e.motivo}, 400
+    filas = exportar_tablas(tablas, formato, con_indice=request.method == "POST")
+    return Response(filas, content_type=FORMATOS[formato])
+
+
+# =========================================
+# Simulaciones en lote para socios (NDJSON en streaming)
+# =========================================
+#
+# POST /api/v1/simular con {"escenarios": [{"tipo": "pago_fijo", ...}, ...]}
+# o con un escenario por línea (Content-Type: application/x-ndjson).
+# Responde una línea NDJSON por escenario, en el mismo orden; los
+# escenarios inválidos traen su error sin detener el resto (ver
+# simulaciones.py).
+
+@app.route("/api/v1/simular", methods=["POST"])
+def simular_api():
+    if request.mimetype == "application/x-ndjson":
+        # Las líneas se leen conforme se van calculando
+        escenarios = (linea for linea in request.stream if linea.strip())
+        return Response(stream_with_context(simular_lote(escenarios)), content_type=FORMATOS["ndjson"])
+
+    datos = request.get_json(silent=True)
+    escenarios = datos.get("escenarios") if isinstance(datos, dict) else None
+    if not isinstance(escenarios, list):
+        return {"error": "Se esperaba un objeto con la lista \"escenarios\" o NDJSON"}, 400
+    if len(escenarios) > MAX_SIMULACIONES:
+        return {
+            "error": f"Se pueden simular hasta {MAX_SIMULACIONES} escenarios por petición.",
+            "motivo": "demasiados_escenarios"
+        }, 400
+    return Response(simular_lote(escenarios), content_type=FORMATOS["ndjson"])
+
+
+def atender_mensaje(numero, mensaje):
+    respuesta = procesar_mensaje(mensaje, numero)
+    enviar_mensaje(numero, respuesta)
+
+
+def enviar_mensaje(numero, texto):
+    if not texto:
+        return
+    # Sin token configurado (desarrollo local) solo se registra, con
+    # NIVEL_LOG=DEBUG; del número solo van los últimos dígitos
+    if not cliente_whatsapp.token:
+        registro.debug("Sin token, respuesta para ...%s: %s", numero[-4:], texto)
+        return
+    cliente_whatsapp.enviar_texto(numero, texto)
+
+
+cliente_whatsapp = ClienteWhatsApp()
+cola_mensajes = ColaMensajes(atender_mensaje)
+
+metricas.medidor(
+    "bot_cola_pendientes", "Mensajes esperando a un trabajador",
+    lambda: cola_mensajes.estadisticas()["pendientes"], por_proceso=True
+)
+metricas.medidor(
+    "bot_cola_en_proceso", "Mensajes que se están atendiendo",
+    lambda: cola_mensajes.estadisticas()["en_proceso"], por_proceso=True
+)
+
+# =========================================
+# Tabla de pagos para varios plazos y tasas (Opción 1)
+# =========================================
+
+def leer_lista_numeros(mensaje):
+    return [Decimal(valor.strip().replace(",", "")) for valor in mensaje.split("/") if valor.strip()]
+
+
+def tabla_de_pagos(monto, tasas, plazos):
+    tabla = malla_pagos(float(monto), [float(t) for t in tasas], [float(p) for p in plazos])
+    lineas = [f"📊 Pagos para un crédito de ${monto}:"]
+    for i, tasa in enumerate(tasas):
+        lineas.append(f"\n📈 Tasa {tasa} por periodo:")
+        for j, plazo in enumerate(plazos):
+            lineas.append(
+                f"• {plazo} pagos de ${tabla['pago'][i, j]:.2f} "
+                f"(total ${tabla['total_pagado'][i, j]:.2f}, intereses ${tabla['intereses'][i, j]:.2f})"
             )
+    lineas.append("\n¿Deseas volver al menú? Escribe *menú*.")
+    return "\n".join(lineas)
+
+# =========================================
+# Procesar mensajes
+# =========================================
+
+def procesar_mensaje(mensaje, numero):
+    # Se carga la sesión del usuario, se responde y se guarda de nuevo,
+    # para que cualquier worker pueda continuar la conversación
+    guardado = almacen_sesiones.obtener(numero)
+    contexto = guardado if guardado is not None else {}
+
+    # Las cuentas en Decimal de los pasos usan la precisión tipo Excel
+    # sin tocar el contexto del hilo
+    estado = contexto.get("esperando") or "menu"
+    with duracion_mensajes.cronometrar(estado), localcontext(CONTEXTO_EXCEL):
+        respuesta = perfilador.ejecutar(
+            FLUJO_POR_ESTADO.get(estado, "menu"), estado, responder_mensaje, mensaje, contexto
+        )
+
+    if contexto.get("esperando"):
+        almacen_sesiones.guardar(numero, contexto)
+    elif guardado is not None:
+        almacen_sesiones.borrar(numero)
+    return respuesta
+
+# =========================================
+# Máquina de estados de la conversación
+# =========================================
+#
+# Cada paso de un flujo es un Estado con su lector (convierte el mensaje
+# en un valor o lanza una excepción) y su manejador, que recibe el
+# contexto y el valor y regresa (siguiente_estado, respuesta). FIN
+# termina el flujo y SIN_CAMBIO deja el estado como estaba.
+#
+# Los pasos de opción cerrada (sí/no, 1/2/3) usan "opciones": un
+# diccionario de entrada -> manejador. Si la entrada no es válida se
+# responde "otro" o, si no hay, el mensaje se trata como del menú.
+#
+# Orden de atención de un mensaje (todo son búsquedas en diccionarios):
+#   1. Comandos globales (hola, menú, reporte) desde cualquier estado
+#   2. Opciones del menú escritas por nombre, desde cualquier estado
+#   3. El paso en que va el usuario
+#   4. Opciones del menú por número, si no hay un paso pendiente
+
+FIN = None
+SIN_CAMBIO = "sin_cambio"
+
+
+class Estado:
+    def __init__(self, nombre, manejador=None, leer=None, error=None, opciones=None, otro=None, siguientes=()):
+        self.nombre = nombre
+        self.manejador = manejador
+        self.leer = leer
+        self.error = error
+        self.opciones = opciones or {}
+        self.otro = otro
+        self.siguientes = siguientes
+
+
+class Opcion:
+    def __init__(self, entradas, manejador, siguientes=()):
+        self.entradas = entradas
+        self.manejador = manejador
+        self.siguientes = siguientes
+
+
+def leer_decimal(mensaje):
+    return Decimal(mensaje.replace(",", ""))
+
+
+def leer_entero(mensaje):
+    return int(mensaje.strip())
+
+
+def leer_texto(mensaje):
+    return mensaje
+
+
+def leer_monto(mensaje):
+    return validar_monto(leer_decimal(mensaje))
+
+
+def leer_cantidad(mensaje):
+    # Como leer_monto, pero acepta cero (pagos fijos, deudas, abonos)
+    return validar_monto(leer_decimal(mensaje), permitir_cero=True)
+
+
+def leer_tasa(mensaje):
+    return validar_tasa(leer_decimal(mensaje))
+
+
+def leer_plazo(mensaje):
+    return validar_plazo(leer_decimal(mensaje))
+
+
+def validar_flujo(estados, opciones):
+    # Revisa al cargar que todos los estados a los que se salta existan
+    # y que no haya estados a los que nunca se pueda llegar
+    desconocidos = set()
+    alcanzables = set()
+    pendientes = []
+    for opcion in opciones:
+        pendientes.extend(opcion.siguientes)
+    while pendientes:
+        nombre = pendientes.pop()
+        if nombre in (FIN, SIN_CAMBIO) or nombre in alcanzables:
+            continue
+        if nombre not in estados:
+            desconocidos.add(nombre)
+            continue
+        alcanzables.add(nombre)
+        pendientes.extend(estados[nombre].siguientes)
+    if desconocidos:
+        raise ValueError(f"Estados no definidos en el flujo: {sorted(desconocidos)}")
+    inalcanzables = set(estados) - alcanzables
+    if inalcanzables:
+        raise ValueError(f"Estados inalcanzables en el flujo: {sorted(inalcanzables)}")
+
+
+def flujos_por_estado(estados, opciones):
+    # A qué opción del menú pertenece cada estado ("opcion_3"), para
+    # agrupar el perfilado por flujo
+    flujos = {}
+    for opcion in opciones:
+        pendientes = list(opcion.siguientes)
+        while pendientes:
+            nombre = pendientes.pop()
+            if nombre in (FIN, SIN_CAMBIO) or nombre in flujos:
+                continue
+            flujos[nombre] = f"opcion_{opcion.entradas[0]}"
+            pendientes.extend(estados[nombre].siguientes)
+    return flujos
+
+
+def responder_mensaje(mensaje, contexto):
+    opcion = COMANDOS_GLOBALES.get(mensaje) or OPCIONES_POR_NOMBRE.get(mensaje)
+    if opcion is None:
+        estado = ESTADOS.get(contexto.get("esperando"))
+        if estado is not None:
+            resultado = atender_estado(estado, mensaje, contexto)
+            if resultado is not None:
+                return aplicar(estado.siguientes, contexto, *resultado)
+        opcion = OPCIONES_MENU.get(mensaje)
+        if opcion is None:
+            return None
+    return aplicar(opcion.siguientes, contexto, *opcion.manejador(contexto))
+
+
+def atender_estado(estado, mensaje, contexto):
+    # Regresa (siguiente, respuesta) o None si el mensaje no es para
+    # este paso y debe tratarse como opción del menú
+    if estado.manejador is None:
+        manejador = estado.opciones.get(mensaje)
+        if manejador is None:
+            return (SIN_CAMBIO, estado.otro) if estado.otro else None
+        return manejador(contexto)
+    # Un dato fuera de los límites se responde con el motivo; cualquier
+    # otro error, con el mensaje del paso
+    try:
+        valor = estado.leer(mensaje)
+    except ErrorValidacion as e:
+        rechazos.incrementar(estado.nombre, e.motivo)
+        return SIN_CAMBIO, e.mensaje
+    except Exception:
+        errores_paso.incrementar(estado.nombre, "lectura")
+        return SIN_CAMBIO, estado.error
+    try:
+        return estado.manejador(contexto, valor)
+    except ErrorValidacion as e:
+        rechazos.incrementar(estado.nombre, e.motivo)
+        return SIN_CAMBIO, e.mensaje
+    except Exception:
+        errores_paso.incrementar(estado.nombre, "calculo")
+        return SIN_CAMBIO, estado.error
+
+
+def aplicar(siguientes, contexto, siguiente, respuesta):
+    if siguiente == SIN_CAMBIO:
+        return respuesta
+    if siguiente not in siguientes:
+        raise ValueError(f"Transición no declarada hacia {siguiente}")
+    if siguiente is FIN:
+        contexto.clear()
+    else:
+        contexto["esperando"] = siguiente
+    return respuesta
+
+# =========================================
+# Menú principal y comandos globales
+# =========================================
+
+def iniciar(esperando, respuesta):
+    def manejador(contexto):
+        contexto.clear()
+        return esperando, respuesta
+    return manejador
+
+
+def solo_texto(respuesta):
+    def manejador(contexto):
+        return SIN_CAMBIO, respuesta
+    return manejador
+
+
+def menu_principal(contexto):
+    return FIN, saludo_inicial
+
+
+COMANDOS = [
+    Opcion(["hola", "menú", "menu"], menu_principal, siguientes=(FIN,)),
+    Opcion(
+        ["reporte"],
+        solo_texto(TextoPreparado(
+            "Aquí tienes el enlace oficial para consultar tu reporte gratuito de Buró de Crédito: https://www.burodecredito.com.mx"
+        )),
+    ),
+]
+
+MENU = [
+    Opcion(
+        ["1", "simular un crédito", "simular crédito"],
+        iniciar("monto_credito", "Perfecto. Para comenzar, dime el monto del crédito que deseas simular."),
+        siguientes=("monto_credito",),
+    ),
+    Opcion(
+        ["3", "calcular el costo real de compras a pagos fijos en tiendas"],
+        iniciar(
+            "precio_contado",
+            "Vamos a calcular el costo real de una compra a pagos fijos.\n"
+            "Por favor dime lo siguiente:\n\n"
+            "1️⃣ ¿Cuál es el precio de contado del producto?"
+        ),
+        siguientes=("precio_contado",),
+    ),
+    Opcion(
+        ["4", "¿cuánto me pueden prestar?"],
+        iniciar(
+            "ingreso",
+            "Vamos a calcular cuánto podrías solicitar como crédito, con base en tu capacidad de pago.\n\n"
+            "Primero necesito saber:\n"
+            "1️⃣ ¿Cuál es tu ingreso neto mensual? (Después de impuestos y deducciones)"
+        ),
+        siguientes=("ingreso",),
+    ),
+    Opcion(["5", "consejos para pagar un crédito sin ahogarte"], solo_texto(texto_consejos)),
+    Opcion(
+        ["6", "cómo identificar un crédito caro"],
+        iniciar("ver_si_comparar", texto_credito_caro),
+        siguientes=("ver_si_comparar",),
+    ),
+    Opcion(["7", "errores comunes al solicitar un crédito"], solo_texto(texto_errores_comunes)),
+    Opcion(["8", "entender el buró de crédito"], iniciar("submenu_buro", texto_buro), siguientes=("submenu_buro",)),
+    Opcion(
+        ["9", "planear cómo pagar varias deudas", "varias deudas"],
+        iniciar(
+            "deudas_lista",
+            "Vamos a comparar formas de pagar tus deudas 💳\n\n"
+            "Escríbeme cada deuda en una línea con su saldo, su tasa de interés mensual y su pago mínimo, separados por /.\n"
+            "Por ejemplo:\n"
+            "15000 / 0.035 / 900\n"
+            "8000 / 0.02 / 400"
+        ),
+        siguientes=("deudas_lista",),
+    ),
+    Opcion(
+        ["10", "simular un crédito con tasa variable", "tasa variable"],
+        iniciar(
+            "variable_datos",
+            "Vamos a ver qué tanto podría subir un crédito a tasa variable 📈\n\n"
+            "Escríbeme en una línea el monto, la tasa inicial por periodo y el número de pagos, separados por /.\n"
+            "Por ejemplo: 1000000 / 0.01 / 240"
+        ),
+        siguientes=("variable_datos",),
+    ),
+]
+
+# =========================================
+# Opción 1: Simulación de crédito y abonos extra
+# =========================================
+
+def guardar_monto(contexto, monto):
+    contexto["monto"] = monto
+    return "plazo_credito", "¿A cuántos pagos (periodos) lo piensas pagar?"
+
+
+def leer_plazos(mensaje):
+    # Varios plazos separados por "/" (ejemplo: 12/24/36/48)
+    if "/" in mensaje:
+        return validar_lista(leer_lista_numeros(mensaje), validar_plazo)
+    return leer_plazo(mensaje)
+
+
+def guardar_plazo(contexto, plazo):
+    if isinstance(plazo, list):
+        contexto["plazos"] = plazo
+    else:
+        contexto["plazo"] = plazo
+    return "tasa_credito", (
+        "¿Cuál es la tasa de interés en el mismo periodo en que harás los pagos?\n"
+        "📌 Por ejemplo, si pagarás cada mes, la tasa debe ser mensual."
+    )
+
+
+def simular_credito(contexto, mensaje):
+    if "plazos" in contexto or "/" in mensaje:
+        tasas = validar_lista(leer_lista_numeros(mensaje), validar_tasa)
+        plazos = contexto.get("plazos") or [contexto["plazo"]]
+        return FIN, tabla_de_pagos(contexto["monto"], tasas, plazos)
+
+    monto = contexto["monto"]
+    plazo = contexto["plazo"]
+    tasa = leer_tasa(mensaje)
+    pago = calcular_pago_fijo_excel(monto, tasa, plazo)
+    total_pagado = pago * plazo
+    intereses = total_pagado - monto
+
+    # Guardamos para opción de abonos extra
+    contexto["tasa"] = tasa
+    contexto["pago_fijo"] = pago
+
+    return "ver_si_abonos", (
+        f"✅ Tu pago por periodo sería de: ${pago}\n"
+        f"💰 Pagarías en total: ${total_pagado.quantize(Decimal('0.01'))}\n"
+        f"📉 De los cuales ${intereses.quantize(Decimal('0.01'))} serían intereses.\n\n"
+        "¿Te gustaría ver cuánto podrías ahorrar si haces pagos extra a capital?\n"
+        "Responde *sí* o *no*."
+    )
+
+
+def aceptar_abonos(contexto):
+    return "abono_extra", "¿Cuánto deseas abonar extra por periodo? (Ejemplo: 500)"
+
+
+def rechazar_abonos(contexto):
+    return FIN, "Ok, pero si gustas reconsiderarlo porque realmente es algo útil, lo revisamos después 😊"
+
+
+def guardar_abono(contexto, abono):
+    contexto["abono"] = abono
+    return "desde_cuando", "¿A partir de qué periodo comenzarás a abonar esa cantidad? (Ejemplo: 4)"
+
+
+def calcular_ahorro(contexto, desde):
+    return responder_ahorro(contexto, contexto["abono"], desde)
+
+
+def responder_ahorro(contexto, abono, desde):
+    # El crédito base queda en la sesión como punto de control, así que
+    # al probar otro abono o periodo solo se recalcula lo que cambia
+    punto = contexto.get("punto_control")
+    if punto is None:
+        punto = punto_de_control_ahorro(contexto["monto"], contexto["tasa"], contexto["plazo"])
+        contexto["punto_control"] = punto
+    detalle = detalle_ahorro_desde_punto(punto, abono, desde)
+    contexto["abono"] = abono
+    contexto["desde"] = desde
+
+    return "repetir_abono", (
+        f"💸 Si pagaras este crédito sin hacer abonos extra, terminarías pagando ${detalle['total_sin_abonos']} en total.\n\n"
+        f"Pero si decides abonar ${abono} adicionales por periodo desde el periodo {desde}...\n"
+        f"✅ Terminarías de pagar en menos tiempo (¡te ahorras {detalle['pagos_ahorrados']} pagos!)\n"
+        f"💰 Pagarías ${detalle['total_con_abonos']} en total\n"
+        f"🧮 Y te ahorrarías ${detalle['ahorro_total']} solo en intereses\n\n"
+        "🔁 ¿Quieres probar con otra cantidad? Escribe *otro abono* o *otro periodo*, "
+        "o *menú* para regresar al inicio."
+    )
+
+
+def pedir_otro_abono(contexto):
+    return "cambiar_abono", f"¿Cuánto deseas abonar extra por periodo? (Ahora: ${contexto['abono']})"
+
+
+def pedir_otro_periodo(contexto):
+    return "cambiar_desde", f"¿A partir de qué periodo comenzarás a abonar? (Ahora: {contexto['desde']})"
+
+
+def cambiar_abono(contexto, abono):
+    return responder_ahorro(contexto, abono, contexto["desde"])
+
+
+def cambiar_desde(contexto, desde):
+    return responder_ahorro(contexto, contexto["abono"], desde)
 
-        if contexto["esperando"] == "tasa_credito":
-            try:
-                monto = contexto["monto"]
-                plazo = contexto["plazo"]
-                tasa = Decimal(mensaje.replace(",", ""))
-                pago = calcular_pago_fijo_excel(monto, tasa, plazo)
-                total_pagado = pago * plazo
-                intereses = total_pagado - monto
-
-                # Guardamos para opción de abonos extra
-                contexto["tasa"] = tasa
-                contexto["pago_fijo"] = pago
-                contexto["esperando"] = "ver_si_abonos"
-
-                return (
-                    f"✅ Tu pago por periodo sería de: ${pago}\n"
-                    f"💰 Pagarías en total: ${total_pagado.quantize(Decimal('0.01'))}\n"
-                    f"📉 De los cuales ${intereses.quantize(Decimal('0.01'))} serían intereses.\n\n"
-                    "¿Te gustaría ver cuánto podrías ahorrar si haces pagos extra a capital?\n"
-                    "Responde *sí* o *no*."
-                )
-            except:
-                return "Por favor escribe la tasa como un número decimal. Ejemplo: 0.025 para 2.5%"
-
-        if contexto["esperando"] == "ver_si_abonos":
-            if mensaje == "sí":
-                contexto["esperando"] = "abono_extra"
-                return "¿Cuánto deseas abonar extra por periodo? (Ejemplo: 500)"
-            elif mensaje == "no":
-                estado_usuario[numero] = {}
-                return "Ok, pero si gustas reconsiderarlo porque realmente es algo útil, lo revisamos después 😊"
 # ============================================================
-# Cálculo del ahorro con abonos extra (ajuste de último pago)
+# Opción 3: Costo real de compras a pagos fijos en tiendas
 # ============================================================
 
-def calcular_ahorro_por_abonos(monto, tasa, plazo, abono_extra, desde_periodo):
-    getcontext().prec = 17
-    P = Decimal(str(monto))
-    r = Decimal(str(tasa))
-    n = int(plazo)
-    abono = Decimal(str(abono_extra))
-    desde = int(desde_periodo)
-
-    pago_fijo = calcular_pago_fijo_excel(P, r, n)
-    saldo = P
-    periodo = 1
-    intereses_totales = Decimal('0.00')
-    pagos_realizados = 0
-    ultimo_pago = Decimal('0.00')
-
-    while saldo > 0:
-        interes = saldo * r
-        abono_a_capital = pago_fijo - interes
-
-        if periodo >= desde:
-            abono_a_capital += abono
-
-        if abono_a_capital >= saldo:
-            interes_final = saldo * r
-            ultimo_pago = saldo + interes_final
-            intereses_totales += interes_final
-            pagos_realizados += 1
-            break
-
-        saldo -= abono_a_capital
-        intereses_totales += interes
-        pagos_realizados += 1
-        periodo += 1
-
-    total_sin_abonos = pago_fijo * n
-    total_con_abonos = (pago_fijo * (pagos_realizados - 1)) + ultimo_pago
-    ahorro_total = total_sin_abonos - total_con_abonos
-    pagos_ahorrados = n - pagos_realizados
-
-    return (
-        total_sin_abonos.quantize(Decimal("0.01")),
-        total_con_abonos.quantize(Decimal("0.01")),
-        ahorro_total.quantize(Decimal("0.01")),
-        pagos_ahorrados
+def guardar_precio_contado(contexto, precio):
+    contexto["precio_contado"] = precio
+    return "pago_fijo", "2️⃣ ¿De cuánto será cada pago (por ejemplo: 250)?"
+
+
+def guardar_pago_tienda(contexto, pago):
+    contexto["pago_fijo"] = pago
+    return "numero_pagos", "3️⃣ ¿Cuántos pagos harás en total?"
+
+
+def calcular_costo_tienda(contexto, num_pagos):
+    total, intereses, tasa_periodo, tasa_anual = calcular_costo_credito_tienda(
+        contexto["precio_contado"],
+        contexto["pago_fijo"],
+        num_pagos
+    )
+    return FIN, (
+        f"📊 Aquí tienes los resultados:\n"
+        f"💰 Precio de contado: ${contexto['precio_contado']}\n"
+        f"📆 Pagos fijos de ${contexto['pago_fijo']} durante {num_pagos} periodos\n\n"
+        f"💸 Total pagado: ${total}\n"
+        f"🧮 Intereses pagados: ${intereses}\n"
+        f"📈 Tasa por periodo: {tasa_periodo}%\n"
+        f"📅 Tasa anual equivalente (aproximada): {tasa_anual}%"
     )
 
-# ============================================
-# Conectar flujo si el usuario quiere abonar
-# ============================================
-
-        if contexto["esperando"] == "abono_extra":
-            try:
-                contexto["abono"] = Decimal(mensaje.replace(",", ""))
-                contexto["esperando"] = "desde_cuando"
-                return "¿A partir de qué periodo comenzarás a abonar esa cantidad? (Ejemplo: 4)"
-            except:
-                return "Por favor, escribe solo el número del abono extra (ejemplo: 500)"
-
-        if contexto["esperando"] == "desde_cuando":
-            try:
-                desde = int(mensaje.strip())
-                total_sin, total_con, ahorro, pagos_menos = calcular_ahorro_por_abonos(
-                    contexto["monto"],
-                    contexto["tasa"],
-                    contexto["plazo"],
-                    contexto["abono"],
-                    desde
-                )
-                estado_usuario.pop(numero)
-                return (
-                    f"💸 Si pagaras este crédito sin hacer abonos extra, terminarías pagando ${total_sin} en total.\n\n"
-                    f"Pero si decides abonar ${contexto['abono']} adicionales por periodo desde el periodo {desde}...\n"
-                    f"✅ Terminarías de pagar en menos tiempo (¡te ahorras {pagos_menos} pagos!)\n"
-                    f"💰 Pagarías ${total_con} en total\n"
-                    f"🧮 Y te ahorrarías ${ahorro} solo en intereses"
-                )
-            except:
-                return "Ocurrió un error al calcular el ahorro. Por favor revisa tus datos."
 # ============================================================
-# Cálculo del costo real de compras a pagos fijos en tiendas
+# Opción 4: ¿Cuánto me pueden prestar?
 # ============================================================
 
-from math import log
+def guardar_ingreso(contexto, ingreso):
+    contexto["ingreso"] = ingreso
+    return "pagos_fijos", (
+        "2️⃣ ¿Cuánto pagas mensualmente en créditos formales o instituciones financieras?\n"
+        "(No incluyas comida, renta, etc.)"
+    )
+
+
+def guardar_pagos_fijos(contexto, pagos_fijos):
+    contexto["pagos_fijos"] = pagos_fijos
+    return "deuda_revolvente", (
+        "3️⃣ ¿Cuánto debes actualmente en tarjetas de crédito u otras deudas revolventes?"
+    )
+
+
+def guardar_deuda_revolvente(contexto, deuda):
+    contexto["deuda_revolvente"] = deuda
+    return "riesgo", (
+        "4️⃣ Según tu experiencia, ¿cómo calificarías tu nivel de riesgo como cliente?\n"
+        "Escribe el número que mejor te describa:\n"
+        "1. Bajo: Siempre pago a tiempo y mantengo buen control\n"
+        "2. Medio: A veces me atraso o uso mucho mis tarjetas\n"
+        "3. Alto: Me atraso seguido o ya tengo deudas grandes"
+    )
+
+
+def calcular_capacidad(riesgo):
+    def manejador(contexto):
+        porcentaje_riesgo = PORCENTAJE_POR_RIESGO[riesgo]
+        contexto["riesgo"] = riesgo
+        contexto["porcentaje_riesgo"] = porcentaje_riesgo
+
+        capacidad_mensual = calcular_capacidad_mensual(
+            contexto["ingreso"], contexto["pagos_fijos"], contexto["deuda_revolvente"], riesgo
+        )
+        contexto["capacidad_mensual"] = capacidad_mensual
+
+        return "subopcion_prestamo", (
+            f"✅ Según tus datos, podrías pagar hasta ${capacidad_mensual} al mes en un nuevo crédito.\n\n"
+            "¿Qué te gustaría hacer ahora?\n"
+            "1. Calcular el monto máximo de crédito que podrías solicitar\n"
+            "2. Validar si un crédito que te interesa podría ser aprobado\n"
+            "Escribe 1 o 2 para continuar."
+        )
+    return manejador
+
+
+def elegir_monto_maximo(contexto):
+    return "plazo_simular", "📆 ¿A cuántos pagos (meses, quincenas, etc.) deseas simular el crédito?"
+
+
+def elegir_validar_credito(contexto):
+    return "monto_credito_deseado", "💰 ¿De cuánto sería el crédito que te interesa solicitar?"
+
+
+def guardar_plazo_simular(contexto, plazo):
+    contexto["plazo_simular"] = plazo
+    return "tasa_simular", "📈 ¿Cuál es la tasa de interés por periodo? Ejemplo: para 2.5%, escribe 0.025"
+
+
+def calcular_prestamo_maximo(contexto, tasa):
+    plazo = contexto["plazo_simular"]
+    capacidad = contexto["capacidad_mensual"]
+    monto_maximo = calcular_monto_maximo(capacidad, tasa, plazo)
+    # Misma tasa en los plazos más comunes, en una sola pasada
+    montos = tabla_montos_maximos(capacidad, [tasa], PLAZOS_ESTANDAR)["montos"][0]
+    filas = "\n".join(f"• {n} pagos: ${monto:.2f}" for n, monto in zip(PLAZOS_ESTANDAR, montos))
+    return FIN, (
+        f"✅ Con base en tu capacidad de pago de ${capacidad}, podrías aspirar a un crédito de hasta aproximadamente ${monto_maximo}.\n\n"
+        f"📋 Con la misma tasa, según el número de pagos:\n{filas}\n\n"
+        "¿Deseas volver al menú? Escribe *menú*."
+    )
+
+
+def guardar_monto_deseado(contexto, monto):
+    contexto["monto_deseado"] = monto
+    return "plazo_deseado", "📆 ¿En cuántos pagos (meses, quincenas, etc.) planeas pagarlo?"
 
-def calcular_costo_credito_tienda(precio_contado, pago_periodico, num_pagos):
-    precio = Decimal(str(precio_contado))
-    cuota = Decimal(str(pago_periodico))
-    n = int(num_pagos)
 
-    saldo = precio
-    r_estimada = Decimal('0.05')
-    for _ in range(100):
+def guardar_plazo_deseado(contexto, plazo):
+    contexto["plazo_deseado"] = plazo
+    return "tasa_deseada", "📈 ¿Cuál es la tasa de interés por periodo? Ejemplo: para 2.5%, escribe 0.025"
+
+
+def validar_credito_deseado(contexto, tasa):
+    monto = contexto["monto_deseado"]
+    plazo = contexto["plazo_deseado"]
+    capacidad = contexto["capacidad_mensual"]
+    porcentaje_riesgo = contexto["porcentaje_riesgo"]
+
+    pago_estimado = calcular_pago_fijo_excel(monto, tasa, plazo)
+
+    if pago_estimado <= capacidad:
+        return FIN, (
+            f"✅ Buenas noticias: podrías pagar este crédito.\n"
+            f"Tu pago mensual estimado sería de ${pago_estimado}, lo cual está dentro de tu capacidad de pago mensual (${capacidad}).\n\n"
+            "¿Deseas volver al menú? Escribe *menú*."
+        )
+
+    diferencia = (pago_estimado - capacidad).quantize(Decimal("0.01"))
+    incremento_ingreso = (diferencia / porcentaje_riesgo).quantize(Decimal("0.01"))
+    reduccion_revolvente = (diferencia / PAGO_REVOLVENTE).quantize(Decimal("0.01"))
+
+    # Las otras dos salidas: más pagos con la misma tasa, o una tasa más
+    # baja con los mismos pagos
+    opciones_credito = ""
+    if capacidad > 0:
+        plazo_viable = plazos_minimos(capacidad, monto, [tasa])[0]
+        if plazo_viable:
+            pago_viable = calcular_pago_fijo_excel(monto, tasa, plazo_viable)
+            opciones_credito += f"📆 Con la misma tasa sí podrías pagarlo en {plazo_viable} pagos de ${pago_viable}.\n"
+        tasa_viable = tasas_maximas(capacidad, monto, [plazo])[0]
+        if tasa_viable:
+            opciones_credito += f"📈 A {plazo} pagos necesitarías una tasa de máximo {tasa_viable * 100:.2f}% por periodo.\n"
+    if opciones_credito:
+        opciones_credito += "\n"
+
+    return FIN, (
+        f"❌ Actualmente no podrías pagar ese crédito.\n"
+        f"El pago mensual estimado sería de ${pago_estimado}, pero tu capacidad máxima es de ${capacidad}.\n\n"
+        "🔧 Algunas alternativas para hacerlo viable:\n"
+        f"1. Reducir tus pagos fijos en al menos ${diferencia}.\n"
+        f"2. Aumentar tus ingresos mensuales en aproximadamente ${incremento_ingreso}.\n"
+        f"3. Pagar tus deudas revolventes (como tarjetas) en al menos ${reduccion_revolvente}.\n\n"
+        f"{opciones_credito}"
+        "¿Deseas volver al menú? Escribe *menú*."
+    )
+
+# ============================================================
+# Opción 6: Comparar ofertas de crédito por su CAT
+# ============================================================
+
+MAX_OFERTAS_RESPUESTA = 10
+MEDALLAS = ("🥇", "🥈", "🥉")
+
+
+def pedir_ofertas(contexto):
+    return "ofertas_lista", (
+        "Escríbeme cada crédito en una línea con estos datos separados por /:\n"
+        "monto / tasa por periodo / número de pagos / comisión de apertura / comisiones y seguro por periodo\n\n"
+        "Los dos últimos son opcionales. Si los pagos no son mensuales, agrega la frecuencia al final "
+        "(quincenal, semanal, ...). Por ejemplo:\n"
+        "100000 / 0.02 / 24 / 2000 / 150\n"
+        "100000 / 0.009 / 52 / 0 / 80 / quincenal"
+    )
+
+
+def leer_ofertas(mensaje):
+    ofertas = []
+    for linea in mensaje.splitlines():
+        partes = [parte for parte in re.split(r"[/;\s]+", linea.replace(",", "").lower()) if parte]
+        if not partes:
+            continue
+        oferta = {"nombre": f"Crédito {len(ofertas) + 1}"}
+        if partes[-1] in FRECUENCIAS:
+            oferta["frecuencia"] = partes.pop()
+        if not 3 <= len(partes) <= 5:
+            raise ValueError(f"Se esperaban de 3 a 5 datos por crédito: {linea}")
+        campos = ("monto", "tasa", "plazo", "comision_apertura", "comision_periodica")
+        oferta.update(zip(campos, (Decimal(parte) for parte in partes)))
         try:
-            base = (Decimal('1') + r_estimada) ** (-n)
-            pago_calculado = saldo * r_estimada / (1 - base)
-            diferencia = pago_calculado - cuota
-            if abs(diferencia) < Decimal('0.0001'):
-                break
-            r_estimada -= diferencia / 1000
-        except:
-            break
-
-    tasa_periodo = r_estimada
-    total_pagado = cuota * n
-    intereses = total_pagado - precio
-    tasa_anual = ((Decimal('1') + tasa_periodo) ** Decimal('12')) - Decimal('1')
-
-    return (
-        total_pagado.quantize(Decimal("0.01")),
-        intereses.quantize(Decimal("0.01")),
-        (tasa_periodo * 100).quantize(Decimal("0.01")),
-        (tasa_anual * 100).quantize(Decimal("0.01"))
+            preparar_oferta(oferta)
+        except ErrorValidacion as e:
+            raise ErrorValidacion(e.motivo, f"{oferta['nombre']}: {e.mensaje}")
+        ofertas.append(oferta)
+    if not ofertas:
+        raise ValueError("Sin créditos")
+    return ofertas
+
+
+def responder_ofertas(contexto, ofertas):
+    clasificadas = comparar_ofertas(ofertas)["ofertas"]
+    lineas = ["📊 Tus créditos del más barato al más caro, según su costo anual total (CAT):"]
+    for resultado in clasificadas[:MAX_OFERTAS_RESPUESTA]:
+        lugar = resultado["lugar"]
+        marca = MEDALLAS[lugar - 1] if lugar <= len(MEDALLAS) else f"{lugar}."
+        cargos = resultado["pago_total"] - resultado["pago_credito"]
+        lineas.append(f"\n{marca} *{resultado['nombre']}*: CAT {resultado['cat']}%")
+        if cargos > 0:
+            lineas.append(f"   Pago por periodo: ${resultado['pago_total']:.2f} (incluye ${cargos:.2f} de comisiones y seguro)")
+        else:
+            lineas.append(f"   Pago por periodo: ${resultado['pago_total']:.2f}")
+        lineas.append(
+            f"   Total pagado: ${resultado['total_pagado']:.2f} (el crédito te cuesta ${resultado['costo_total']:.2f})"
+        )
+    if len(clasificadas) > MAX_OFERTAS_RESPUESTA:
+        lineas.append(f"\n…y {len(clasificadas) - MAX_OFERTAS_RESPUESTA} créditos más, todos con un CAT mayor.")
+    lineas.append(
+        "\n💡 El CAT ya incluye la tasa, la comisión de apertura, las comisiones y los seguros, "
+        "así que sirve para comparar créditos con distintos plazos y frecuencias de pago."
     )
+    lineas.append("\n¿Deseas volver al menú? Escribe *menú*.")
+    return FIN, "\n".join(lineas)
 
 # ============================================================
-# Conectar flujo si el usuario elige la opción 3 del menú
+# Opción 9: Varias deudas (avalancha contra bola de nieve)
 # ============================================================
 
-        if mensaje in ["3", "calcular el costo real de compras a pagos fijos en tiendas"]:
-            estado_usuario[numero] = {"esperando": "precio_contado"}
-            return (
-                "Vamos a calcular el costo real de una compra a pagos fijos.\n"
-                "Por favor dime lo siguiente:\n\n"
-                "1️⃣ ¿Cuál es el precio de contado del producto?"
-            )
+NOMBRES_MESES = (
+    "enero", "febrero", "marzo", "abril", "mayo", "junio",
+    "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"
+)
+
+NOMBRES_ESTRATEGIAS = {
+    "avalancha": "🏔️ *Avalancha* (primero la tasa más alta)",
+    "bola_de_nieve": "⛄ *Bola de nieve* (primero el saldo más chico)",
+}
+
+
+def fecha_en_meses(meses):
+    hoy = date.today()
+    total = hoy.year * 12 + hoy.month - 1 + meses
+    return f"{NOMBRES_MESES[total % 12]} {total // 12}"
+
+
+def leer_deudas(mensaje):
+    # Una deuda por línea: saldo / tasa / mínimo (también con espacios)
+    deudas = []
+    for linea in mensaje.splitlines():
+        partes = [parte for parte in re.split(r"[/;\s]+", linea.replace(",", "")) if parte]
+        if not partes:
+            continue
+        if len(partes) != 3:
+            raise ValueError(f"Se esperaban 3 datos por deuda: {linea}")
+        deudas.append([Decimal(parte) for parte in partes])
+    return validar_deudas(deudas)
+
+
+def guardar_deudas(contexto, deudas):
+    contexto["deudas"] = deudas
+    minimos = sum(minimo for _, _, minimo in deudas)
+    return "deudas_presupuesto", (
+        f"Anoté {len(deudas)} deuda(s); sus pagos mínimos suman ${minimos:.2f} al mes.\n\n"
+        "¿Cuánto puedes destinar en total cada mes a pagarlas?"
+    )
+
+
+def comparar_deudas(contexto, presupuesto):
+    comparacion = comparar_estrategias(contexto["deudas"], presupuesto)
+    planes = comparacion["estrategias"]
+    lineas = [f"📊 Así pagarías tus deudas con ${presupuesto} al mes:"]
+    for nombre, plan in planes.items():
+        lineas.append(f"\n{NOMBRES_ESTRATEGIAS[nombre]}")
+        lineas.append(f"• Terminas en {plan['meses']} meses ({fecha_en_meses(plan['meses'])})")
+        lineas.append(f"• Pagas ${plan['intereses']:.2f} de intereses")
+        if plan["ahorro_intereses"] is not None:
+            lineas.append(f"• Te ahorras ${plan['ahorro_intereses']:.2f} contra pagar solo los mínimos")
+        for indice in plan["orden"]:
+            mes = plan["liquidaciones"][indice]
+            lineas.append(f"   Deuda {indice + 1}: liquidada en el mes {mes} ({fecha_en_meses(mes)})")
+
+    avalancha, bola = planes["avalancha"], planes["bola_de_nieve"]
+    diferencia = bola["intereses"] - avalancha["intereses"]
+    if diferencia > 0:
+        lineas.append(f"\n✅ Con avalancha pagas ${diferencia:.2f} menos de intereses.")
+    else:
+        lineas.append("\n✅ Con tus deudas ambas estrategias cuestan lo mismo; la bola de nieve te da logros más rápido.")
+
+    solo_minimos = comparacion["solo_minimos"]
+    if solo_minimos is None:
+        lineas.append("⚠️ Si solo pagaras los mínimos, nunca terminarías de pagar.")
+    else:
+        lineas.append(
+            f"📌 Solo con los mínimos tardarías {solo_minimos['meses']} meses "
+            f"y pagarías ${solo_minimos['intereses']:.2f} de intereses."
+        )
+    lineas.append("\n¿Deseas volver al menú? Escribe *menú*.")
+    return FIN, "\n".join(lineas)
 
-        if contexto.get("esperando") == "precio_contado":
-            try:
-                contexto["precio_contado"] = Decimal(mensaje.replace(",", ""))
-                contexto["esperando"] = "pago_fijo"
-                return "2️⃣ ¿De cuánto será cada pago (por ejemplo: 250)?"
-            except:
-                return "Por favor, indica el precio de contado con números (ejemplo: 1800)"
-
-        if contexto.get("esperando") == "pago_fijo":
-            try:
-                contexto["pago_fijo"] = Decimal(mensaje.replace(",", ""))
-                contexto["esperando"] = "numero_pagos"
-                return "3️⃣ ¿Cuántos pagos harás en total?"
-            except:
-                return "Por favor, escribe solo la cantidad del pago fijo (ejemplo: 250)"
-
-        if contexto.get("esperando") == "numero_pagos":
-            try:
-                num_pagos = int(mensaje.strip())
-                total, intereses, tasa_periodo, tasa_anual = calcular_costo_credito_tienda(
-                    contexto["precio_contado"],
-                    contexto["pago_fijo"],
-                    num_pagos
-                )
-                estado_usuario.pop(numero)
-                return (
-                    f"📊 Aquí tienes los resultados:\n"
-                    f"💰 Precio de contado: ${contexto['precio_contado']}\n"
-                    f"📆 Pagos fijos de ${contexto['pago_fijo']} durante {num_pagos} periodos\n\n"
-                    f"💸 Total pagado: ${total}\n"
-                    f"🧮 Intereses pagados: ${intereses}\n"
-                    f"📈 Tasa por periodo: {tasa_periodo}%\n"
-                    f"📅 Tasa anual equivalente (aproximada): {tasa_anual}%"
-                )
-            except:
-                return "Ocurrió un error al calcular el crédito. Revisa tus datos e intenta de nuevo."
 # ============================================================
-# Parte 6: ¿Cuánto me pueden prestar?
+# Opción 10: Crédito con tasa variable
 # ============================================================
 
-        if mensaje in ["4", "¿cuánto me pueden prestar?"]:
-            estado_usuario[numero] = {"esperando": "ingreso"}
-            return (
-                "Vamos a calcular cuánto podrías solicitar como crédito, con base en tu capacidad de pago.\n\n"
-                "Primero necesito saber:\n"
-                "1️⃣ ¿Cuál es tu ingreso neto mensual? (Después de impuestos y deducciones)"
-            )
+def leer_credito_variable(mensaje):
+    partes = [parte for parte in re.split(r"[/;\s]+", mensaje.replace(",", "")) if parte]
+    if len(partes) != 3:
+        raise ValueError("Se esperaban monto, tasa y número de pagos")
+    monto, tasa, plazo = (Decimal(parte) for parte in partes)
+    return validar_monto(monto), validar_tasa(tasa), validar_plazo(plazo)
 
-        if contexto.get("esperando") == "ingreso":
-            try:
-                contexto["ingreso"] = Decimal(mensaje.replace(",", ""))
-                contexto["esperando"] = "pagos_fijos"
-                return (
-                    "2️⃣ ¿Cuánto pagas mensualmente en créditos formales o instituciones financieras?\n"
-                    "(No incluyas comida, renta, etc.)"
-                )
-            except:
-                return "Por favor, escribe solo el ingreso mensual en números (ejemplo: 12500)"
-
-        if contexto.get("esperando") == "pagos_fijos":
-            try:
-                contexto["pagos_fijos"] = Decimal(mensaje.replace(",", ""))
-                contexto["esperando"] = "deuda_revolvente"
-                return (
-                    "3️⃣ ¿Cuánto debes actualmente en tarjetas de crédito u otras deudas revolventes?"
-                )
-            except:
-                return "Por favor, indica solo la cantidad mensual que pagas en créditos (ejemplo: 1800)"
-
-        if contexto.get("esperando") == "deuda_revolvente":
-            try:
-                contexto["deuda_revolvente"] = Decimal(mensaje.replace(",", ""))
-                contexto["esperando"] = "riesgo"
-                return (
-                    "4️⃣ Según tu experiencia, ¿cómo calificarías tu nivel de riesgo como cliente?\n"
-                    "Escribe el número que mejor te describa:\n"
-                    "1. Bajo: Siempre pago a tiempo y mantengo buen control\n"
-                    "2. Medio: A veces me atraso o uso mucho mis tarjetas\n"
-                    "3. Alto: Me atraso seguido o ya tengo deudas grandes"
-                )
-            except:
-                return "Por favor, indica el monto total que debes en tarjetas u otros créditos revolventes."
-
-        if contexto.get("esperando") == "riesgo":
-            riesgo = mensaje.strip()
-            if riesgo not in ["1", "2", "3"]:
-                return "Por favor, escribe 1, 2 o 3 para indicar tu nivel de riesgo."
-            
-            contexto["riesgo"] = riesgo
-            porcentaje_riesgo = {"1": Decimal("0.60"), "2": Decimal("0.45"), "3": Decimal("0.30")}[riesgo]
-            contexto["porcentaje_riesgo"] = porcentaje_riesgo
-
-            ingreso = contexto["ingreso"]
-            pagos_fijos = contexto["pagos_fijos"]
-            deuda_revolvente = contexto["deuda_revolvente"]
-            pago_estimado_revolvente = deuda_revolvente * Decimal("0.06")
-            capacidad_total = ingreso * porcentaje_riesgo
-            capacidad_mensual = capacidad_total - pagos_fijos - pago_estimado_revolvente
-            capacidad_mensual = capacidad_mensual.quantize(Decimal("0.01"))
-
-            contexto["capacidad_mensual"] = capacidad_mensual
-            contexto["esperando"] = "subopcion_prestamo"
-
-            return (
-                f"✅ Según tus datos, podrías pagar hasta ${capacidad_mensual} al mes en un nuevo crédito.\n\n"
-                "¿Qué te gustaría hacer ahora?\n"
-                "1. Calcular el monto máximo de crédito que podrías solicitar\n"
-                "2. Validar si un crédito que te interesa podría ser aprobado\n"
-                "Escribe 1 o 2 para continuar."
-            )
 
-        if contexto.get("esperando") == "subopcion_prestamo":
-            opcion = mensaje.strip()
-            if opcion == "1":
-                contexto["esperando"] = "plazo_simular"
-                return "📆 ¿A cuántos pagos (meses, quincenas, etc.) deseas simular el crédito?"
-            elif opcion == "2":
-                contexto["esperando"] = "monto_credito_deseado"
-                return "💰 ¿De cuánto sería el crédito que te interesa solicitar?"
-            else:
-                return "Por favor, escribe 1 para simular el monto máximo o 2 para validar un crédito que ya tienes en mente."
-
-        if contexto.get("esperando") == "plazo_simular":
-            try:
-                contexto["plazo_simular"] = Decimal(mensaje.replace(",", ""))
-                contexto["esperando"] = "tasa_simular"
-                return "📈 ¿Cuál es la tasa de interés por periodo? Ejemplo: para 2.5%, escribe 0.025"
-            except:
-                return "Por favor, indica el plazo en cantidad de pagos (ejemplo: 24)"
-
-        if contexto.get("esperando") == "tasa_simular":
-            try:
-                tasa = Decimal(mensaje.replace(",", ""))
-                plazo = contexto["plazo_simular"]
-                capacidad = contexto["capacidad_mensual"]
-                base = Decimal("1") + tasa
-                potencia = base ** plazo
-                inverso = Decimal("1") / potencia
-                factor = (Decimal("1") - inverso) / tasa
-                monto_maximo = (capacidad * factor).quantize(Decimal("0.01"))
-                estado_usuario.pop(numero)
-                return (
-                    f"✅ Con base en tu capacidad de pago de ${capacidad}, podrías aspirar a un crédito de hasta aproximadamente ${monto_maximo}.\n\n"
-                    "¿Deseas volver al menú? Escribe *menú*."
-                )
-            except:
-                return "Por favor asegúrate de indicar la tasa como número decimal (ejemplo: 0.025 para 2.5%)"
-
-        if contexto.get("esperando") == "monto_credito_deseado":
-            try:
-                contexto["monto_deseado"] = Decimal(mensaje.replace(",", ""))
-                contexto["esperando"] = "plazo_deseado"
-                return "📆 ¿En cuántos pagos (meses, quincenas, etc.) planeas pagarlo?"
-            except:
-                return "Por favor, escribe solo la cantidad del crédito deseado (ejemplo: 300000)"
-
-        if contexto.get("esperando") == "plazo_deseado":
-            try:
-                contexto["plazo_deseado"] = Decimal(mensaje.replace(",", ""))
-                contexto["esperando"] = "tasa_deseada"
-                return "📈 ¿Cuál es la tasa de interés por periodo? Ejemplo: para 2.5%, escribe 0.025"
-            except:
-                return "Por favor, indica el número total de pagos."
-
-        if contexto.get("esperando") == "tasa_deseada":
-            try:
-                monto = contexto["monto_deseado"]
-                plazo = contexto["plazo_deseado"]
-                tasa = Decimal(mensaje.replace(",", ""))
-                capacidad = contexto["capacidad_mensual"]
-                porcentaje_riesgo = contexto["porcentaje_riesgo"]
-
-                pago_estimado = calcular_pago_fijo_excel(monto, tasa, plazo)
-
-                if pago_estimado <= capacidad:
-                    estado_usuario.pop(numero)
-                    return (
-                        f"✅ Buenas noticias: podrías pagar este crédito.\n"
-                        f"Tu pago mensual estimado sería de ${pago_estimado}, lo cual está dentro de tu capacidad de pago mensual (${capacidad}).\n\n"
-                        "¿Deseas volver al menú? Escribe *menú*."
-                    )
-                else:
-                    diferencia = (pago_estimado - capacidad).quantize(Decimal("0.01"))
-                    incremento_ingreso = (diferencia / porcentaje_riesgo).quantize(Decimal("0.01"))
-                    reduccion_revolvente = (diferencia / Decimal("0.06")).quantize(Decimal("0.01"))
-                    estado_usuario.pop(numero)
-                    return (
-                        f"❌ Actualmente no podrías pagar ese crédito.\n"
-                        f"El pago mensual estimado sería de ${pago_estimado}, pero tu capacidad máxima es de ${capacidad}.\n\n"
-                        "🔧 Algunas alternativas para hacerlo viable:\n"
-                        f"1. Reducir tus pagos fijos en al menos ${diferencia}.\n"
-                        f"2. Aumentar tus ingresos mensuales en aproximadamente ${incremento_ingreso}.\n"
-                        f"3. Pagar tus deudas revolventes (como tarjetas) en al menos ${reduccion_revolvente}.\n\n"
-                        "¿Deseas volver al menú? Escribe *menú*."
-                    )
-            except:
-                return "Ocurrió un error al validar el crédito. Revisa tus datos y vuelve a intentarlo."
-        if mensaje in ["5", "consejos para pagar un crédito sin ahogarte"]:
-            return (
-                "🟡 *Consejos para pagar un crédito sin ahogarte*\n"
-                "Pagar un crédito no tiene que sentirse como una carga eterna. Aquí van algunos consejos sencillos para ayudarte a pagar con más tranquilidad y menos estrés:\n"
-                "________________________________________\n"
-                "✅ 1. Haz pagos anticipados cuando puedas\n"
-                "📌 Aunque no sea obligatorio, abonar un poco más al capital te ahorra intereses y reduce el plazo.\n"
-                "💡 Incluso $200 o $500 adicionales hacen una gran diferencia con el tiempo.\n"
-                "________________________________________\n"
-                "✅ 2. Programa tus pagos en automático\n"
-                "📌 Evitas atrasos, recargos y estrés.\n"
-                "💡 Si no tienes domiciliación, pon recordatorios para no fallar.\n"
-                "________________________________________\n"
-                "✅ 3. Revisa si puedes cambiar tu crédito por uno mejor\n"
-                "📌 A esto se le llama “reestructura” o “portabilidad”.\n"
-                "💡 Si tu historial ha mejorado, podrías conseguir mejores condiciones.\n"
-                "________________________________________\n"
-                "✅ 4. Haz un presupuesto mensual\n"
-                "📌 Saber cuánto entra y cuánto sale te ayuda a organizar tus pagos sin descuidar otras necesidades.\n"
-                "💡 Apóyate en apps, papel o Excel, lo que te funcione.\n"
-                "________________________________________\n"
-                "✅ 5. Prioriza las deudas más caras\n"
-                "📌 Si tienes varias, enfócate primero en las que tienen interés más alto, como tarjetas de crédito.\n"
-                "________________________________________\n"
-                "¿Te gustaría simular cuánto podrías ahorrar si haces pagos extra?\n"
-                "Solo dime *simular crédito* o escribe *menú* para regresar al inicio."
-            )
-        if mensaje in ["6", "cómo identificar un crédito caro"]:
-            return (
-                "🟡 *Cómo identificar un crédito caro*\n"
-                "Muchas veces un crédito parece accesible… hasta que ves lo que terminas pagando. Aquí te doy algunas claves para detectar si un crédito es caro:\n"
-                "________________________________________\n"
-                "🔍 1. CAT (Costo Anual Total)\n"
-                "Es una medida que incluye la tasa de interés, comisiones y otros cargos.\n"
-                "📌 Entre más alto el CAT, más caro te saldrá el crédito.\n"
-                "💡 Compara el CAT entre diferentes instituciones, no solo la tasa.\n"
-                "________________________________________\n"
-                "🔍 2. Comisiones escondidas\n"
-                "Algunos créditos cobran por apertura, por manejo, por pagos tardíos o por pagos anticipados 😵\n"
-                "📌 Lee siempre el contrato antes de firmar.\n"
-                "________________________________________\n"
-                "🔍 3. Tasa de interés variable\n"
-                "📌 Algunos créditos no tienen tasa fija, sino que pueden subir.\n"
-                "💡 Revisa si tu tasa es fija o variable. Las variables pueden volverse muy caras si sube la inflación.\n"
-                "________________________________________\n"
-                "🔍 4. Pago mensual bajo con plazo largo\n"
-                "Parece atractivo, pero terminas pagando muchísimo más en intereses.\n"
-                "________________________________________\n"
-                "❗ Si el crédito parece demasiado fácil o rápido, pero no entiendes bien cuánto vas a pagar en total... ¡es una señal de alerta!\n\n"
-                "¿Te gustaría que te ayude a comparar dos créditos que estés considerando?\n"
-                "Solo dime los datos y lo vemos junt@s 😊"
-            )
-        if mensaje in ["7", "errores comunes al solicitar un crédito"]:
-            return (
-                "🟡 *Errores comunes al solicitar un crédito*\n"
-                "Solicitar un crédito es una gran responsabilidad. Aquí te comparto algunos errores comunes que muchas personas cometen… ¡y cómo evitarlos!\n"
-                "________________________________________\n"
-                "❌ 1. No saber cuánto terminarás pagando en total\n"
-                "Muchas personas solo se fijan en el pago mensual y no en el costo total del crédito.\n"
-                "✅ Usa simuladores (como el que tengo 😎) para saber cuánto pagarás realmente.\n"
-                "________________________________________\n"
-                "❌ 2. Pedir más dinero del que realmente necesitas\n"
-                "📌 Entre más pidas, más intereses pagas.\n"
-                "✅ Pide solo lo necesario y asegúrate de poder pagarlo.\n"
-                "________________________________________\n"
-                "❌ 3. Aceptar el primer crédito que te ofrecen\n"
-                "📌 Hay diferencias enormes entre una institución y otra.\n"
-                "✅ Compara tasas, comisiones y condiciones antes de decidir.\n"
-                "________________________________________\n"
-                "❌ 4. No leer el contrato completo\n"
-                "Sí, puede ser largo, pero ahí están los detalles importantes:\n"
-                "📌 ¿Hay comisiones por pagar antes de tiempo?\n"
-                "📌 ¿Qué pasa si te atrasas?\n"
-                "✅ Lee con calma o pide que te lo expliquen.\n"
-                "________________________________________\n"
-                "❌ 5. Usar un crédito sin un plan de pago\n"
-                "📌 Si no sabes cómo lo vas a pagar, puedes meterte en problemas.\n"
-                "✅ Haz un presupuesto antes de aceptar cualquier crédito.\n"
-                "________________________________________\n\n"
-                "¿Te gustaría que te ayude a planear cómo pagar tu crédito sin agobios?\n"
-                "Solo dime y con gusto te oriento ✨"
-            )
-        if mensaje in ["8", "entender el buró de crédito"]:
-            estado_usuario[numero] = {"esperando": "submenu_buro"}
-            return (
-                "🟡 *Entender el Buró de Crédito*\n"
-                "El Buró de Crédito no es un enemigo, es solo un registro de cómo has manejado tus créditos. Y sí, puede ayudarte o perjudicarte según tu comportamiento.\n"
-                "________________________________________\n"
-                "📊 ¿Qué es el Buró de Crédito?\n"
-                "Es una empresa que guarda tu historial de pagos.\n"
-                "📌 Si pagas bien, tu historial será positivo.\n"
-                "📌 Si te atrasas, se reflejará ahí.\n"
-                "________________________________________\n"
-                "💡 *Tener historial no es malo.*\n"
-                "De hecho, si nunca has pedido un crédito, no aparecerás en Buró y eso puede dificultar que te aprueben uno.\n"
-                "________________________________________\n"
-                "📈 *Tu comportamiento crea un “score” o puntaje.*\n"
-                "• Pagar a tiempo te ayuda\n"
-                "• Deber mucho o atrasarte te baja el score\n"
-                "• Tener muchas tarjetas al tope también afecta\n"
-                "________________________________________\n"
-                "❗ *Cuidado con estas ideas falsas:*\n"
-                "• “Estoy en Buró” no siempre es malo\n"
-                "• No es una lista negra\n"
-                "• No te borran tan fácil (los registros duran años)\n"
-                "________________________________________\n\n"
-                "¿Te gustaría saber cómo mejorar tu historial crediticio o qué pasos tomar para subir tu puntaje?\n"
-                "Solo dime *sí* y lo revisamos junt@s 😊"
-            )
+def simular_credito_variable(contexto, datos):
+    monto, tasa, plazo = datos
+    # Semilla fija: la misma pregunta siempre tiene la misma respuesta
+    simulacion = simular_tasa_variable(monto, tasa, plazo, modelo="choques")
+    fijo = simulacion["tasa_fija"]
+    pagos = simulacion["pago_maximo"]
+    intereses = simulacion["intereses"]
+    aumento = (intereses["p95"] / fijo["intereses"] - 1) * 100
+    return FIN, (
+        f"📊 Simulé {simulacion['caminos']:,} escenarios de cómo podría moverse tu tasa, con subidas bruscas ocasionales.\n\n"
+        f"📌 Si la tasa se quedara fija: pago de ${fijo['pago']:.2f} y ${fijo['intereses']:.2f} de intereses.\n"
+        f"📈 En un escenario típico: tu pago llegaría hasta ${pagos['p50']:.2f} y pagarías ${intereses['p50']:.2f} de intereses.\n"
+        f"⚠️ En el peor 5% de los escenarios: tu pago llegaría a ${pagos['p95']:.2f} o más "
+        f"y pagarías ${intereses['p95']:.2f} de intereses ({aumento:.0f}% más que con tasa fija).\n\n"
+        "💡 Antes de aceptar una tasa variable, revisa si podrías pagar ese peor escenario.\n\n"
+        "¿Deseas volver al menú? Escribe *menú*."
+    )
+
+# ============================================================
+# Opción 8: Submenú del Buró de Crédito
+# ============================================================
+
+def mostrar_submenu_buro(contexto):
+    return FIN, texto_submenu_buro
+
+# ============================================================
+# Tabla de estados
+# ============================================================
+
+FLUJO = [
+    # Opción 1
+    Estado("monto_credito", guardar_monto, leer_monto,
+           "Por favor, escribe solo el monto del crédito en números (ejemplo: 100000)",
+           siguientes=("plazo_credito",)),
+    Estado("plazo_credito", guardar_plazo, leer_plazos,
+           "Por favor, indica el número de pagos (ejemplo: 24, o varios como 12/24/36)",
+           siguientes=("tasa_credito",)),
+    Estado("tasa_credito", simular_credito, leer_texto,
+           "Por favor escribe la tasa como un número decimal. Ejemplo: 0.025 para 2.5%",
+           siguientes=("ver_si_abonos", FIN)),
+    Estado("ver_si_abonos", opciones={"sí": aceptar_abonos, "no": rechazar_abonos},
+           siguientes=("abono_extra", FIN)),
+    Estado("abono_extra", guardar_abono, leer_cantidad,
+           "Por favor, escribe solo el número del abono extra (ejemplo: 500)",
+           siguientes=("desde_cuando",)),
+    Estado("desde_cuando", calcular_ahorro, leer_entero,
+           "Ocurrió un error al calcular el ahorro. Por favor revisa tus datos.",
+           siguientes=("repetir_abono",)),
+    Estado("repetir_abono", opciones={"otro abono": pedir_otro_abono, "otro periodo": pedir_otro_periodo},
+           siguientes=("cambiar_abono", "cambiar_desde")),
+    Estado("cambiar_abono", cambiar_abono, leer_cantidad,
+           "Por favor, escribe solo el número del abono extra (ejemplo: 500)",
+           siguientes=("repetir_abono",)),
+    Estado("cambiar_desde", cambiar_desde, leer_entero,
+           "Por favor, escribe solo el número del periodo (ejemplo: 4)",
+           siguientes=("repetir_abono",)),
+
+    # Opción 3
+    Estado("precio_contado", guardar_precio_contado, leer_monto,
+           "Por favor, indica el precio de contado con números (ejemplo: 1800)",
+           siguientes=("pago_fijo",)),
+    Estado("pago_fijo", guardar_pago_tienda, leer_monto,
+           "Por favor, escribe solo la cantidad del pago fijo (ejemplo: 250)",
+           siguientes=("numero_pagos",)),
+    Estado("numero_pagos", calcular_costo_tienda, leer_plazo,
+           "Ocurrió un error al calcular el crédito. Revisa tus datos e intenta de nuevo.",
+           siguientes=(FIN,)),
+
+    # Opción 4
+    Estado("ingreso", guardar_ingreso, leer_monto,
+           "Por favor, escribe solo el ingreso mensual en números (ejemplo: 12500)",
+           siguientes=("pagos_fijos",)),
+    Estado("pagos_fijos", guardar_pagos_fijos, leer_cantidad,
+           "Por favor, indica solo la cantidad mensual que pagas en créditos (ejemplo: 1800)",
+           siguientes=("deuda_revolvente",)),
+    Estado("deuda_revolvente", guardar_deuda_revolvente, leer_cantidad,
+           "Por favor, indica el monto total que debes en tarjetas u otros créditos revolventes.",
+           siguientes=("riesgo",)),
+    Estado("riesgo", opciones={riesgo: calcular_capacidad(riesgo) for riesgo in PORCENTAJE_POR_RIESGO},
+           otro="Por favor, escribe 1, 2 o 3 para indicar tu nivel de riesgo.",
+           siguientes=("subopcion_prestamo",)),
+    Estado("subopcion_prestamo", opciones={"1": elegir_monto_maximo, "2": elegir_validar_credito},
+           otro="Por favor, escribe 1 para simular el monto máximo o 2 para validar un crédito que ya tienes en mente.",
+           siguientes=("plazo_simular", "monto_credito_deseado")),
+    Estado("plazo_simular", guardar_plazo_simular, leer_plazo,
+           "Por favor, indica el plazo en cantidad de pagos (ejemplo: 24)",
+           siguientes=("tasa_simular",)),
+    Estado("tasa_simular", calcular_prestamo_maximo, leer_tasa,
+           "Por favor asegúrate de indicar la tasa como número decimal (ejemplo: 0.025 para 2.5%)",
+           siguientes=(FIN,)),
+    Estado("monto_credito_deseado", guardar_monto_deseado, leer_monto,
+           "Por favor, escribe solo la cantidad del crédito deseado (ejemplo: 300000)",
+           siguientes=("plazo_deseado",)),
+    Estado("plazo_deseado", guardar_plazo_deseado, leer_plazo,
+           "Por favor, indica el número total de pagos.",
+           siguientes=("tasa_deseada",)),
+    Estado("tasa_deseada", validar_credito_deseado, leer_tasa,
+           "Ocurrió un error al validar el crédito. Revisa tus datos y vuelve a intentarlo.",
+           siguientes=(FIN,)),
+
+    # Opción 6
+    Estado("ver_si_comparar", opciones={"sí": pedir_ofertas}, siguientes=("ofertas_lista",)),
+    Estado("ofertas_lista", responder_ofertas, leer_ofertas,
+           "Por favor, escribe cada crédito en una línea: monto / tasa / número de pagos / apertura / comisiones "
+           "(ejemplo: 100000 / 0.02 / 24 / 2000 / 150)",
+           siguientes=(FIN,)),
+
+    # Opción 9
+    Estado("deudas_lista", guardar_deudas, leer_deudas,
+           "Por favor, escribe cada deuda en una línea: saldo / tasa mensual / pago mínimo (ejemplo: 15000 / 0.035 / 900)",
+           siguientes=("deudas_presupuesto",)),
+    Estado("deudas_presupuesto", comparar_deudas, leer_monto,
+           "Por favor, escribe solo la cantidad que puedes pagar al mes (ejemplo: 3000)",
+           siguientes=(FIN,)),
+
+    # Opción 10
+    Estado("variable_datos", simular_credito_variable, leer_credito_variable,
+           "Por favor, escribe el monto, la tasa y el número de pagos separados por / (ejemplo: 1000000 / 0.01 / 240)",
+           siguientes=(FIN,)),
+
+    # Opción 8
+    Estado("submenu_buro", opciones={"sí": mostrar_submenu_buro}, siguientes=(FIN,)),
+]
+
+ESTADOS = {estado.nombre: estado for estado in FLUJO}
+COMANDOS_GLOBALES = {entrada: opcion for opcion in COMANDOS for entrada in opcion.entradas}
+OPCIONES_MENU = {entrada: opcion for opcion in MENU for entrada in opcion.entradas}
+# Los nombres completos de las opciones no se confunden con respuestas
+# de un paso, así que funcionan desde cualquier estado; los números no
+OPCIONES_POR_NOMBRE = {entrada: opcion for entrada, opcion in OPCIONES_MENU.items() if not entrada.isdigit()}
+
+validar_flujo(ESTADOS, COMANDOS + MENU)
+FLUJO_POR_ESTADO = flujos_por_estado(ESTADOS, MENU)
+
+# ============================================================
+# Arranque (gunicorn --preload "bot_credito:crear_app()")
+# ============================================================
+#
+# Con --preload el módulo se importa una sola vez en el proceso padre y
+# todo lo que se arma aquí (flujos validados, respuestas fijas ya
+# divididas y serializadas, cálculos calentados) lo comparten los
+# workers copy-on-write. Los hilos, conexiones y el grupo de procesos se
+# crean después, en cada worker, la primera vez que se usan.
+
+ESCENARIOS_CALENTAMIENTO = [
+    {"tipo": "pago_fijo", "monto": 100000, "tasa": "0.02", "plazo": 24},
+    {"tipo": "ahorro_abonos", "monto": 100000, "tasa": "0.02", "plazo": 24, "abono": 500, "desde": 3},
+    {"tipo": "credito_tienda", "precio": 10000, "pago": 1000, "plazo": 12},
+    {"tipo": "capacidad", "ingreso": 20000, "pagos_fijos": 2000, "deuda_revolvente": 5000, "riesgo": 2,
+     "monto": 200000, "tasa": "0.02", "plazo": 24},
+]
+ENTREGA_CALENTAMIENTO = {"entry": [{"changes": [{"value": {"messages": [
+    {"from": "5215500000000", "id": "wamid.calentamiento", "timestamp": "0", "type": "text", "text": {"body": "hola"}}
+]}}]}]}
+
+
+def calentar():
+    # Sin tocar métricas, sesiones ni la cola: solo lo que se carga
+    # perezosamente la primera vez (rutas de Flask, lectura de entregas,
+    # los caminos de Decimal y NumPy de los cálculos)
+    app.url_map.bind("localhost").match("/webhook", "POST")
+    agrupar_mensajes(list(recorrer_mensajes(ENTREGA_CALENTAMIENTO)))
+    simular_bloque(1, ESCENARIOS_CALENTAMIENTO)
+
+
+def crear_app():
+    inicio = time.perf_counter()
+    calentar()
+    # El recolector de basura ya no recorre lo que existe hasta aquí, así
+    # que no escribe en esas páginas y no se copian en cada worker
+    gc.freeze()
+    tiempos_arranque.marcar("preparacion", inicio)
+    return app
+
 
-        if numero in estado_usuario and estado_usuario[numero].get("esperando") == "submenu_buro":
-            if mensaje.strip().lower() == "sí":
-                estado_usuario.pop(numero)
-                return (
-                    "📂 *Submenú: ¿Cómo mejorar mi historial crediticio?*\n"
-                    "Aquí tienes algunos consejos prácticos para mejorar tu score en Buró de Crédito y tener un historial más saludable 📈\n"
-                    "________________________________________\n"
-                    "🔹 1. *Paga a tiempo, siempre*\n"
-                    "📌 Aunque sea el pago mínimo, evita atrasarte.\n"
-                    "✅ La puntualidad pesa mucho en tu historial.\n"
-                    "________________________________________\n"
-                    "🔹 2. *Usa tus tarjetas con moderación*\n"
-                    "📌 Trata de no usar más del 30%-40% del límite de tu tarjeta.\n"
-                    "✅ Usarlas hasta el tope te resta puntos, aunque pagues.\n"
-                    "________________________________________\n"
-                    "🔹 3. *No abras muchos créditos al mismo tiempo*\n"
-                    "📌 Si pides varios préstamos en poco tiempo, parecerá que estás desesperado/a por dinero.\n"
-                    "✅ Ve uno a la vez y maneja bien el que tienes.\n"
-                    "________________________________________\n"
-                    "🔹 4. *Usa algún crédito, aunque sea pequeño*\n"
-                    "📌 Si no tienes historial, nunca tendrás score.\n"
-                    "✅ Una tarjeta departamental o un plan telefónico pueden ser un buen inicio si los manejas bien.\n"
-                    "________________________________________\n"
-                    "🔹 5. *Revisa tu historial al menos una vez al año*\n"
-                    "📌 Puedes pedir un reporte gratuito en www.burodecredito.com.mx\n"
-                    "✅ Asegúrate de que no haya errores y de que tus datos estén correctos.\n"
-                    "________________________________________\n"
-                    "💡 ¿Quieres que te dé el link para pedir tu reporte de Buró gratis?\n"
-                    "Solo dime *reporte* y te lo comparto."
-                )
-
-        if mensaje.strip().lower() == "reporte":
-            return "Aquí tienes el enlace oficial para consultar tu reporte gratuito de Buró de Crédito: https://www.burodecredito.com.mx"
+tiempos_arranque.marcar("importacion")
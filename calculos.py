@@ -0,0 +1,571 @@
+# =========================================
+# Cálculos financieros del bot de crédito
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Funciones de cálculo (pago fijo, abonos extra y
+# crédito en tiendas) separadas del flujo de conversación
+# =========================================
+
+import os
+from decimal import Context, Decimal, localcontext
+from functools import lru_cache, wraps
+from math import ceil, log
+
+from validacion import (
+    ErrorValidacion,
+    validar_monto,
+    validar_tasa,
+    validar_plazo,
+    validar_periodo,
+    validar_amortizacion
+)
+
+# Precisión tipo Excel. Cada cálculo abre su propio contexto local en
+# vez de cambiar getcontext(), que es del hilo y lo comparten todas las
+# peticiones que atiende ese hilo.
+CONTEXTO_EXCEL = Context(prec=17)
+
+CENTAVO = Decimal("0.01")
+
+# Máximo de periodos que puede recorrer el cálculo periodo por periodo
+MAX_PERIODOS_RECORRIDO = int(os.environ.get("MAX_PERIODOS_RECORRIDO", "5000"))
+
+
+def con_precision_excel(funcion):
+    # Corre la función dentro de un contexto local con CONTEXTO_EXCEL
+    @wraps(funcion)
+    def envuelta(*args, **kwargs):
+        with localcontext(CONTEXTO_EXCEL):
+            return funcion(*args, **kwargs)
+    return envuelta
+
+# =========================================
+# Caché de factores de anualidad por (tasa, plazo)
+# =========================================
+#
+# La mayoría de las consultas usan pocas tasas y plazos, así que
+# (1 + r)^n y 1 - (1 + r)^-n se guardan con desalojo LRU. lru_cache ya
+# es seguro entre hilos y lleva la cuenta de aciertos y fallos. El
+# tamaño se configura con TAMANO_CACHE_FACTORES o con
+# configurar_cache_factores(). La llave es solo (tasa, plazo), así que
+# los factores se calculan siempre con CONTEXTO_EXCEL, sin importar el
+# contexto de quien llame.
+
+TAMANO_CACHE_FACTORES = int(os.environ.get("TAMANO_CACHE_FACTORES", "1024"))
+
+
+@con_precision_excel
+def _calcular_factores(tasa, plazo):
+    uno_mas_r = Decimal('1') + tasa
+    base_elevada = uno_mas_r ** plazo
+    inverso = Decimal('1') / base_elevada
+    denominador = Decimal('1') - inverso
+    return base_elevada, denominador
+
+
+_factores_en_cache = lru_cache(maxsize=TAMANO_CACHE_FACTORES)(_calcular_factores)
+
+
+def factores_anualidad(tasa, plazo):
+    # Regresa ((1 + r)^n, 1 - (1 + r)^-n) para tasa y plazo en Decimal
+    return _factores_en_cache(Decimal(str(tasa)), Decimal(str(plazo)))
+
+
+def configurar_cache_factores(tamano_maximo):
+    global _factores_en_cache
+    _factores_en_cache = lru_cache(maxsize=tamano_maximo)(_calcular_factores)
+
+
+def estadisticas_cache_factores():
+    info = _factores_en_cache.cache_info()
+    return {
+        "aciertos": info.hits,
+        "fallos": info.misses,
+        "tamano": info.currsize,
+        "tamano_maximo": info.maxsize,
+    }
+
+
+def limpiar_cache_factores():
+    _factores_en_cache.cache_clear()
+
+# =========================================
+# Función: Cálculo de pago fijo (validado estilo Excel)
+# =========================================
+
+@con_precision_excel
+def calcular_pago_fijo_excel(monto, tasa, plazo):
+    P = validar_monto(monto, "El monto", permitir_cero=True)
+    r = validar_tasa(tasa)
+    plazo = validar_plazo(plazo)
+    return pago_fijo_decimal(P, r, plazo)
+
+
+@con_precision_excel
+def pago_fijo_decimal(P, r, plazo):
+    # El mismo cálculo sin validar, para quien ya aceptó los datos con
+    # sus propias reglas (calculos_lote). Con tasa cero o diminuta lanza
+    # decimal.DivisionByZero, que es un ArithmeticError.
+    _, denominador = factores_anualidad(r, plazo)
+    numerador = P * r
+    pago = numerador / denominador
+    return pago.quantize(Decimal('0.01'))
+
+# =========================================
+# Función: Monto máximo según la capacidad de pago
+# =========================================
+
+@con_precision_excel
+def calcular_monto_maximo(capacidad, tasa, plazo):
+    capacidad = validar_monto(capacidad, "La capacidad de pago", permitir_cero=True)
+    r = validar_tasa(tasa)
+    plazo = validar_plazo(plazo)
+    _, denominador = factores_anualidad(r, plazo)
+    factor = denominador / r
+    return (capacidad * factor).quantize(Decimal("0.01"))
+
+# ============================================================
+# Cálculo del ahorro con abonos extra (ajuste de último pago)
+# ============================================================
+#
+# Hay dos modos:
+#   - "cerrado": usa fórmulas de anualidad para encontrar directamente
+#     el periodo en que se liquida el crédito y el saldo previo a ese
+#     periodo. Solo se hace una búsqueda logarítmica alrededor de la
+#     estimación para respetar el redondeo de Decimal.
+#   - "referencia": el recorrido periodo por periodo original. Se
+#     conserva para comparar resultados.
+
+MODOS_AHORRO = ("cerrado", "referencia")
+
+
+def calcular_ahorro_por_abonos(monto, tasa, plazo, abono_extra, desde_periodo, modo="cerrado"):
+    detalle = detalle_ahorro_por_abonos(monto, tasa, plazo, abono_extra, desde_periodo, modo)
+    return (
+        detalle["total_sin_abonos"],
+        detalle["total_con_abonos"],
+        detalle["ahorro_total"],
+        detalle["pagos_ahorrados"]
+    )
+
+
+@con_precision_excel
+def detalle_ahorro_por_abonos(monto, tasa, plazo, abono_extra, desde_periodo, modo="cerrado"):
+    if modo not in MODOS_AHORRO:
+        raise ValueError(f"Modo de cálculo desconocido: {modo}")
+
+    P = validar_monto(monto, "El monto")
+    r = validar_tasa(tasa)
+    n = validar_plazo(plazo)
+    abono = validar_monto(abono_extra, "El abono extra", permitir_cero=True)
+    desde = validar_periodo(desde_periodo, n)
+
+    pago_fijo = calcular_pago_fijo_excel(P, r, n)
+    # Con montos muy chicos el pago redondeado puede quedar en $0.00
+    validar_amortizacion(P, r, pago_fijo)
+    return _resumen_ahorro(P, r, n, pago_fijo, abono, desde, modo, None)
+
+
+def _resumen_ahorro(P, r, n, pago_fijo, abono, desde, modo, puntos):
+    if modo == "referencia":
+        pagos_realizados, ultimo_pago, intereses_totales = _liquidar_por_periodos(
+            P, r, pago_fijo, abono, desde, puntos=puntos
+        )
+    else:
+        pagos_realizados, ultimo_pago, intereses_totales = _liquidar_cerrado(
+            P, r, pago_fijo, abono, desde, puntos=puntos
+        )
+
+    total_sin_abonos = pago_fijo * n
+    total_con_abonos = (pago_fijo * (pagos_realizados - 1)) + ultimo_pago
+    ahorro_total = total_sin_abonos - total_con_abonos
+
+    return {
+        "pago_fijo": pago_fijo,
+        "periodo_liquidacion": pagos_realizados,
+        "ultimo_pago": ultimo_pago.quantize(CENTAVO),
+        "intereses_totales": intereses_totales.quantize(CENTAVO),
+        "total_sin_abonos": total_sin_abonos.quantize(CENTAVO),
+        "total_con_abonos": total_con_abonos.quantize(CENTAVO),
+        "ahorro_total": ahorro_total.quantize(CENTAVO),
+        "pagos_ahorrados": n - pagos_realizados,
+    }
+
+
+# ============================================================
+# Punto de control para probar otros abonos
+# ============================================================
+#
+# Quien ya vio su ahorro suele probar con otro abono u otro periodo de
+# inicio. El punto de control guarda los datos ya validados del crédito
+# y su pago fijo, más el saldo y los intereses acumulados del plan sin
+# abonos cada INTERVALO_PUNTOS_CONTROL periodos. Esos saldos se llenan
+# solo cuando hace falta el recorrido periodo por periodo, y así el
+# siguiente intento recorre únicamente el tramo que cambia. Todo es
+# Decimal y listas, así que cabe en la sesión.
+
+INTERVALO_PUNTOS_CONTROL = 12
+
+
+@con_precision_excel
+def punto_de_control_ahorro(monto, tasa, plazo):
+    P = validar_monto(monto, "El monto")
+    r = validar_tasa(tasa)
+    n = validar_plazo(plazo)
+    pago_fijo = calcular_pago_fijo_excel(P, r, n)
+    validar_amortizacion(P, r, pago_fijo)
+    return {
+        "monto": P,
+        "tasa": r,
+        "plazo": n,
+        "pago_fijo": pago_fijo,
+        "puntos": [[P, Decimal('0.00')]],  # Saldo e intereses tras 0, 12, 24... periodos
+    }
+
+
+@con_precision_excel
+def detalle_ahorro_desde_punto(punto, abono_extra, desde_periodo, modo="cerrado"):
+    # Igual que detalle_ahorro_por_abonos, pero sin volver a validar ni
+    # calcular el crédito base. Puede agregar puntos a punto["puntos"].
+    if modo not in MODOS_AHORRO:
+        raise ValueError(f"Modo de cálculo desconocido: {modo}")
+    n = punto["plazo"]
+    abono = validar_monto(abono_extra, "El abono extra", permitir_cero=True)
+    desde = validar_periodo(desde_periodo, n)
+    return _resumen_ahorro(
+        punto["monto"], punto["tasa"], n, punto["pago_fijo"], abono, desde, modo, punto["puntos"]
+    )
+
+
+def _liquidar_por_periodos(P, r, pago_fijo, abono, desde, max_periodos=MAX_PERIODOS_RECORRIDO, puntos=None):
+    saldo = P
+    periodo = 1
+    intereses_totales = Decimal('0.00')
+    pagos_realizados = 0
+    ultimo_pago = Decimal('0.00')
+
+    # Con puntos de control se arranca desde el último guardado antes
+    # del primer abono (ese tramo no cambia con el abono)
+    if puntos:
+        indice = min(len(puntos) - 1, (desde - 1) // INTERVALO_PUNTOS_CONTROL)
+        saldo, intereses_totales = puntos[indice]
+        pagos_realizados = indice * INTERVALO_PUNTOS_CONTROL
+        periodo = pagos_realizados + 1
+
+    while saldo > 0:
+        interes = saldo * r
+        abono_a_capital = pago_fijo - interes
+
+        if periodo >= desde:
+            abono_a_capital += abono
+
+        if abono_a_capital >= saldo:
+            interes_final = saldo * r
+            ultimo_pago = saldo + interes_final
+            intereses_totales += interes_final
+            pagos_realizados += 1
+            break
+
+        saldo -= abono_a_capital
+        intereses_totales += interes
+        pagos_realizados += 1
+        periodo += 1
+        # Se guardan los puntos de control del tramo sin abonos que falten
+        if (puntos is not None and periodo <= desde
+                and pagos_realizados == len(puntos) * INTERVALO_PUNTOS_CONTROL):
+            puntos.append([saldo, intereses_totales])
+        if periodo > max_periodos:
+            raise ErrorValidacion(
+                "presupuesto", "El cálculo es demasiado largo para esos datos. Intenta con menos pagos."
+            )
+
+    return pagos_realizados, ultimo_pago, intereses_totales
+
+
+def _saldo_despues_de(saldo_inicial, cuota, r, k):
+    # Saldo tras k pagos iguales de "cuota" sin revisar liquidación:
+    # (S - c/r) * (1 + r)^k + c/r
+    if k == 0:
+        return saldo_inicial
+    saldo_equilibrio = cuota / r
+    return (saldo_inicial - saldo_equilibrio) * ((Decimal('1') + r) ** k) + saldo_equilibrio
+
+
+def _periodos_estimados(saldo_inicial, cuota, r):
+    # Solución real de (S - c/r)(1 + r)^k + c/r = 0
+    s = float(saldo_inicial)
+    c = float(cuota)
+    tr = float(r)
+    return max(1, ceil(log(c / (c - s * tr)) / log(1 + tr)))
+
+
+def _primer_periodo_liquidado(saldo_inicial, cuota, r, estimado, limite=None):
+    # Menor k >= 1 (y <= limite) con saldo <= 0. El saldo decrece con k,
+    # así que se busca en forma exponencial desde la estimación y luego
+    # por bisección.
+    def saldo(k):
+        return _saldo_despues_de(saldo_inicial, cuota, r, k)
+
+    if limite is not None:
+        if saldo(limite) > 0:
+            return None
+        estimado = min(estimado, limite)
+
+    if saldo(estimado) <= 0:
+        alto = estimado
+        paso = 1
+        bajo = estimado - paso
+        while bajo >= 1 and saldo(bajo) <= 0:
+            alto = bajo
+            paso *= 2
+            bajo = alto - paso
+        bajo = max(bajo, 0)
+    else:
+        bajo = estimado
+        paso = 1
+        alto = estimado + paso
+        while True:
+            if limite is not None and alto >= limite:
+                alto = limite
+                break
+            if saldo(alto) <= 0:
+                break
+            bajo = alto
+            paso *= 2
+            alto = bajo + paso
+
+    # Invariante: saldo(bajo) > 0 (o bajo == 0) y saldo(alto) <= 0
+    while alto - bajo > 1:
+        medio = (alto + bajo) // 2
+        if saldo(medio) <= 0:
+            alto = medio
+        else:
+            bajo = medio
+    return alto
+
+
+def _liquidar_cerrado(P, r, pago_fijo, abono, desde, puntos=None):
+    if r <= 0:
+        return _liquidar_por_periodos(P, r, pago_fijo, abono, desde, puntos=puntos)
+
+    uno_mas_r = Decimal('1') + r
+    primer_abono = max(desde, 1)
+    saldo_inicial = P
+    cuota = pago_fijo
+    inicio = 0  # Periodos transcurridos antes del tramo actual
+    pagos_extra = 0
+    periodo = None
+
+    # Tramo 1: pagos sin abono extra (periodos 1 .. primer_abono - 1)
+    if primer_abono > 1 and cuota > saldo_inicial * r:
+        periodo = _primer_periodo_liquidado(
+            saldo_inicial, cuota, r,
+            _periodos_estimados(saldo_inicial, cuota, r),
+            limite=primer_abono - 1
+        )
+
+    # Tramo 2: pagos con abono extra desde primer_abono
+    if periodo is None:
+        saldo_inicial = _saldo_despues_de(P, pago_fijo, r, primer_abono - 1)
+        inicio = primer_abono - 1
+        cuota = pago_fijo + abono
+        validar_amortizacion(saldo_inicial, r, cuota)
+        periodo = _primer_periodo_liquidado(
+            saldo_inicial, cuota, r,
+            _periodos_estimados(saldo_inicial, cuota, r)
+        )
+        pagos_extra = periodo - 1
+
+    saldo_previo = _saldo_despues_de(saldo_inicial, cuota, r, periodo - 1)
+    saldo_final = _saldo_despues_de(saldo_inicial, cuota, r, periodo)
+    ultimo_pago = saldo_previo * uno_mas_r
+
+    # El recorrido periodo por periodo acumula el redondeo de cada paso y
+    # ese error crece con (1 + r)^n. Si el resultado queda dentro de esa
+    # banda (periodo o centavo dudoso), el recorrido es el que decide.
+    pagos_realizados = inicio + periodo
+    tolerancia = max(P, Decimal('1')) * Decimal('1e-14') * pagos_realizados * (uno_mas_r ** pagos_realizados)
+    medio_centavo = (ultimo_pago * 100) % 1 - Decimal('0.5')
+    if (abs(saldo_final) < tolerancia or saldo_previo < tolerancia
+            or abs(medio_centavo) < tolerancia * 100):
+        return _liquidar_por_periodos(P, r, pago_fijo, abono, desde, puntos=puntos)
+
+    total_pagado = pago_fijo * (pagos_realizados - 1) + abono * pagos_extra + ultimo_pago
+    intereses_totales = total_pagado - P
+    return pagos_realizados, ultimo_pago, intereses_totales
+
+# ============================================================
+# Tabla de amortización (periodo por periodo)
+# ============================================================
+#
+# Mismas reglas que _liquidar_por_periodos: el saldo se lleva con la
+# precisión completa de Decimal y solo se redondea a centavos al
+# entregar cada fila. Las filas se generan una a una, así que una tabla
+# de 720 periodos nunca está completa en memoria.
+
+@con_precision_excel
+def tabla_amortizacion(monto, tasa, plazo, abono_extra=0, desde_periodo=1):
+    # Valida al llamarse (no al recorrer) y regresa un generador de
+    # diccionarios: periodo, pago, interes, capital, abono_extra y saldo
+    P = validar_monto(monto, "El monto")
+    r = validar_tasa(tasa)
+    n = validar_plazo(plazo)
+    abono = validar_monto(abono_extra, "El abono extra", permitir_cero=True)
+    desde = validar_periodo(desde_periodo, n)
+    pago_fijo = calcular_pago_fijo_excel(P, r, n)
+    validar_amortizacion(P, r, pago_fijo)
+    return _filas_amortizacion(P, r, pago_fijo, abono, desde)
+
+
+def _filas_amortizacion(P, r, pago_fijo, abono, desde, max_periodos=MAX_PERIODOS_RECORRIDO):
+    saldo = P
+    cero = Decimal('0.00')
+    for periodo in range(1, max_periodos + 1):
+        # El contexto se abre en cada fila: un generador no debe dejarlo
+        # puesto mientras quien lo recorre hace otras cosas
+        with localcontext(CONTEXTO_EXCEL):
+            interes = saldo * r
+            abono_a_capital = pago_fijo - interes
+            extra = abono if periodo >= desde else cero
+            ultima = abono_a_capital + extra >= saldo
+
+            if ultima:
+                # Último pago: el saldo que queda más sus intereses
+                fila = {
+                    "periodo": periodo,
+                    "pago": (saldo + interes).quantize(CENTAVO),
+                    "interes": interes.quantize(CENTAVO),
+                    "capital": saldo.quantize(CENTAVO),
+                    "abono_extra": cero,
+                    "saldo": cero,
+                }
+            else:
+                saldo -= abono_a_capital + extra
+                fila = {
+                    "periodo": periodo,
+                    "pago": pago_fijo,
+                    "interes": interes.quantize(CENTAVO),
+                    "capital": abono_a_capital.quantize(CENTAVO),
+                    "abono_extra": extra.quantize(CENTAVO),
+                    "saldo": saldo.quantize(CENTAVO),
+                }
+        yield fila
+        if ultima:
+            return
+    raise ErrorValidacion(
+        "presupuesto", "El cálculo es demasiado largo para esos datos. Intenta con menos pagos."
+    )
+
+# ============================================================
+# Cálculo del costo real de compras a pagos fijos en tiendas
+# ============================================================
+
+TOLERANCIA_TASA = 1e-12      # Ancho máximo del intervalo de la tasa
+TOLERANCIA_PAGO = 1e-9       # Diferencia máxima contra el precio (en pesos)...
+TOLERANCIA_PAGO_RELATIVA = 1e-12  # ...o esta fracción del precio, si es mayor
+MAX_ITERACIONES_TASA = 100
+
+
+def _anualidad_y_derivada(r, n):
+    # Factor de anualidad a(r) = (1 - (1 + r)^-n) / r y su derivada.
+    # Cerca de cero se usa la serie para no perder precisión.
+    if abs(r) < 1e-8:
+        return n - n * (n + 1) / 2 * r, -n * (n + 1) / 2
+    try:
+        descuento = (1 + r) ** -n
+    except OverflowError:
+        # Tasas muy negativas con muchos pagos: a(r) no cabe en un float
+        return float("inf"), float("-inf")
+    a = (1 - descuento) / r
+    derivada = (n * descuento / (1 + r) - a) / r
+    return a, derivada
+
+
+def resolver_tasa_periodica(precio, cuota, num_pagos, tolerancia=TOLERANCIA_TASA,
+                            max_iteraciones=MAX_ITERACIONES_TASA):
+    # Tasa por periodo tal que cuota * a(r) = precio (como RATE de Excel).
+    # Newton dentro de un intervalo que siempre contiene la raíz; si el
+    # paso de Newton sale del intervalo se bisecta. Regresa
+    # (tasa, iteraciones, convergio).
+    #
+    # La tolerancia de f(r) crece con el precio: f resta cantidades de ese
+    # tamaño y con montos grandes su redondeo ya pasa de 1e-9 pesos.
+    # También se bisecta si Newton avanza menos de la mitad que
+    # dos pasos antes: con tasas muy negativas f crece como (1 + r)^-n y
+    # Newton se arrastra a pasos iguales.
+    P = float(precio)
+    c = float(cuota)
+    n = int(num_pagos)
+    if P <= 0 or c <= 0 or n < 1:
+        raise ValueError("El precio, el pago y el número de pagos deben ser positivos")
+
+    def f(r):
+        a, da = _anualidad_y_derivada(r, n)
+        return c * a - P, c * da
+
+    # a(r) decrece con r: f(0) = c*n - P indica de qué lado está la raíz
+    if c * n >= P:
+        # a(r) < 1/r, así que en r = c/P ya nos pasamos
+        bajo, alto = 0.0, c / P
+    else:
+        alto = 0.0
+        bajo = -0.5
+        while f(bajo)[0] < 0:
+            alto = bajo
+            bajo = (bajo - 1) / 2
+
+    # Estimación inicial clásica: 2(nc - P) / (P(n + 1))
+    r = 2 * (n * c - P) / (P * (n + 1))
+    if not bajo < r < alto:
+        r = (bajo + alto) / 2
+
+    tolerancia_pago = max(TOLERANCIA_PAGO, TOLERANCIA_PAGO_RELATIVA * P)
+    paso_anterior = paso = alto - bajo
+    for iteracion in range(1, max_iteraciones + 1):
+        valor, derivada = f(r)
+        if abs(valor) < tolerancia_pago:
+            return r, iteracion, True
+        if valor > 0:
+            bajo = r
+        else:
+            alto = r
+        if alto - bajo < tolerancia:
+            return (bajo + alto) / 2, iteracion, True
+
+        siguiente = r - valor / derivada if derivada != 0 else bajo - 1
+        if not bajo < siguiente < alto or 2 * abs(siguiente - r) > abs(paso_anterior):
+            siguiente = (bajo + alto) / 2
+        paso_anterior, paso = paso, abs(siguiente - r)
+        r = siguiente
+
+    return r, max_iteraciones, False
+
+
+def costo_credito_tienda_con_tasa(precio, cuota, n, tasa, periodos_por_anio=12):
+    # Totales y tasas ya redondeados, con la tasa por periodo ya resuelta
+    # (aquí o, para muchas ofertas, en calculos_lote)
+    tasa_periodo = Decimal(repr(tasa))
+    total_pagado = cuota * n
+    intereses = total_pagado - precio
+    tasa_anual = ((Decimal('1') + tasa_periodo) ** periodos_por_anio) - Decimal('1')
+
+    return (
+        total_pagado.quantize(Decimal("0.01")),
+        intereses.quantize(Decimal("0.01")),
+        (tasa_periodo * 100).quantize(Decimal("0.01")),
+        (tasa_anual * 100).quantize(Decimal("0.01"))
+    )
+
+
+@con_precision_excel
+def calcular_costo_credito_tienda(precio_contado, pago_periodico, num_pagos, periodos_por_anio=12):
+    # periodos_por_anio: 12 con pagos mensuales, 24 quincenales, 52 semanales
+    precio = validar_monto(precio_contado, "El precio de contado")
+    cuota = validar_monto(pago_periodico, "El pago fijo")
+    n = validar_plazo(num_pagos)
+
+    tasa, iteraciones, convergio = resolver_tasa_periodica(precio, cuota, n)
+    if not convergio:
+        raise ErrorValidacion(
+            "presupuesto", f"No se pudo calcular la tasa en {iteraciones} iteraciones. Revisa tus datos."
+        )
+    return costo_credito_tienda_con_tasa(precio, cuota, n, tasa, periodos_por_anio)
@@ -0,0 +1,268 @@
+# =========================================
+# Cálculos por lote (vectorizados con NumPy)
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Pago fijo, total pagado e intereses para muchas
+# combinaciones de monto, tasa y plazo en una sola pasada
+# =========================================
+
+import logging
+import os
+from decimal import Decimal
+
+import numpy as np
+
+from calculos import (
+    con_precision_excel,
+    costo_credito_tienda_con_tasa,
+    pago_fijo_decimal,
+    MAX_ITERACIONES_TASA,
+    TOLERANCIA_PAGO,
+    TOLERANCIA_PAGO_RELATIVA,
+    TOLERANCIA_TASA
+)
+from validacion import ErrorValidacion, validar_monto, validar_plazo
+
+# Distancia (en centavos) a medio centavo por debajo de la cual el
+# redondeo en float podría no coincidir con el de Decimal. El error del
+# float crece con el valor, así que el margen es relativo al pago en
+# centavos (MARGEN_RELATIVO) y nunca menor que MARGEN_MEDIO_CENTAVO.
+MARGEN_MEDIO_CENTAVO = 1e-6
+MARGEN_RELATIVO = 1e-12
+
+registro = logging.getLogger(__name__)
+
+# Modo de verificación: cada lote se recalcula también en Decimal y las
+# diferencias se reportan. Es mucho más lento; sirve para pruebas y para
+# revisar de vez en cuando que el camino rápido siga cuadrando. Cada
+# diferencia se registra como advertencia en el log.
+VERIFICAR_PRECISION = os.environ.get("VERIFICAR_PRECISION", "") == "1"
+
+# =========================================
+# Pago fijo por lote
+# =========================================
+
+def _pago_sin_redondear(montos, tasas, plazos):
+    # P * r / (1 - (1 + r)^-n), con log1p/expm1 para no perder
+    # precisión en tasas pequeñas. Con tasa cero el pago es P / n.
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        denominador = -np.expm1(-plazos * np.log1p(tasas))
+        pago = np.where(tasas == 0, montos / plazos, montos * tasas / denominador)
+    invalido = (plazos < 1) | (tasas <= -1)
+    return np.where(invalido, np.nan, pago)
+
+
+def _pago_exacto(monto, tasa, plazo):
+    # El pago de calcular_pago_fijo_excel para una celda, sin sus límites
+    # de validación (el lote acepta montos y tasas fuera de ellos). None
+    # si Decimal no lo puede calcular (tasa diminuta, desbordamiento).
+    try:
+        return pago_fijo_decimal(Decimal(str(float(monto))), Decimal(str(float(tasa))), Decimal(str(float(plazo))))
+    except ArithmeticError:
+        return None
+
+
+def _redondear_a_centavos(pago, montos, tasas, plazos):
+    # Redondeo a centavos igual que calcular_pago_fijo_excel. Los pocos
+    # valores que caen prácticamente en medio centavo se recalculan en
+    # Decimal para que el resultado sea idéntico al del bot; si Decimal
+    # no puede, se queda el redondeo en float.
+    centavos = pago * 100
+    redondeado = np.array(np.round(centavos))  # arreglo aunque sea de 0 dimensiones
+    with np.errstate(invalid="ignore"):
+        margen = np.maximum(MARGEN_MEDIO_CENTAVO, np.abs(centavos) * MARGEN_RELATIVO)
+        dudosos = np.abs(np.abs(centavos - np.floor(centavos)) - 0.5) < margen
+    dudosos &= np.isfinite(pago) & (tasas != 0)
+    for indice in map(tuple, np.argwhere(dudosos)):
+        pago_decimal = _pago_exacto(montos[indice], tasas[indice], plazos[indice])
+        if pago_decimal is not None:
+            redondeado[indice] = float(pago_decimal * 100)
+    return redondeado
+
+
+def calcular_pagos_lote(montos, tasas, plazos):
+    # Acepta escalares o arreglos (se combinan con broadcasting de
+    # NumPy). Regresa un diccionario de arreglos en pesos, redondeados a
+    # centavos: pago, total_pagado e intereses. Las celdas con datos
+    # inválidos (plazo < 1 o tasa <= -1) quedan como NaN.
+    montos, tasas, plazos = np.broadcast_arrays(
+        np.asarray(montos, dtype=float),
+        np.asarray(tasas, dtype=float),
+        np.asarray(plazos, dtype=float)
+    )
+    pago_centavos = _redondear_a_centavos(_pago_sin_redondear(montos, tasas, plazos), montos, tasas, plazos)
+    total_centavos = pago_centavos * plazos
+    intereses_centavos = total_centavos - np.round(montos * 100)
+    resultado = {
+        "pago": pago_centavos / 100,
+        "total_pagado": total_centavos / 100,
+        "intereses": intereses_centavos / 100,
+    }
+    if VERIFICAR_PRECISION:
+        resultado["diferencias"] = verificar_pagos_lote(montos, tasas, plazos, resultado["pago"])
+        for diferencia in resultado["diferencias"]:
+            registro.warning("Diferencia de precisión en el pago: %s", diferencia)
+    return resultado
+
+
+def verificar_pagos_lote(montos, tasas, plazos, pagos=None):
+    # Compara el camino rápido con el cálculo en Decimal de
+    # calcular_pago_fijo_excel celda por celda, también fuera de sus
+    # límites de validación. Regresa una lista de diccionarios (monto,
+    # tasa, plazo, rapido, exacto) con las celdas que no coinciden al
+    # centavo; se omiten las celdas inválidas (NaN), las de tasa cero y
+    # las que Decimal no puede calcular.
+    montos, tasas, plazos = np.broadcast_arrays(
+        np.asarray(montos, dtype=float),
+        np.asarray(tasas, dtype=float),
+        np.asarray(plazos, dtype=float)
+    )
+    if pagos is None:
+        pagos = _redondear_a_centavos(_pago_sin_redondear(montos, tasas, plazos), montos, tasas, plazos) / 100
+    diferencias = []
+    for indice in np.ndindex(montos.shape):
+        if not np.isfinite(pagos[indice]) or tasas[indice] == 0:
+            continue
+        exacto = _pago_exacto(montos[indice], tasas[indice], plazos[indice])
+        if exacto is None:
+            continue
+        if round(float(pagos[indice]) * 100) != int(exacto * 100):
+            diferencias.append({
+                "monto": float(montos[indice]),
+                "tasa": float(tasas[indice]),
+                "plazo": int(plazos[indice]),
+                "rapido": float(pagos[indice]),
+                "exacto": exacto,
+            })
+    return diferencias
+
+
+def malla_pagos(monto, tasas, plazos):
+    # Tabla tasa × plazo para un mismo monto: filas = tasas,
+    # columnas = plazos
+    tasas = np.asarray(tasas, dtype=float)
+    plazos = np.asarray(plazos, dtype=float)
+    return calcular_pagos_lote(monto, tasas[:, np.newaxis], plazos[np.newaxis, :])
+
+# =========================================
+# Tasa implícita por lote (TIR de muchas ofertas a la vez)
+# =========================================
+
+def _anualidad_y_derivada_lote(r, n):
+    # Igual que calculos._anualidad_y_derivada, elemento por elemento
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        exponente = -n * np.log1p(r)
+        descuento = np.exp(exponente)
+        a = -np.expm1(exponente) / r
+        derivada = (n * descuento / (1 + r) - a) / r
+    cerca_de_cero = np.abs(r) < 1e-8
+    a = np.where(cerca_de_cero, n - n * (n + 1) / 2 * r, a)
+    derivada = np.where(cerca_de_cero, -n * (n + 1) / 2, derivada)
+    return a, derivada
+
+
+def resolver_tasas_periodicas(precios, cuotas, plazos, tolerancia=TOLERANCIA_TASA,
+                              max_iteraciones=MAX_ITERACIONES_TASA):
+    # Versión vectorizada de calculos.resolver_tasa_periodica: todas las
+    # ofertas avanzan juntas con Newton dentro de su intervalo y las que
+    # ya convergieron dejan de moverse. Regresa los arreglos (tasas,
+    # iteraciones, convergio). Misma tolerancia relativa al precio y
+    # mismo criterio para bisectar que la versión escalar.
+    P, c, n = (np.array(x, dtype=float) for x in np.broadcast_arrays(precios, cuotas, plazos))
+    if np.any((P <= 0) | (c <= 0) | (n < 1)):
+        raise ValueError("El precio, el pago y el número de pagos deben ser positivos")
+
+    def f(r):
+        a, da = _anualidad_y_derivada_lote(r, n)
+        with np.errstate(over="ignore", invalid="ignore"):
+            return c * a - P, c * da
+
+    # Mismos intervalos iniciales que la versión escalar
+    positiva = c * n >= P
+    bajo = np.where(positiva, 0.0, -0.5)
+    alto = np.where(positiva, c / P, 0.0)
+    buscar = ~positiva
+    while buscar.any():
+        sigue = buscar & (f(bajo)[0] < 0)
+        alto = np.where(sigue, bajo, alto)
+        bajo = np.where(sigue, (bajo - 1) / 2, bajo)
+        buscar = sigue
+
+    r = 2 * (n * c - P) / (P * (n + 1))
+    r = np.where((bajo < r) & (r < alto), r, (bajo + alto) / 2)
+
+    tolerancia_pago = np.maximum(TOLERANCIA_PAGO, TOLERANCIA_PAGO_RELATIVA * P)
+    paso_anterior = paso = alto - bajo
+    iteraciones = np.full(P.shape, max_iteraciones)
+    convergio = np.zeros(P.shape, dtype=bool)
+    activas = np.ones(P.shape, dtype=bool)
+    for iteracion in range(1, max_iteraciones + 1):
+        valor, derivada = f(r)
+        exactas = activas & (np.abs(valor) < tolerancia_pago)
+        activas &= ~exactas
+        bajo = np.where(activas & (valor > 0), r, bajo)
+        alto = np.where(activas & (valor <= 0), r, alto)
+        estrechas = activas & (alto - bajo < tolerancia)
+        r = np.where(estrechas, (bajo + alto) / 2, r)
+
+        terminadas = exactas | estrechas
+        iteraciones[terminadas] = iteracion
+        convergio |= terminadas
+        activas &= ~estrechas
+        if not activas.any():
+            break
+
+        with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+            siguiente = r - valor / derivada
+        fuera = ~((bajo < siguiente) & (siguiente < alto)) | (2 * np.abs(siguiente - r) > np.abs(paso_anterior))
+        siguiente = np.where(fuera, (bajo + alto) / 2, siguiente)
+        paso_anterior, paso = paso, np.where(activas, np.abs(siguiente - r), paso)
+        r = np.where(activas, siguiente, r)
+
+    return r, iteraciones, convergio
+
+
+@con_precision_excel
+def calcular_costo_credito_tienda_lote(ofertas, periodos_por_anio=12):
+    # Versión por lote de calculos.calcular_costo_credito_tienda para
+    # comparar muchas ofertas de tienda: las tasas de todas se resuelven
+    # juntas con resolver_tasas_periodicas. Cada resultado incluye las
+    # iteraciones y si el cálculo convergió. Las ofertas con datos fuera
+    # de los límites se reportan como error sin pasar por el cálculo.
+    validadas = []
+    for precio, cuota, n in ofertas:
+        try:
+            validadas.append((
+                validar_monto(precio, "El precio de contado"),
+                validar_monto(cuota, "El pago fijo"),
+                validar_plazo(n)
+            ))
+        except ErrorValidacion as e:
+            validadas.append(e)
+
+    correctas = [oferta for oferta in validadas if not isinstance(oferta, ErrorValidacion)]
+    if correctas:
+        precios, cuotas, plazos = zip(*correctas)
+        tasas, iteraciones, convergio = resolver_tasas_periodicas(
+            np.array(precios, dtype=float), np.array(cuotas, dtype=float), np.array(plazos, dtype=float)
+        )
+
+    resultados = []
+    j = 0
+    for oferta in validadas:
+        if isinstance(oferta, ErrorValidacion):
+            resultados.append({"error": str(oferta)})
+            continue
+        precio, cuota, n = oferta
+        total, intereses, tasa_periodo, tasa_anual = costo_credito_tienda_con_tasa(
+            precio, cuota, n, float(tasas[j]), periodos_por_anio
+        )
+        resultados.append({
+            "total_pagado": total,
+            "intereses": intereses,
+            "tasa_periodo": tasa_periodo,
+            "tasa_anual": tasa_anual,
+            "iteraciones": int(iteraciones[j]),
+            "convergio": bool(convergio[j]),
+        })
+        j += 1
+    return resultados
@@ -0,0 +1,107 @@
+# =========================================
+# Capacidad de pago y montos máximos
+# Autora: Dra. Jazmín Sandoval
+# Descripción: A partir del perfil de la persona (ingreso, pagos fijos,
+# deuda revolvente y riesgo) calcula su capacidad de pago mensual, la
+# tabla de montos máximos por tasa y plazo, y para un monto dado el
+# plazo más corto y la tasa más alta que podría pagar
+# =========================================
+#
+# Las tablas y búsquedas se hacen con NumPy sobre todos los plazos o
+# tasas a la vez, igual que calculos_lote; los pagos se redondean a
+# centavos como en el resto del bot.
+
+from decimal import Decimal
+
+import numpy as np
+
+from calculos_lote import calcular_pagos_lote, resolver_tasas_periodicas
+from validacion import (
+    ErrorValidacion,
+    PLAZO_MAXIMO,
+    validar_monto,
+    validar_tasa,
+    validar_plazo
+)
+
+PORCENTAJE_POR_RIESGO = {"1": Decimal("0.60"), "2": Decimal("0.45"), "3": Decimal("0.30")}
+PAGO_REVOLVENTE = Decimal("0.06")  # Pago mensual estimado por cada peso de deuda revolvente
+
+PLAZOS_ESTANDAR = (6, 12, 18, 24, 36, 48, 60, 72, 84, 96, 120, 180, 240, 300, 360)
+TASAS_ESTANDAR = tuple(Decimal(milesimas) / 1000 for milesimas in range(5, 55, 5))  # 0.5% a 5% por periodo
+
+
+def calcular_capacidad_mensual(ingreso, pagos_fijos, deuda_revolvente, riesgo):
+    # Lo que podría pagar al mes en un crédito nuevo (puede ser negativo
+    # si ya está sobreendeudada)
+    capacidad_total = ingreso * PORCENTAJE_POR_RIESGO[riesgo]
+    capacidad = capacidad_total - pagos_fijos - deuda_revolvente * PAGO_REVOLVENTE
+    return capacidad.quantize(Decimal("0.01"))
+
+
+def _montos_maximos(capacidad, tasas, plazos):
+    # capacidad * (1 - (1 + r)^-n) / r con broadcasting, en centavos
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = -np.expm1(-plazos * np.log1p(tasas)) / tasas
+    return np.round(capacidad * factor * 100) / 100
+
+
+def tabla_montos_maximos(capacidad, tasas=TASAS_ESTANDAR, plazos=PLAZOS_ESTANDAR):
+    # Filas = tasas, columnas = plazos (como malla_pagos)
+    capacidad = float(validar_monto(capacidad, "La capacidad de pago", permitir_cero=True))
+    tasas = np.array([float(validar_tasa(tasa)) for tasa in tasas])
+    plazos = np.array([validar_plazo(plazo) for plazo in plazos], dtype=float)
+    return {
+        "tasas": tasas,
+        "plazos": plazos,
+        "montos": _montos_maximos(capacidad, tasas[:, np.newaxis], plazos[np.newaxis, :]),
+    }
+
+
+def plazos_minimos(capacidad, monto, tasas):
+    # Para cada tasa, el menor número de pagos cuyo pago fijo cabe en la
+    # capacidad. 0 donde ni con PLAZO_MAXIMO pagos alcanza (el pago no
+    # cubre los intereses o el plazo saldría demasiado largo).
+    capacidad = float(validar_monto(capacidad, "La capacidad de pago", permitir_cero=True))
+    monto = float(validar_monto(monto, "El monto"))
+    tasas = np.array([float(validar_tasa(tasa)) for tasa in tasas])
+
+    def cabe(plazos):
+        return calcular_pagos_lote(monto, tasas, plazos)["pago"] <= capacidad
+
+    # El pago redondeado a centavos baja con el plazo, pero cerca de
+    # P r = c se queda igual muchos periodos seguidos y la fórmula de
+    # n puede errar por varios pagos. Se busca por bisección sobre el
+    # pago ya redondeado, todas las tasas a la vez (unas 11 vueltas con
+    # PLAZO_MAXIMO = 1200): en "bajo" no cabe, en "alto" sí.
+    bajo = np.zeros(tasas.shape)
+    alto = np.full(tasas.shape, float(PLAZO_MAXIMO))
+    viables = cabe(alto)
+    while (alto - bajo > 1).any():
+        medio = np.where(alto - bajo > 1, np.floor((bajo + alto) / 2), alto)
+        caben = cabe(medio)
+        alto = np.where(caben, medio, alto)
+        bajo = np.where(caben, bajo, medio)
+    return np.where(viables, alto, 0).astype(int)
+
+
+def tasas_maximas(capacidad, monto, plazos):
+    # Para cada plazo, la tasa por periodo más alta con la que el pago
+    # fijo cabe en la capacidad. 0 donde ni sin intereses alcanza; el
+    # resultado nunca pasa de la tasa máxima que acepta el bot.
+    capacidad = float(validar_monto(capacidad, "La capacidad de pago"))
+    monto = float(validar_monto(monto, "El monto"))
+    plazos = np.array([validar_plazo(plazo) for plazo in plazos], dtype=float)
+
+    alcanza = capacidad * plazos > monto
+    if not alcanza.any():
+        return np.zeros(plazos.shape)
+    tasas, _, convergio = resolver_tasas_periodicas(monto, capacidad, plazos)
+    if not convergio.all():
+        raise ErrorValidacion("presupuesto", "No se pudo calcular la tasa máxima. Revisa tus datos.")
+    # Se baja a centésimas de punto porcentual; si aun así el pago
+    # redondeado a centavos se pasa de la capacidad, una centésima menos
+    tasas = np.floor(np.clip(tasas, 0, 1) * 10000) / 10000
+    pagos = calcular_pagos_lote(monto, tasas, plazos)["pago"]
+    tasas = np.where(pagos > capacidad, tasas - 0.0001, tasas)
+    return np.where(alcanza & (tasas > 0), tasas, 0)
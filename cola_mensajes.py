@@ -0,0 +1,141 @@
+# =========================================
+# Cola de mensajes entrantes
+# Autora: Dra. Jazmín Sandoval
+# Descripción: El webhook solo valida y encola; un grupo de hilos
+# procesa y envía las respuestas en segundo plano
+# =========================================
+#
+# Cada número de teléfono tiene su propia fila de mensajes pendientes y
+# solo un hilo a la vez la atiende, así que los mensajes de una misma
+# persona se procesan en orden mientras que usuarios distintos avanzan
+# en paralelo. Si ya hay demasiados mensajes pendientes, encolar()
+# regresa False para que el webhook responda 503 y Meta reintente
+# después.
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+NUM_TRABAJADORES = int(os.environ.get("NUM_TRABAJADORES", "4"))
+MAX_PENDIENTES = int(os.environ.get("MAX_PENDIENTES", "1000"))
+
+registro = logging.getLogger(__name__)
+
+
+class ColaMensajes:
+    def __init__(self, atender, num_trabajadores=NUM_TRABAJADORES, max_pendientes=MAX_PENDIENTES):
+        # atender(numero, mensaje) hace el trabajo de cada mensaje
+        self.atender = atender
+        self.num_trabajadores = num_trabajadores
+        self.max_pendientes = max_pendientes
+
+        self._candado = threading.Lock()
+        self._pendientes = {}          # numero -> deque de (encolado, mensaje)
+        self._listos = queue.Queue()   # números con mensajes y sin hilo asignado
+        self._total_pendientes = 0
+        self._en_proceso = 0
+        self._vacia = threading.Condition(self._candado)
+        self._hilos = []
+        self._pid = None
+
+        # Estadísticas de espera (desde que se encola hasta que se atiende)
+        self.procesados = 0
+        self.rechazados = 0
+        self.errores = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+
+    def _iniciar(self):
+        # Los hilos se crean en el proceso que los usa (después del fork
+        # de gunicorn), no al importar el módulo
+        self._pid = os.getpid()
+        self._hilos = []
+        for i in range(self.num_trabajadores):
+            hilo = threading.Thread(target=self._trabajar, name=f"trabajador-{i}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def encolar(self, numero, mensaje):
+        return self.encolar_lote({numero: [mensaje]})
+
+    def encolar_lote(self, grupos):
+        # grupos: {numero: [mensaje, ...]}. Se aceptan todos o ninguno,
+        # para que un reintento de Meta no duplique solo una parte.
+        if self._pid != os.getpid():
+            with self._candado:
+                if self._pid != os.getpid():
+                    self._iniciar()
+
+        cantidad = sum(len(mensajes) for mensajes in grupos.values())
+        nuevos = []
+        with self._candado:
+            if self._total_pendientes + cantidad > self.max_pendientes:
+                self.rechazados += cantidad
+                return False
+            encolado = time.monotonic()
+            for numero, mensajes in grupos.items():
+                fila = self._pendientes.get(numero)
+                if fila is None:
+                    fila = self._pendientes[numero] = deque()
+                    nuevos.append(numero)
+                fila.extend((encolado, mensaje) for mensaje in mensajes)
+            self._total_pendientes += cantidad
+        for numero in nuevos:
+            self._listos.put(numero)
+        return True
+
+    def _trabajar(self):
+        while True:
+            numero = self._listos.get()
+            with self._candado:
+                encolado, mensaje = self._pendientes[numero].popleft()
+                self._total_pendientes -= 1
+                self._en_proceso += 1
+            espera = time.monotonic() - encolado
+
+            fallo = False
+            try:
+                self.atender(numero, mensaje)
+            except Exception:
+                fallo = True
+                registro.exception("Error al atender un mensaje")
+
+            with self._candado:
+                self._en_proceso -= 1
+                self.procesados += 1
+                self.errores += fallo
+                self.espera_total += espera
+                self.espera_maxima = max(self.espera_maxima, espera)
+                # Si la persona mandó más mensajes, vuelve al final de la
+                # fila de listos para no acaparar el hilo
+                if self._pendientes[numero]:
+                    self._listos.put(numero)
+                else:
+                    del self._pendientes[numero]
+                if self._total_pendientes == 0 and self._en_proceso == 0:
+                    self._vacia.notify_all()
+
+    def esperar_vacia(self, timeout=None):
+        # Útil en pruebas y benchmarks: espera a que no quede trabajo
+        with self._candado:
+            return self._vacia.wait_for(
+                lambda: self._total_pendientes == 0 and self._en_proceso == 0, timeout
+            )
+
+    def estadisticas(self):
+        with self._candado:
+            return {
+                "pendientes": self._total_pendientes,
+                "en_proceso": self._en_proceso,
+                "usuarios_en_espera": len(self._pendientes),
+                "trabajadores": self.num_trabajadores,
+                "max_pendientes": self.max_pendientes,
+                "procesados": self.procesados,
+                "rechazados": self.rechazados,
+                "errores": self.errores,
+                "espera_promedio_ms": round(1000 * self.espera_total / self.procesados, 3) if self.procesados else 0.0,
+                "espera_maxima_ms": round(1000 * self.espera_maxima, 3),
+            }
@@ -0,0 +1,170 @@
+# =========================================
+# Índice de mensajes ya recibidos
+# Autora: Dra. Jazmín Sandoval
+# Descripción: WhatsApp vuelve a entregar una notificación si tardamos en
+# responder; con el ID de cada mensaje se descartan las repeticiones
+# antes de procesarlas
+# =========================================
+#
+# Todos los índices tienen la misma interfaz:
+#   reclamar(ids)  -> conjunto de los ids que no se habían visto (y que
+#                     desde ahora quedan marcados)
+#   liberar(ids)   -> olvida ids reclamados que al final no se encolaron,
+#                     para que el reintento de Meta sí se procese
+#   contar()       -> ids recordados
+#
+# Se elige con la variable INDICE_MENSAJES (igual que las sesiones):
+#   memoria                     (por defecto, un solo proceso)
+#   sqlite:///mensajes.db       (varios workers en la misma máquina)
+#   redis://host:6379/0         (varios servidores)
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from sesiones import ClienteResp, conexion_sqlite
+
+# Meta reintenta durante horas; un día de ventana cubre los reintentos
+VENTANA_DEDUPLICACION = int(os.environ.get("VENTANA_DEDUPLICACION", "86400"))
+MAX_IDS_RECORDADOS = int(os.environ.get("MAX_IDS_RECORDADOS", "100000"))
+
+# =========================================
+# Índice en memoria (LRU con ventana de tiempo)
+# =========================================
+#
+# El OrderedDict queda ordenado por expiración: cada id nuevo o repetido
+# se pasa al final con la expiración renovada, así que los vencidos y
+# los menos recientes siempre están al principio.
+
+class IndiceMemoria:
+    def __init__(self, ventana=VENTANA_DEDUPLICACION, maximo=MAX_IDS_RECORDADOS):
+        self.ventana = ventana
+        self.maximo = maximo
+        self._ids = OrderedDict()
+        self._candado = threading.Lock()
+
+    def reclamar(self, ids):
+        ahora = time.monotonic()
+        expira = ahora + self.ventana
+        nuevos = set()
+        with self._candado:
+            while self._ids and next(iter(self._ids.values())) <= ahora:
+                self._ids.popitem(last=False)
+            for id_mensaje in ids:
+                if id_mensaje in self._ids:
+                    self._ids.move_to_end(id_mensaje)
+                else:
+                    nuevos.add(id_mensaje)
+                self._ids[id_mensaje] = expira
+            while len(self._ids) > self.maximo:
+                self._ids.popitem(last=False)
+        return nuevos
+
+    def liberar(self, ids):
+        with self._candado:
+            for id_mensaje in ids:
+                self._ids.pop(id_mensaje, None)
+
+    def contar(self):
+        with self._candado:
+            return len(self._ids)
+
+# =========================================
+# Índice en SQLite (varios workers en la misma máquina)
+# =========================================
+
+class IndiceSQLite:
+    def __init__(self, ruta, ventana=VENTANA_DEDUPLICACION):
+        self.ruta = ruta
+        self.ventana = ventana
+        self._local = threading.local()
+        self._proxima_limpieza = 0.0
+        conexion = self._conexion()
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS mensajes_vistos ("
+            "id TEXT PRIMARY KEY, expira REAL NOT NULL)"
+        )
+        conexion.execute("CREATE INDEX IF NOT EXISTS mensajes_vistos_expira ON mensajes_vistos (expira)")
+
+    def _conexion(self):
+        return conexion_sqlite(self._local, self.ruta)
+
+    def reclamar(self, ids):
+        ahora = time.time()
+        conexion = self._conexion()
+        nuevos = set()
+        # Si el id ya existe pero venció, se toma como nuevo
+        for id_mensaje in ids:
+            cursor = conexion.execute(
+                "INSERT INTO mensajes_vistos (id, expira) VALUES (?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET expira = excluded.expira WHERE mensajes_vistos.expira <= ?",
+                (id_mensaje, ahora + self.ventana, ahora)
+            )
+            if cursor.rowcount:
+                nuevos.add(id_mensaje)
+        if ahora >= self._proxima_limpieza:
+            self._proxima_limpieza = ahora + 60
+            conexion.execute("DELETE FROM mensajes_vistos WHERE expira <= ?", (ahora,))
+        return nuevos
+
+    def liberar(self, ids):
+        conexion = self._conexion()
+        for id_mensaje in ids:
+            conexion.execute("DELETE FROM mensajes_vistos WHERE id = ?", (id_mensaje,))
+
+    def contar(self):
+        return self._conexion().execute(
+            "SELECT COUNT(*) FROM mensajes_vistos WHERE expira > ?", (time.time(),)
+        ).fetchone()[0]
+
+# =========================================
+# Índice con protocolo de Redis
+# =========================================
+#
+# SET ... NX EX solo escribe si la llave no existe, así que dos workers
+# que reciben la misma entrega no pueden reclamar el mismo id.
+
+class IndiceRedis:
+    def __init__(self, cliente, ventana=VENTANA_DEDUPLICACION, prefijo="wamid:"):
+        self.cliente = cliente
+        self.ventana = ventana
+        self.prefijo = prefijo
+
+    def reclamar(self, ids):
+        return {
+            id_mensaje for id_mensaje in ids
+            if self.cliente.comando("SET", self.prefijo + id_mensaje, "1", "NX", "EX", self.ventana) is not None
+        }
+
+    def liberar(self, ids):
+        if ids:
+            self.cliente.comando("DEL", *[self.prefijo + id_mensaje for id_mensaje in ids])
+
+    def contar(self):
+        total = 0
+        cursor = "0"
+        while True:
+            cursor, llaves = self.cliente.comando("SCAN", cursor, "MATCH", self.prefijo + "*", "COUNT", 1000)
+            cursor = cursor.decode("utf-8")
+            total += len(llaves)
+            if cursor == "0":
+                return total
+
+# =========================================
+# Selección del índice
+# =========================================
+
+def crear_indice_mensajes(url=None, ventana=VENTANA_DEDUPLICACION):
+    url = url or os.environ.get("INDICE_MENSAJES", "memoria")
+    if url == "memoria":
+        return IndiceMemoria(ventana)
+    destino = urlparse(url)
+    if destino.scheme == "sqlite":
+        return IndiceSQLite(destino.path[1:] or ":memory:", ventana)
+    if destino.scheme == "redis":
+        base = int(destino.path.strip("/") or 0)
+        cliente = ClienteResp(destino.hostname or "localhost", destino.port or 6379, base)
+        return IndiceRedis(cliente, ventana)
+    raise ValueError(f"Índice de mensajes desconocido: {url}")
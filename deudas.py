@@ -0,0 +1,261 @@
+# =========================================
+# Plan para pagar varias deudas
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Compara avalancha (la tasa más alta primero), bola de
+# nieve (el saldo más chico primero) y órdenes propios para liquidar
+# varias deudas con un presupuesto mensual fijo
+# =========================================
+#
+# Cada mes todas las deudas pagan su mínimo y lo que sobra del
+# presupuesto va a la deuda prioritaria. Cuando una deuda se liquida, su
+# pago completo se suma al de la siguiente prioritaria.
+#
+# En lugar de avanzar mes por mes, la simulación salta de una
+# liquidación a la siguiente: mientras nadie se liquida los pagos no
+# cambian, así que el saldo de cada deuda sale con la fórmula de
+# anualidad y el mes en que se liquida se conoce de antemano. Esos meses
+# van en una cola de prioridad (heapq); al liquidarse una deuda solo se
+# recalcula la que recibe su pago. Con 20 deudas hay a lo sumo 20
+# eventos, sin importar cuántos años dure el plan.
+#
+# Los cálculos van en float (como los de calculos_lote) y los montos se
+# entregan redondeados a centavos.
+
+import heapq
+from math import ceil, inf, log
+
+from validacion import (
+    ErrorValidacion,
+    PLAZO_MAXIMO,
+    validar_monto,
+    validar_tasa
+)
+
+MAX_DEUDAS = 20
+ESTRATEGIAS = ("avalancha", "bola_de_nieve")
+
+
+class Deuda:
+    # Estado de una deuda dentro de la simulación. El saldo se guarda
+    # solo al cambiar el pago (mes_base, saldo_base) y en cualquier otro
+    # mes se obtiene con la fórmula.
+    def __init__(self, indice, saldo, tasa, minimo):
+        self.indice = indice
+        self.saldo_inicial = saldo
+        self.tasa = tasa
+        self.minimo = minimo
+        self.cuota = minimo
+        self.mes_base = 0
+        self.saldo_base = saldo
+        self.pagado = 0.0
+        self.mes_liquidacion = None
+        self.version = 0
+
+    def saldo(self, mes):
+        # Saldo tras los pagos del mes indicado, sin revisar si ya se liquidó
+        k = mes - self.mes_base
+        if k == 0:
+            return self.saldo_base
+        r = self.tasa
+        c = self.cuota
+        if r == 0:
+            return self.saldo_base - c * k
+        return (self.saldo_base - c / r) * (1 + r) ** k + c / r
+
+    def meses_para_liquidar(self):
+        # Menor k >= 1 con saldo(mes_base + k) <= 0, o inf si el pago no
+        # cubre ni los intereses
+        S, r, c = self.saldo_base, self.tasa, self.cuota
+        if S <= 0:
+            return 0
+        if r == 0:
+            k = ceil(S / c)
+        else:
+            if c <= S * r:
+                return inf
+            k = max(1, ceil(log(c / (c - S * r)) / log(1 + r)))
+        # La estimación en float puede quedar un mes corta o larga
+        while k > 1 and self.saldo(self.mes_base + k - 1) <= 0:
+            k -= 1
+        while self.saldo(self.mes_base + k) > 0:
+            k += 1
+        return k
+
+    def cambiar_cuota(self, mes, cuota):
+        # Fija el saldo al mes dado y a partir de ahí paga "cuota"
+        self.saldo_base = self.saldo(mes)
+        self.pagado += self.cuota * (mes - self.mes_base)
+        self.mes_base = mes
+        self.cuota = cuota
+        self.version += 1
+
+# =========================================
+# Validación de datos
+# =========================================
+
+def validar_deudas(deudas):
+    # deudas: lista de (saldo, tasa por mes, pago mínimo). Regresa las
+    # mismas en float o lanza ErrorValidacion.
+    if not deudas:
+        raise ErrorValidacion("sin_deudas", "Escribe al menos una deuda.")
+    if len(deudas) > MAX_DEUDAS:
+        raise ErrorValidacion("demasiadas_deudas", f"Puedo comparar hasta {MAX_DEUDAS} deudas a la vez.")
+    preparadas = []
+    for numero, (saldo, tasa, minimo) in enumerate(deudas, start=1):
+        try:
+            preparadas.append((
+                float(validar_monto(saldo, "El saldo")),
+                float(validar_tasa(tasa, permitir_cero=True)),
+                float(validar_monto(minimo, "El pago mínimo"))
+            ))
+        except ErrorValidacion as e:
+            raise ErrorValidacion(e.motivo, f"Deuda {numero}: {e.mensaje}")
+    return preparadas
+
+
+def preparar_deudas(deudas, presupuesto):
+    preparadas = validar_deudas(deudas)
+    presupuesto = float(validar_monto(presupuesto, "El presupuesto mensual"))
+    minimos = sum(minimo for _, _, minimo in preparadas)
+    if presupuesto < minimos:
+        raise ErrorValidacion(
+            "presupuesto_insuficiente",
+            f"El presupuesto no alcanza para los pagos mínimos (${minimos:,.2f} al mes)."
+        )
+    return preparadas, presupuesto
+
+
+def orden_estrategia(deudas, estrategia):
+    # Índices de las deudas en el orden en que se les manda el excedente
+    if estrategia == "avalancha":
+        return sorted(range(len(deudas)), key=lambda i: (-deudas[i][1], deudas[i][0]))
+    if estrategia == "bola_de_nieve":
+        return sorted(range(len(deudas)), key=lambda i: (deudas[i][0], -deudas[i][1]))
+    raise ValueError(f"Estrategia desconocida: {estrategia}")
+
+# =========================================
+# Simulación por eventos
+# =========================================
+
+def simular_plan(deudas, presupuesto, orden, max_meses=PLAZO_MAXIMO):
+    # deudas y presupuesto ya preparados. Regresa un diccionario con el
+    # mes en que se liquida cada deuda, los meses totales, el total
+    # pagado y los intereses.
+    if sorted(orden) != list(range(len(deudas))):
+        raise ErrorValidacion("orden_invalido", "El orden debe incluir cada deuda una sola vez.")
+    estados = [Deuda(i, *deuda) for i, deuda in enumerate(deudas)]
+    prioridad = {indice: posicion for posicion, indice in enumerate(orden)}
+    pendientes = list(orden)  # Activas en orden de prioridad
+
+    eventos = []
+
+    def programar(deuda):
+        meses = deuda.meses_para_liquidar()
+        if meses != inf:
+            heapq.heappush(eventos, (deuda.mes_base + meses, prioridad[deuda.indice], deuda.indice, deuda.version))
+
+    excedente = presupuesto - sum(deuda.minimo for deuda in estados)
+    estados[pendientes[0]].cambiar_cuota(0, estados[pendientes[0]].minimo + excedente)
+    for deuda in estados:
+        programar(deuda)
+
+    while eventos and pendientes:
+        mes, _, indice, version = heapq.heappop(eventos)
+        deuda = estados[indice]
+        if version != deuda.version:
+            continue  # Evento viejo: la deuda cambió de pago después
+        if mes > max_meses:
+            break
+
+        # Se liquidan todas las deudas de este mes; lo que sobra de sus
+        # últimos pagos se abona a la prioritaria en el mismo mes
+        sobrante = 0.0
+        liberado = 0.0
+        liquidadas = [deuda]
+        while eventos and eventos[0][0] == mes:
+            _, _, otro, version = heapq.heappop(eventos)
+            if version == estados[otro].version:
+                liquidadas.append(estados[otro])
+        for liquidada in liquidadas:
+            ultimo_pago = liquidada.saldo(mes - 1) * (1 + liquidada.tasa)
+            liquidada.pagado += liquidada.cuota * (mes - 1 - liquidada.mes_base) + ultimo_pago
+            liquidada.mes_liquidacion = mes
+            sobrante += liquidada.cuota - ultimo_pago
+            liberado += liquidada.cuota
+            pendientes.remove(liquidada.indice)
+
+        while pendientes and sobrante > 0:
+            objetivo = estados[pendientes[0]]
+            objetivo.cambiar_cuota(mes, objetivo.cuota)
+            abono = min(sobrante, objetivo.saldo_base)
+            objetivo.saldo_base -= abono
+            objetivo.pagado += abono
+            sobrante -= abono
+            if objetivo.saldo_base <= 1e-9:
+                # El sobrante alcanzó para liquidarla en este mismo mes
+                objetivo.mes_liquidacion = mes
+                liberado += objetivo.cuota
+                pendientes.pop(0)
+            else:
+                programar(objetivo)
+
+        if pendientes:
+            objetivo = estados[pendientes[0]]
+            objetivo.cambiar_cuota(mes, objetivo.cuota + liberado)
+            programar(objetivo)
+
+    if pendientes:
+        raise ErrorValidacion(
+            "no_amortiza",
+            f"Con ese presupuesto las deudas no se terminan de pagar en {max_meses} meses."
+        )
+
+    pagado = sum(deuda.pagado for deuda in estados)
+    saldo_inicial = sum(deuda.saldo_inicial for deuda in estados)
+    return {
+        "orden": list(orden),
+        "liquidaciones": [deuda.mes_liquidacion for deuda in estados],
+        "meses": max(deuda.mes_liquidacion for deuda in estados),
+        "total_pagado": round(pagado, 2),
+        "intereses": round(pagado - saldo_inicial, 2),
+    }
+
+
+def simular_solo_minimos(deudas, max_meses=PLAZO_MAXIMO):
+    # Referencia: cada deuda con su mínimo y sin pasar lo liberado a las
+    # demás. None si alguna no se termina de pagar así.
+    liquidaciones = []
+    pagado = 0.0
+    for indice, deuda in enumerate(deudas):
+        estado = Deuda(indice, *deuda)
+        meses = estado.meses_para_liquidar()
+        if meses > max_meses:
+            return None
+        ultimo_pago = estado.saldo(meses - 1) * (1 + estado.tasa)
+        pagado += estado.cuota * (meses - 1) + ultimo_pago
+        liquidaciones.append(meses)
+    return {
+        "liquidaciones": liquidaciones,
+        "meses": max(liquidaciones),
+        "total_pagado": round(pagado, 2),
+        "intereses": round(pagado - sum(saldo for saldo, _, _ in deudas), 2),
+    }
+
+
+def comparar_estrategias(deudas, presupuesto, ordenes=None):
+    # ordenes: {nombre: [índices]} con órdenes propios además de
+    # avalancha y bola de nieve. El ahorro de intereses se mide contra
+    # pagar solo los mínimos (o None si así nunca se terminan).
+    deudas, presupuesto = preparar_deudas(deudas, presupuesto)
+    solo_minimos = simular_solo_minimos(deudas)
+    planes = {nombre: orden_estrategia(deudas, nombre) for nombre in ESTRATEGIAS}
+    planes.update(ordenes or {})
+
+    resultados = {}
+    for nombre, orden in planes.items():
+        plan = simular_plan(deudas, presupuesto, orden)
+        plan["ahorro_intereses"] = (
+            round(solo_minimos["intereses"] - plan["intereses"], 2) if solo_minimos else None
+        )
+        resultados[nombre] = plan
+    return {"solo_minimos": solo_minimos, "estrategias": resultados}
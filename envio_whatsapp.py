@@ -0,0 +1,322 @@
+# =========================================
+# Envío de mensajes por WhatsApp Cloud API
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Cliente para el endpoint /messages de la Graph API con
+# conexiones reutilizadas, reintentos y cortacircuitos
+# =========================================
+#
+# Configuración (variables de entorno):
+#   WHATSAPP_API_URL          por defecto https://graph.facebook.com/v19.0
+#                             (en pruebas se apunta al servidor local)
+#   WHATSAPP_PHONE_NUMBER_ID  identificador del número que envía
+#   WHATSAPP_TOKEN            token de acceso; sin token solo se registra (DEBUG)
+#   MAX_ENVIOS_SIMULTANEOS    envíos en paralelo (por defecto 8)
+#   MAX_ESPERA_REINTENTO      segundos máximos entre reintentos, aunque
+#                             Retry-After pida más (por defecto 60)
+
+import json
+import math
+import os
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+LIMITE_TEXTO = 4096  # Máximo de caracteres de un mensaje de texto en WhatsApp
+MAX_ENVIOS_SIMULTANEOS = int(os.environ.get("MAX_ENVIOS_SIMULTANEOS", "8"))
+MAX_ESPERA_REINTENTO = float(os.environ.get("MAX_ESPERA_REINTENTO", "60"))
+ENCABEZADOS_JSON = {"Content-Type": "application/json"}
+
+
+class ErrorEnvio(Exception):
+    pass
+
+# =========================================
+# División de respuestas largas
+# =========================================
+
+def dividir_texto(texto, limite=LIMITE_TEXTO):
+    # Corta primero entre párrafos, luego entre líneas y, si una sola
+    # línea no cabe, a la fuerza
+    if len(texto) <= limite:
+        return [texto]
+    partes = []
+    actual = ""
+    for linea in texto.split("\n"):
+        while len(linea) > limite:
+            if actual:
+                partes.append(actual)
+                actual = ""
+            partes.append(linea[:limite])
+            linea = linea[limite:]
+        candidato = f"{actual}\n{linea}" if actual else linea
+        if len(candidato) <= limite:
+            actual = candidato
+            continue
+        # Se prefiere cortar en la última línea en blanco o separador
+        corte = max(actual.rfind("\n\n"), actual.rfind("\n____"))
+        if corte > 0:
+            partes.append(actual[:corte])
+            actual = actual[corte:].lstrip("\n")
+            candidato = f"{actual}\n{linea}" if actual else linea
+            if len(candidato) <= limite:
+                actual = candidato
+                continue
+        partes.append(actual)
+        actual = linea
+    if actual:
+        partes.append(actual)
+    return partes
+
+# =========================================
+# Cuerpos de los mensajes
+# =========================================
+#
+# El cuerpo se arma como bytes de JSON con "to" al final, para que en
+# las respuestas fijas (menú, textos educativos) solo falte pegar el
+# número: TextoPreparado se divide y se serializa una sola vez, al
+# crearse, y sigue siendo un str para todo lo demás.
+
+def _prefijo_cuerpo(parte):
+    cuerpo = {
+        "messaging_product": "whatsapp",
+        "recipient_type": "individual",
+        "type": "text",
+        "text": {"preview_url": False, "body": parte},
+    }
+    return json.dumps(cuerpo, ensure_ascii=False, separators=(",", ":"))[:-1].encode("utf-8") + b',"to":'
+
+
+def cuerpo_con_numero(prefijo, numero):
+    return prefijo + json.dumps(numero).encode("utf-8") + b"}"
+
+
+def cuerpo_texto(numero, parte):
+    # Respuestas que cambian en cada mensaje: se arman al enviarse
+    return json.dumps({
+        "messaging_product": "whatsapp",
+        "recipient_type": "individual",
+        "to": numero,
+        "type": "text",
+        "text": {"preview_url": False, "body": parte},
+    }).encode("utf-8")
+
+
+class TextoPreparado(str):
+    def __new__(cls, texto):
+        preparado = super().__new__(cls, texto)
+        preparado.prefijos = tuple(_prefijo_cuerpo(parte) for parte in dividir_texto(texto))
+        return preparado
+
+# =========================================
+# Cortacircuitos
+# =========================================
+#
+# Tras varias fallas seguidas deja de intentar por un rato para no
+# saturar la API (ni los hilos propios) mientras Meta está caído. Pasado
+# ese tiempo deja pasar un intento de prueba.
+
+class Cortacircuitos:
+    def __init__(self, fallas_para_abrir=5, segundos_abierto=30):
+        self.fallas_para_abrir = fallas_para_abrir
+        self.segundos_abierto = segundos_abierto
+        self._fallas = 0
+        self._abierto_hasta = 0.0
+        self._prueba_en_curso = False
+        self._candado = threading.Lock()
+
+    def permitir(self):
+        with self._candado:
+            if self._fallas < self.fallas_para_abrir:
+                return True
+            if time.monotonic() < self._abierto_hasta or self._prueba_en_curso:
+                return False
+            self._prueba_en_curso = True
+            return True
+
+    def exito(self):
+        with self._candado:
+            self._fallas = 0
+            self._prueba_en_curso = False
+
+    def falla(self):
+        with self._candado:
+            self._fallas += 1
+            self._prueba_en_curso = False
+            if self._fallas >= self.fallas_para_abrir:
+                self._abierto_hasta = time.monotonic() + self.segundos_abierto
+
+    def estado(self):
+        with self._candado:
+            if self._fallas < self.fallas_para_abrir:
+                return "cerrado"
+            return "abierto" if time.monotonic() < self._abierto_hasta else "semiabierto"
+
+# =========================================
+# Cliente de la Graph API
+# =========================================
+
+class ClienteWhatsApp:
+    def __init__(self, url_api=None, phone_number_id=None, token=None,
+                 max_simultaneos=MAX_ENVIOS_SIMULTANEOS, reintentos=3, espera_base=0.5,
+                 timeout=10, cortacircuitos=None):
+        self.url_api = (url_api or os.environ.get("WHATSAPP_API_URL", "https://graph.facebook.com/v19.0")).rstrip("/")
+        self.phone_number_id = phone_number_id or os.environ.get("WHATSAPP_PHONE_NUMBER_ID", "")
+        self.token = token if token is not None else os.environ.get("WHATSAPP_TOKEN", "")
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.timeout = timeout
+        self.cortacircuitos = cortacircuitos or Cortacircuitos()
+        self._limite = threading.BoundedSemaphore(max_simultaneos)
+
+        # Una sola sesión: mantiene vivas las conexiones HTTPS
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=max_simultaneos)
+        self.sesion.mount("https://", adaptador)
+        self.sesion.mount("http://", adaptador)
+        self.sesion.headers["Authorization"] = f"Bearer {self.token}"
+
+        # Los envíos corren en varios hilos; += no es atómico
+        self.enviados = 0
+        self.fallidos = 0
+        self._candado_cuentas = threading.Lock()
+
+    @property
+    def url_mensajes(self):
+        return f"{self.url_api}/{self.phone_number_id}/messages"
+
+    def enviar_texto(self, numero, texto):
+        # Las respuestas largas se mandan en varios mensajes, en orden
+        if isinstance(texto, TextoPreparado):
+            for prefijo in texto.prefijos:
+                self._enviar(cuerpo_con_numero(prefijo, numero))
+            return
+        for parte in dividir_texto(texto):
+            self._enviar(cuerpo_texto(numero, parte))
+
+    def _enviar(self, cuerpo):
+        # cuerpo: bytes del JSON ya armado
+        if not self.cortacircuitos.permitir():
+            self._contar(exito=False)
+            raise ErrorEnvio("Cortacircuitos abierto: la API de WhatsApp está fallando")
+
+        ultimo_error = None
+        for intento in range(self.reintentos + 1):
+            if intento:
+                time.sleep(ultimo_error[1])
+            with self._limite:
+                try:
+                    respuesta = self.sesion.post(
+                        self.url_mensajes, data=cuerpo, headers=ENCABEZADOS_JSON, timeout=self.timeout
+                    )
+                except requests.RequestException as e:
+                    ultimo_error = (e, self._espera(intento))
+                    continue
+
+            if respuesta.status_code < 300:
+                self.cortacircuitos.exito()
+                self._contar(exito=True)
+                return respuesta.json()
+            if respuesta.status_code != 429 and respuesta.status_code < 500:
+                # Error del mensaje (número inválido, token): no se reintenta
+                self.cortacircuitos.exito()
+                self._contar(exito=False)
+                raise ErrorEnvio(f"WhatsApp rechazó el mensaje ({respuesta.status_code}): {respuesta.text[:200]}")
+            ultimo_error = (
+                ErrorEnvio(f"WhatsApp respondió {respuesta.status_code}"),
+                self._espera(intento, respuesta.headers.get("Retry-After"))
+            )
+
+        self.cortacircuitos.falla()
+        self._contar(exito=False)
+        raise ErrorEnvio(f"No se pudo enviar tras {self.reintentos + 1} intentos") from ultimo_error[0]
+
+    def _contar(self, exito):
+        with self._candado_cuentas:
+            if exito:
+                self.enviados += 1
+            else:
+                self.fallidos += 1
+
+    def _espera(self, intento, retry_after=None):
+        # Retry-After lo manda el servidor: se acota para que un valor
+        # enorme no deje al hilo dormido ni uno negativo haga fallar sleep
+        if retry_after:
+            try:
+                segundos = float(retry_after)
+            except ValueError:
+                segundos = math.nan
+            if not math.isnan(segundos):
+                return min(max(segundos, 0.0), MAX_ESPERA_REINTENTO)
+        # Espera exponencial con variación aleatoria
+        return self.espera_base * (2 ** intento) * (0.5 + random.random())
+
+    def estadisticas(self):
+        with self._candado_cuentas:
+            enviados, fallidos = self.enviados, self.fallidos
+        return {
+            "enviados": enviados,
+            "fallidos": fallidos,
+            "cortacircuitos": self.cortacircuitos.estado(),
+        }
+
+# =========================================
+# Servidor local que imita la Graph API (pruebas y carga)
+# =========================================
+
+class ServidorStubWhatsApp(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, direccion=("127.0.0.1", 0), demora=0.0, codigos=None):
+        # codigos: lista de códigos HTTP a devolver en orden antes de
+        # responder 200 (para probar reintentos y cortacircuitos)
+        super().__init__(direccion, _ManejadorStub)
+        self.demora = demora
+        self.codigos = list(codigos or [])
+        self.recibidos = []
+        self.candado = threading.Lock()
+
+    def iniciar(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        host, puerto = self.server_address
+        return f"http://{host}:{puerto}/v19.0"
+
+
+class _ManejadorStub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Sin Nagle: encabezados y cuerpo van en escrituras separadas
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        largo = int(self.headers.get("Content-Length", 0))
+        cuerpo = json.loads(self.rfile.read(largo) or b"{}")
+        if self.server.demora:
+            time.sleep(self.server.demora)
+        with self.server.candado:
+            codigo = self.server.codigos.pop(0) if self.server.codigos else 200
+            if codigo == 200:
+                self.server.recibidos.append(cuerpo)
+                numero_mensaje = len(self.server.recibidos)
+        if codigo == 200:
+            datos = json.dumps({
+                "messaging_product": "whatsapp",
+                "contacts": [{"input": cuerpo.get("to"), "wa_id": cuerpo.get("to")}],
+                "messages": [{"id": f"wamid.stub{numero_mensaje}"}],
+            }).encode()
+        else:
+            datos = json.dumps({"error": {"code": codigo, "message": "stub"}}).encode()
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def log_message(self, *argumentos):
+        pass
@@ -0,0 +1,83 @@
+# =========================================
+# Exportación de tablas de amortización
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Convierte una o muchas tablas de amortización en CSV o
+# NDJSON por bloques, para mandarlas en streaming sin armarlas en memoria
+# =========================================
+#
+# Cada crédito se describe con un diccionario:
+#   {"monto": 100000, "tasa": 0.02, "plazo": 24, "abono": 500, "desde": 3}
+# (abono y desde son opcionales). En la exportación de varios créditos
+# cada fila lleva además la columna "credito" con su posición.
+
+import os
+
+from calculos import tabla_amortizacion
+from validacion import ErrorValidacion
+
+COLUMNAS = ("periodo", "pago", "interes", "capital", "abono_extra", "saldo")
+FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+FILAS_POR_BLOQUE = 256
+MAX_CREDITOS_EXPORTACION = int(os.environ.get("MAX_CREDITOS_EXPORTACION", "5000"))
+
+
+def preparar_tablas(creditos):
+    # Valida todos los créditos antes de empezar a mandar filas (un
+    # error a media respuesta ya no se puede avisar con un código HTTP)
+    if len(creditos) > MAX_CREDITOS_EXPORTACION:
+        raise ErrorValidacion(
+            "demasiados_creditos", f"Se pueden exportar hasta {MAX_CREDITOS_EXPORTACION} créditos a la vez."
+        )
+    tablas = []
+    for indice, credito in enumerate(creditos, start=1):
+        try:
+            tablas.append(tabla_amortizacion(
+                credito.get("monto"),
+                credito.get("tasa"),
+                credito.get("plazo"),
+                credito.get("abono", 0),
+                credito.get("desde", 1)
+            ))
+        except ErrorValidacion as e:
+            raise ErrorValidacion(e.motivo, f"Crédito {indice}: {e.mensaje}")
+        except AttributeError:
+            raise ErrorValidacion("formato", f"Crédito {indice}: debe ser un objeto con monto, tasa y plazo.")
+    return tablas
+
+
+def _linea_csv(fila, indice):
+    valores = [str(fila[columna]) for columna in COLUMNAS]
+    if indice is not None:
+        valores.insert(0, str(indice))
+    return ",".join(valores) + "\n"
+
+
+def _linea_ndjson(fila, indice):
+    # Los Decimal van como números JSON sin pasar por float
+    campos = [f'"{columna}":{fila[columna]}' for columna in COLUMNAS]
+    if indice is not None:
+        campos.insert(0, f'"credito":{indice}')
+    return "{" + ",".join(campos) + "}\n"
+
+
+def exportar_tablas(tablas, formato, con_indice=False):
+    # Genera el texto por bloques de FILAS_POR_BLOQUE filas
+    if formato not in FORMATOS:
+        raise ErrorValidacion("formato", f"Formato desconocido: {formato} (usa csv o ndjson)")
+    linea = _linea_csv if formato == "csv" else _linea_ndjson
+
+    bloque = []
+    if formato == "csv":
+        bloque.append(",".join((("credito",) if con_indice else ()) + COLUMNAS) + "\n")
+    for numero, tabla in enumerate(tablas, start=1):
+        indice = numero if con_indice else None
+        for fila in tabla:
+            bloque.append(linea(fila, indice))
+            if len(bloque) >= FILAS_POR_BLOQUE:
+                yield "".join(bloque)
+                bloque = []
+    if bloque:
+        yield "".join(bloque)
@@ -0,0 +1,79 @@
+# =========================================
+# Grabación del tráfico de /webhook
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Guarda los mensajes que llegan al webhook (con los
+# números anonimizados) para poder reproducir después la misma forma de
+# tráfico en pruebas de carga (benchmarks/reproducir_trafico.py)
+# =========================================
+#
+# Se activa con GRABAR_TRAFICO=/ruta/trafico.ndjson. Cada entrega es
+# una línea JSON compacta que solo se agrega al final del archivo:
+#   [segundos_epoch, [[numero_anonimo, texto, timestamp], ...]]
+# Las escrituras usan O_APPEND con una sola llamada por línea, así que
+# varios workers pueden grabar en el mismo archivo.
+#
+# El número se reemplaza por un HMAC con SAL_GRABACION: la misma persona
+# queda siempre con el mismo número anónimo y sus mensajes siguen en
+# orden, pero no se puede recuperar el original. Con varios workers hay
+# que fijar SAL_GRABACION (si no, cada proceso usa una sal al azar).
+# El texto se guarda tal cual: son respuestas a los pasos del bot.
+
+import hashlib
+import hmac
+import json
+import os
+import time
+
+GRABAR_TRAFICO = os.environ.get("GRABAR_TRAFICO", "")
+SAL_GRABACION = os.environ.get("SAL_GRABACION", "")
+
+
+class GrabadorTrafico:
+    def __init__(self, ruta, sal=SAL_GRABACION):
+        self.ruta = ruta
+        self.sal = sal.encode("utf-8") if sal else os.urandom(16)
+        self._descriptor = None
+        self._pid = None
+
+    def anonimizar(self, numero):
+        # 12 dígitos con forma de número celular (52 + 10 dígitos)
+        resumen = hmac.new(self.sal, numero.encode("utf-8"), hashlib.sha256).digest()
+        return "52" + str(int.from_bytes(resumen[:8], "big") % 10**10).zfill(10)
+
+    def grabar(self, mensajes):
+        # mensajes: (numero, texto, timestamp, id) como los de recorrer_mensajes
+        if not mensajes:
+            return
+        registro = [
+            round(time.time(), 3),
+            [[self.anonimizar(numero), texto, timestamp] for numero, texto, timestamp, _ in mensajes]
+        ]
+        linea = json.dumps(registro, ensure_ascii=False, separators=(",", ":")) + "\n"
+        os.write(self._archivo(), linea.encode("utf-8"))
+
+    def _archivo(self):
+        # Se abre en el proceso que graba (después del fork de gunicorn)
+        if self._pid != os.getpid():
+            if self._descriptor is not None:
+                os.close(self._descriptor)
+            self._descriptor = os.open(self.ruta, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+        return self._descriptor
+
+
+def crear_grabador(ruta=None):
+    # None si la grabación está apagada
+    ruta = ruta or GRABAR_TRAFICO
+    return GrabadorTrafico(ruta) if ruta else None
+
+
+def leer_grabacion(ruta):
+    # Genera (segundos_epoch, [(numero, texto, timestamp), ...]) por
+    # entrega; las líneas incompletas (un corte a media escritura) se saltan
+    with open(ruta, encoding="utf-8") as archivo:
+        for linea in archivo:
+            try:
+                momento, mensajes = json.loads(linea)
+            except ValueError:
+                continue
+            yield momento, [tuple(mensaje) for mensaje in mensajes]
@@ -0,0 +1,69 @@
+# =========================================
+# Lectura de las notificaciones de WhatsApp Cloud API
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Recorre todas las entradas, cambios y mensajes de una
+# notificación (Meta puede juntar varios en una sola entrega)
+# =========================================
+#
+# Estructura de una notificación:
+#   {"entry": [{"changes": [{"value": {"messages": [...], "statuses": [...]}}]}]}
+#
+# Los avisos de estado (enviado, entregado, leído) llegan en "statuses"
+# y no traen "messages": se saltan sin revisar nada más. Los mensajes
+# que no son de texto (imágenes, audios, ubicaciones) también se
+# ignoran, igual que antes.
+
+def _lista(valor):
+    # Las listas de la notificación; cualquier otra cosa se toma como vacía
+    return valor if isinstance(valor, list) else ()
+
+
+def recorrer_mensajes(data):
+    # Genera (numero, mensaje, timestamp, id) de cada mensaje de texto;
+    # el id ("wamid...") sirve para descartar entregas repetidas. Las
+    # partes con otra forma se saltan sin lanzar excepciones (un 500 haría
+    # que Meta reintente la misma entrega para siempre).
+    if not isinstance(data, dict):
+        return
+    for entrada in _lista(data.get("entry")):
+        if not isinstance(entrada, dict):
+            continue
+        for cambio in _lista(entrada.get("changes")):
+            if not isinstance(cambio, dict):
+                continue
+            valor = cambio.get("value")
+            if not isinstance(valor, dict):
+                continue
+            for mensaje in _lista(valor.get("messages")):
+                if not isinstance(mensaje, dict):
+                    continue
+                try:
+                    texto = mensaje["text"]["body"].strip().lower()
+                    numero = mensaje["from"]
+                except (KeyError, TypeError, AttributeError):
+                    continue
+                if not isinstance(numero, str):
+                    continue
+                try:
+                    timestamp = int(mensaje.get("timestamp", 0))
+                except (TypeError, ValueError, OverflowError):
+                    timestamp = 0
+                id_mensaje = mensaje.get("id")
+                yield numero, texto, timestamp, id_mensaje if isinstance(id_mensaje, str) else None
+
+
+def agrupar_por_remitente(data):
+    return agrupar_mensajes(recorrer_mensajes(data))
+
+
+def agrupar_mensajes(mensajes):
+    # {numero: [mensaje, ...]} en el orden en que los escribió cada
+    # persona. El orden por timestamp es estable: si dos mensajes tienen
+    # el mismo, se respeta el orden en que vienen en la notificación.
+    grupos = {}
+    for numero, texto, timestamp, _ in mensajes:
+        grupos.setdefault(numero, []).append((timestamp, texto))
+    return {
+        numero: [texto for _, texto in sorted(mensajes, key=lambda m: m[0])]
+        for numero, mensajes in grupos.items()
+    }
@@ -0,0 +1,329 @@
+# =========================================
+# Métricas estilo Prometheus
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Contadores, histogramas y medidores baratos de actualizar
+# que se exponen en /metrics con el formato de texto de Prometheus
+# =========================================
+#
+# Cada hilo escribe en su propio diccionario, así que actualizar una
+# métrica no toma ningún candado; al exponer se suman los de todos los
+# hilos. Con varios workers de gunicorn cada proceso vuelca sus valores
+# en DIRECTORIO_METRICAS/<pid>.json cada INTERVALO_METRICAS segundos y
+# /metrics suma los archivos de todos, así que da igual qué worker
+# atienda la consulta. Conviene vaciar ese directorio al desplegar.
+#
+# Configuración (variables de entorno):
+#   DIRECTORIO_METRICAS  carpeta compartida entre workers (vacío = un proceso)
+#   INTERVALO_METRICAS   segundos entre volcados (por defecto 5)
+
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DIRECTORIO_METRICAS = os.environ.get("DIRECTORIO_METRICAS", "")
+INTERVALO_METRICAS = float(os.environ.get("INTERVALO_METRICAS", "5"))
+
+registro = logging.getLogger(__name__)
+
+# Límites de las cubetas de tiempo, en segundos (de 100 µs a 5 s)
+LIMITES_SEGUNDOS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+# =========================================
+# Tipos de métrica
+# =========================================
+#
+# Los valores de las etiquetas se pasan en el mismo orden en que se
+# declararon y deben ser textos.
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, registro, nombre, ayuda, etiquetas=()):
+        self.registro = registro
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+
+    def incrementar(self, *valores, cantidad=1):
+        fragmento = self.registro._fragmento()
+        clave = (self.nombre, valores)
+        fragmento[clave] = fragmento.get(clave, 0) + cantidad
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, registro, nombre, ayuda, etiquetas=(), limites=LIMITES_SEGUNDOS):
+        self.registro = registro
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.limites = tuple(limites)
+
+    def observar(self, valor, *valores):
+        # Se guarda la cuenta de cada cubeta (sin acumular), la de +Inf
+        # y al final la suma de lo observado
+        fragmento = self.registro._fragmento()
+        clave = (self.nombre, valores)
+        cubetas = fragmento.get(clave)
+        if cubetas is None:
+            cubetas = fragmento[clave] = [0] * (len(self.limites) + 2)
+        cubetas[bisect.bisect_left(self.limites, valor)] += 1
+        cubetas[-1] += valor
+
+    @contextmanager
+    def cronometrar(self, *valores):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, *valores)
+
+    def medir_funcion(self, funcion):
+        # Envuelve una función y mide cada llamada con su nombre como
+        # etiqueta (el histograma debe tener una sola etiqueta)
+        nombre = funcion.__name__
+
+        def medida(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                self.observar(time.perf_counter() - inicio, nombre)
+
+        medida.__name__ = nombre
+        medida.__wrapped__ = funcion
+        return medida
+
+
+class Medidor:
+    tipo = "gauge"
+
+    def __init__(self, registro, nombre, ayuda, funcion, etiquetas=(), por_proceso=False):
+        # funcion() regresa un número, o un diccionario {valores: número}
+        # si el medidor tiene etiquetas. Con por_proceso=True el valor se
+        # suma entre los workers vivos; si no, lo lee solo quien expone
+        # (por ejemplo, algo guardado en un almacén compartido).
+        self.registro = registro
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.etiquetas = tuple(etiquetas)
+        self.por_proceso = por_proceso
+
+    def leer(self):
+        valor = self.funcion()
+        if isinstance(valor, dict):
+            return {(self.nombre, tuple(valores)): v for valores, v in valor.items()}
+        return {(self.nombre, ()): valor}
+
+# =========================================
+# Registro de métricas
+# =========================================
+
+class Registro:
+    def __init__(self, directorio=DIRECTORIO_METRICAS, intervalo=INTERVALO_METRICAS):
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self._metricas = {}
+        self._reiniciar()
+        # Lo que el proceso padre haya contado no se hereda a los workers
+        os.register_at_fork(after_in_child=self._reiniciar)
+
+    def _reiniciar(self):
+        self._local = threading.local()
+        self._candado = threading.Lock()
+        self._fragmentos = []   # (hilo, diccionario) de cada hilo que escribe
+        self._retirados = {}    # lo que dejaron los hilos que ya terminaron
+        self._pid = None
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(self, nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=LIMITES_SEGUNDOS):
+        return self._registrar(Histograma(self, nombre, ayuda, etiquetas, limites))
+
+    def medidor(self, nombre, ayuda, funcion, etiquetas=(), por_proceso=False):
+        return self._registrar(Medidor(self, nombre, ayuda, funcion, etiquetas, por_proceso))
+
+    def _registrar(self, metrica):
+        if metrica.nombre in self._metricas:
+            raise ValueError(f"Métrica repetida: {metrica.nombre}")
+        self._metricas[metrica.nombre] = metrica
+        return metrica
+
+    def _fragmento(self):
+        try:
+            return self._local.datos
+        except AttributeError:
+            pass
+        # Primera escritura de este hilo
+        datos = self._local.datos = {}
+        with self._candado:
+            self._fragmentos.append((threading.current_thread(), datos))
+            if self._pid != os.getpid():
+                self._iniciar_volcado()
+        return datos
+
+    def _iniciar_volcado(self):
+        # Los hilos se crean en el proceso que los usa (después del fork
+        # de gunicorn), igual que en la cola de mensajes
+        self._pid = os.getpid()
+        if not self.directorio:
+            return
+        os.makedirs(self.directorio, exist_ok=True)
+        threading.Thread(target=self._volcar_periodicamente, name="metricas", daemon=True).start()
+        atexit.register(self.volcar)
+
+    def _volcar_periodicamente(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.volcar()
+            except Exception:
+                registro.exception("Error al volcar las métricas en %s", self.directorio)
+
+    def _valores_locales(self):
+        total = {}
+        with self._candado:
+            vivos = []
+            for hilo, datos in self._fragmentos:
+                if hilo.is_alive():
+                    vivos.append((hilo, datos))
+                    _sumar(total, datos)
+                else:
+                    # Los hilos terminados se juntan en uno solo para que
+                    # un servidor con un hilo por petición no acumule
+                    _sumar(self._retirados, datos)
+            self._fragmentos = vivos
+            _sumar(total, self._retirados)
+        return total
+
+    def _medidores(self, por_proceso):
+        valores = {}
+        for metrica in self._metricas.values():
+            if metrica.tipo == "gauge" and metrica.por_proceso == por_proceso:
+                try:
+                    valores.update(metrica.leer())
+                except Exception:
+                    registro.exception("Error al leer el medidor %s", metrica.nombre)
+        return valores
+
+    def volcar(self):
+        if not self.directorio:
+            return
+        contenido = {
+            "valores": [[nombre, list(valores), valor] for (nombre, valores), valor in self._valores_locales().items()],
+            "medidores": [[nombre, list(valores), valor] for (nombre, valores), valor in self._medidores(True).items()],
+        }
+        ruta = os.path.join(self.directorio, f"{os.getpid()}.json")
+        temporal = ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            json.dump(contenido, archivo, separators=(",", ":"))
+        os.replace(temporal, ruta)
+
+    def _valores_de_otros_procesos(self, valores, medidores):
+        # Los contadores de workers que ya murieron se siguen sumando
+        # (son acumulados); sus medidores no
+        for nombre_archivo in os.listdir(self.directorio):
+            pid, extension = os.path.splitext(nombre_archivo)
+            if extension != ".json" or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                with open(os.path.join(self.directorio, nombre_archivo), encoding="utf-8") as archivo:
+                    contenido = json.load(archivo)
+            except (OSError, ValueError):
+                continue
+            _sumar(valores, {(nombre, tuple(v)): valor for nombre, v, valor in contenido["valores"]})
+            if _proceso_vivo(int(pid)):
+                _sumar(medidores, {(nombre, tuple(v)): valor for nombre, v, valor in contenido["medidores"]})
+
+    def valores(self):
+        # Diccionario {(nombre, valores_etiquetas): valor} de todo el
+        # servicio; los histogramas quedan como lista de cubetas + suma
+        valores = self._valores_locales()
+        medidores = self._medidores(True)
+        if self.directorio and os.path.isdir(self.directorio):
+            self._valores_de_otros_procesos(valores, medidores)
+        valores.update(medidores)
+        valores.update(self._medidores(False))
+        return valores
+
+    def exponer(self):
+        # Formato de texto de Prometheus (versión 0.0.4)
+        valores = self.valores()
+        por_metrica = {}
+        for (nombre, etiquetas), valor in valores.items():
+            por_metrica.setdefault(nombre, []).append((etiquetas, valor))
+
+        lineas = []
+        for metrica in self._metricas.values():
+            lineas.append(f"# HELP {metrica.nombre} {_escapar_ayuda(metrica.ayuda)}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            for etiquetas, valor in sorted(por_metrica.get(metrica.nombre, ())):
+                pares = list(zip(metrica.etiquetas, etiquetas))
+                if metrica.tipo != "histogram":
+                    lineas.append(f"{metrica.nombre}{_etiquetas(pares)} {_numero(valor)}")
+                    continue
+                acumulado = 0
+                for limite, cuenta in zip(metrica.limites + (float("inf"),), valor[:-1]):
+                    acumulado += cuenta
+                    lineas.append(f"{metrica.nombre}_bucket{_etiquetas(pares + [('le', _numero(limite))])} {acumulado}")
+                lineas.append(f"{metrica.nombre}_sum{_etiquetas(pares)} {_numero(valor[-1])}")
+                lineas.append(f"{metrica.nombre}_count{_etiquetas(pares)} {acumulado}")
+        return "\n".join(lineas) + "\n"
+
+
+def _sumar(destino, origen):
+    # list() copia las entradas de una vez, aunque otro hilo siga
+    # escribiendo en origen
+    for clave, valor in list(origen.items()):
+        if isinstance(valor, list):
+            existente = destino.get(clave)
+            if existente is None:
+                destino[clave] = list(valor)
+            else:
+                for i, cuenta in enumerate(valor):
+                    existente[i] += cuenta
+        else:
+            destino[clave] = destino.get(clave, 0) + valor
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    if valor == int(valor):
+        return str(int(valor))
+    return repr(float(valor))
+
+
+def _escapar_ayuda(texto):
+    return texto.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escapar_valor(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(pares):
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nombre}="{_escapar_valor(valor)}"' for nombre, valor in pares) + "}"
@@ -0,0 +1,111 @@
+# =========================================
+# Comparador de ofertas de crédito
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Ordena cualquier cantidad de ofertas por su costo anual
+# total (estilo CAT), incluyendo comisión de apertura, comisiones por
+# periodo y seguros
+# =========================================
+#
+# Cada oferta se describe con un diccionario:
+#   {"nombre": "Banco A", "monto": 100000, "tasa": 0.02, "plazo": 24,
+#    "frecuencia": "mensual", "comision_apertura": 2000,
+#    "comision_periodica": 100, "seguro": 50}
+# (nombre, frecuencia y los cargos son opcionales). La tasa es por
+# periodo, como en el resto del bot.
+#
+# Se recibe el monto menos la apertura y se paga cada periodo la cuota
+# más comisiones y seguro. La tasa por periodo que iguala esos flujos
+# (la TIR) se resuelve para todas las ofertas a la vez y se anualiza
+# según la frecuencia de pago: CAT = (1 + tasa)^periodos_por_año - 1.
+
+import os
+
+import numpy as np
+
+from calculos_lote import calcular_pagos_lote, resolver_tasas_periodicas
+from validacion import ErrorValidacion, validar_monto, validar_tasa, validar_plazo
+
+FRECUENCIAS = {
+    "semanal": 52,
+    "catorcenal": 26,
+    "quincenal": 24,
+    "mensual": 12,
+    "bimestral": 6,
+    "trimestral": 4,
+    "semestral": 2,
+    "anual": 1,
+}
+MAX_OFERTAS = int(os.environ.get("MAX_OFERTAS", "1000"))
+
+
+def validar_frecuencia(frecuencia):
+    # Regresa los periodos por año; del JSON puede llegar cualquier cosa
+    # (una lista ni siquiera se puede buscar en el diccionario)
+    if not isinstance(frecuencia, str) or frecuencia not in FRECUENCIAS:
+        raise ErrorValidacion(
+            "frecuencia", f"Frecuencia desconocida: {frecuencia} (usa {', '.join(FRECUENCIAS)})"
+        )
+    return FRECUENCIAS[frecuencia]
+
+
+def preparar_oferta(oferta):
+    # Regresa (monto, tasa, plazo, apertura, cargos por periodo,
+    # periodos por año) en float, o lanza ErrorValidacion
+    if not isinstance(oferta, dict):
+        raise ErrorValidacion("formato", "Cada oferta debe ser un objeto con monto, tasa y plazo.")
+    monto = validar_monto(oferta.get("monto"), "El monto")
+    tasa = validar_tasa(oferta.get("tasa"))
+    plazo = validar_plazo(oferta.get("plazo"))
+    apertura = validar_monto(oferta.get("comision_apertura", 0), "La comisión de apertura", permitir_cero=True)
+    comision = validar_monto(oferta.get("comision_periodica", 0), "La comisión por periodo", permitir_cero=True)
+    seguro = validar_monto(oferta.get("seguro", 0), "El seguro", permitir_cero=True)
+    if apertura >= monto:
+        raise ErrorValidacion("monto_fuera_de_rango", "La comisión de apertura debe ser menor que el monto.")
+    periodos_por_ano = validar_frecuencia(oferta.get("frecuencia", "mensual"))
+    return float(monto), float(tasa), plazo, float(apertura), float(comision + seguro), periodos_por_ano
+
+
+def comparar_ofertas(ofertas):
+    # Regresa {"ofertas": [...], "errores": [...]}: las ofertas válidas
+    # de la más barata a la más cara y, aparte, las que traen datos que
+    # no sirven. "oferta" es la posición (desde 1) en la lista recibida.
+    if len(ofertas) > MAX_OFERTAS:
+        raise ErrorValidacion("demasiadas_ofertas", f"Se pueden comparar hasta {MAX_OFERTAS} ofertas a la vez.")
+    validas = []
+    errores = []
+    for numero, oferta in enumerate(ofertas, start=1):
+        try:
+            validas.append((numero, preparar_oferta(oferta)))
+        except ErrorValidacion as e:
+            errores.append({"oferta": numero, "motivo": e.motivo, "error": e.mensaje})
+    if not validas:
+        return {"ofertas": [], "errores": errores}
+
+    numeros, datos = zip(*validas)
+    monto, tasa, plazo, apertura, cargos, periodos_por_anio = (np.array(columna, dtype=float) for columna in zip(*datos))
+    pago_credito = calcular_pagos_lote(monto, tasa, plazo)["pago"]
+    pago_total = pago_credito + cargos
+    tir, _, convergio = resolver_tasas_periodicas(monto - apertura, pago_total, plazo)
+    cat = np.expm1(periodos_por_anio * np.log1p(tir))
+    total_pagado = apertura + pago_total * plazo
+
+    resultados = []
+    for i, numero in enumerate(numeros):
+        oferta = ofertas[numero - 1]
+        resultados.append({
+            "oferta": numero,
+            "nombre": oferta.get("nombre", f"Oferta {numero}"),
+            "pago_credito": round(float(pago_credito[i]), 2),
+            "pago_total": round(float(pago_total[i]), 2),
+            "total_pagado": round(float(total_pagado[i]), 2),
+            "costo_total": round(float(total_pagado[i] - monto[i]), 2),
+            "tasa_anual": round(float(tasa[i] * periodos_por_anio[i] * 100), 2),
+            "cat": round(float(cat[i] * 100), 2),
+            "convergio": bool(convergio[i]),
+        })
+    # Empates de CAT: primero la que cuesta menos en pesos
+    orden = np.lexsort((total_pagado - monto, cat))
+    clasificadas = [resultados[i] for i in orden]
+    for lugar, resultado in enumerate(clasificadas, start=1):
+        resultado["lugar"] = lugar
+    return {"ofertas": clasificadas, "errores": errores}
@@ -0,0 +1,339 @@
+# =========================================
+# Perfilado por flujo de la conversación
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Ganchos para perfilar en producción una muestra de los
+# mensajes (o solo ciertos flujos, pasos o funciones de cálculo) y
+# guardar los resultados por flujo cuando se pidan
+# =========================================
+#
+# Apagado (lo normal) cada gancho solo revisa un atributo y llama a la
+# función, así que puede quedarse siempre puesto. Encendido, se perfila
+# una fracción "muestreo" de las llamadas y, si "seleccion" no está
+# vacía, solo las de esos flujos ("opcion_3"), pasos ("precio_contado")
+# o funciones de cálculo ("calcular_costo_credito_tienda").
+#
+# Dos modos:
+#   pilas   un hilo toma cada INTERVALO_PERFILADO segundos la pila de
+#           los hilos que se están perfilando; casi no frena la llamada.
+#           Se guarda en formato "collapsed" (flamegraph.pl, speedscope)
+#   pstats  cProfile durante la llamada: cuenta todo, pero la hace más
+#           lenta. Se guarda en formato pstats (python -m pstats, snakeviz)
+#
+# Los resultados se acumulan en memoria por flujo desde que se encendió
+# el perfilado y volcar() los escribe en DIRECTORIO_PERFILES como
+# <flujo>.<pid>.txt o <flujo>.<pid>.prof (un archivo por worker; para
+# juntarlos basta concatenar los .txt o pasar varios .prof a pstats).
+#
+# Con varios workers, configurar() deja la configuración en
+# DIRECTORIO_PERFILES/control.json y cada proceso la revisa cada
+# INTERVALO_CONTROL_PERFILADO segundos, así que un solo POST /perfilado
+# llega a todos. Conviene borrar control.json al desplegar.
+#
+# Configuración inicial (variables de entorno):
+#   PERFILAR               1 para empezar encendido
+#   MUESTREO_PERFILADO     fracción de llamadas que se perfilan (0.01)
+#   SELECCION_PERFILADO    flujos, pasos o funciones separados por comas
+#   MODO_PERFILADO         pilas (por defecto) o pstats
+#   DIRECTORIO_PERFILES    carpeta de resultados y control compartido
+#   TOKEN_PERFILADO        token para /perfilado (vacío = sin endpoint)
+
+import cProfile
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+PERFILAR = os.environ.get("PERFILAR", "") == "1"
+MUESTREO_PERFILADO = float(os.environ.get("MUESTREO_PERFILADO", "0.01"))
+SELECCION_PERFILADO = os.environ.get("SELECCION_PERFILADO", "")
+MODO_PERFILADO = os.environ.get("MODO_PERFILADO", "pilas")
+INTERVALO_PERFILADO = float(os.environ.get("INTERVALO_PERFILADO", "0.005"))
+INTERVALO_CONTROL_PERFILADO = float(os.environ.get("INTERVALO_CONTROL_PERFILADO", "2"))
+DIRECTORIO_PERFILES = os.environ.get("DIRECTORIO_PERFILES", "")
+TOKEN_PERFILADO = os.environ.get("TOKEN_PERFILADO", "")
+
+MODOS = ("pilas", "pstats")
+
+
+class Perfilador:
+    def __init__(self, activo=PERFILAR, muestreo=MUESTREO_PERFILADO, seleccion=SELECCION_PERFILADO,
+                 modo=MODO_PERFILADO, directorio=DIRECTORIO_PERFILES, intervalo=INTERVALO_PERFILADO,
+                 intervalo_control=INTERVALO_CONTROL_PERFILADO):
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self.intervalo_control = intervalo_control
+        self.activo = False
+        self.muestreo = 0.0
+        self.seleccion = frozenset()
+        self.modo = MODOS[0]
+        self._volcado = 0
+        self._candado = threading.Lock()
+        self._aplicar(activo, muestreo, seleccion, modo)
+        # Después de aplicar la configuración inicial, para que la de
+        # control.json (si existe) quede por encima
+        self._reiniciar()
+        os.register_at_fork(after_in_child=self._reiniciar)
+
+    def _reiniciar(self):
+        # Cada proceso junta sus propios resultados (lo del padre no se hereda)
+        self._local = threading.local()
+        self._candado = threading.Lock()
+        self._hilos = {}            # ident -> (flujo, paso, marco de la llamada perfilada)
+        self._pilas = {}            # flujo -> Counter de pilas
+        self._estadisticas = {}     # flujo -> pstats.Stats
+        self._llamadas = Counter()  # flujo -> llamadas perfiladas
+        self._pid_muestreador = None
+        self._mtime_control = None
+        if self.directorio:
+            threading.Thread(target=self._vigilar_control, name="perfilado-control", daemon=True).start()
+
+    # =========================================
+    # Ganchos
+    # =========================================
+
+    def ejecutar(self, flujo, paso, funcion, *args, **kwargs):
+        # Llama funcion(*args, **kwargs), perfilándola si le toca
+        if not self.activo or not self._elegir(flujo, paso):
+            return funcion(*args, **kwargs)
+        self._local.dentro = True
+        try:
+            if self.modo == "pstats":
+                return self._con_cprofile(flujo, funcion, args, kwargs)
+            return self._con_muestreo(flujo, paso, funcion, args, kwargs)
+        finally:
+            self._local.dentro = False
+
+    def envolver(self, funcion, flujo="calculo"):
+        # Para funciones de cálculo: el paso es el nombre de la función.
+        # Dentro de un mensaje que ya se perfila no se vuelve a elegir.
+        nombre = funcion.__name__
+
+        def perfilada(*args, **kwargs):
+            if not self.activo:
+                return funcion(*args, **kwargs)
+            return self.ejecutar(flujo, nombre, funcion, *args, **kwargs)
+
+        perfilada.__name__ = nombre
+        perfilada.__wrapped__ = funcion
+        return perfilada
+
+    def _elegir(self, flujo, paso):
+        if getattr(self._local, "dentro", False):
+            return False
+        if self.seleccion and flujo not in self.seleccion and paso not in self.seleccion:
+            return False
+        return random.random() < self.muestreo
+
+    def _con_cprofile(self, flujo, funcion, args, kwargs):
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Ya hay otro perfilador activo (desde Python 3.12 solo puede
+            # haber uno por proceso): esta llamada no se perfila
+            return funcion(*args, **kwargs)
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            perfil.disable()
+            estadisticas = pstats.Stats(perfil)
+            with self._candado:
+                self._llamadas[flujo] += 1
+                if flujo in self._estadisticas:
+                    self._estadisticas[flujo].add(estadisticas)
+                else:
+                    self._estadisticas[flujo] = estadisticas
+
+    def _con_muestreo(self, flujo, paso, funcion, args, kwargs):
+        ident = threading.get_ident()
+        with self._candado:
+            self._hilos[ident] = (flujo, paso, sys._getframe())
+            self._llamadas[flujo] += 1
+            if self._pid_muestreador != os.getpid():
+                # El hilo se crea en el proceso que perfila (después del
+                # fork de gunicorn), igual que los de la cola
+                self._pid_muestreador = os.getpid()
+                threading.Thread(target=self._muestrear, name="perfilado", daemon=True).start()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            with self._candado:
+                del self._hilos[ident]
+
+    # =========================================
+    # Muestreo de pilas
+    # =========================================
+
+    def _muestrear(self):
+        while True:
+            time.sleep(self.intervalo)
+            if not self._hilos:
+                continue
+            try:
+                self._tomar_muestra()
+            except Exception:
+                traceback.print_exc()
+
+    def _tomar_muestra(self):
+        with self._candado:
+            hilos = list(self._hilos.items())
+        marcos = sys._current_frames()
+        muestras = []
+        for ident, (flujo, paso, raiz) in hilos:
+            marco = marcos.get(ident)
+            pila = []
+            # Solo la parte de la pila que está dentro de la llamada perfilada
+            while marco is not None and marco is not raiz:
+                codigo = marco.f_code
+                pila.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                marco = marco.f_back
+            if marco is None:
+                continue  # La llamada terminó mientras se tomaba la muestra
+            pila.extend((paso, flujo))
+            muestras.append((flujo, ";".join(reversed(pila))))
+        with self._candado:
+            for flujo, pila in muestras:
+                self._pilas.setdefault(flujo, Counter())[pila] += 1
+
+    # =========================================
+    # Configuración y resultados
+    # =========================================
+
+    def configurar(self, activo=None, muestreo=None, seleccion=None, modo=None, volcar=False):
+        # Cambia la configuración de este proceso y, si hay directorio,
+        # la de los demás workers. Regresa los archivos que se escribieron
+        # aquí si se pidió volcar.
+        activo = self.activo if activo is None else activo
+        muestreo = self.muestreo if muestreo is None else muestreo
+        seleccion = self.seleccion if seleccion is None else seleccion
+        modo = self.modo if modo is None else modo
+        self._aplicar(activo, muestreo, seleccion, modo)
+        if self.directorio:
+            self._escribir_control(volcar)
+        return self.volcar() if volcar else []
+
+    def _aplicar(self, activo, muestreo, seleccion, modo):
+        if not isinstance(activo, bool):
+            raise ValueError("\"activo\" debe ser true o false")
+        if isinstance(muestreo, bool) or not isinstance(muestreo, (int, float)) or not 0 < muestreo <= 1:
+            raise ValueError("\"muestreo\" debe ser un número mayor que 0 y hasta 1")
+        if modo not in MODOS:
+            raise ValueError(f"Modo de perfilado desconocido: {modo} (usa {' o '.join(MODOS)})")
+        if isinstance(seleccion, str):
+            seleccion = [nombre.strip() for nombre in seleccion.split(",")]
+        if not all(isinstance(nombre, str) for nombre in seleccion):
+            raise ValueError("\"seleccion\" debe ser una lista de flujos, pasos o funciones")
+
+        encender = activo and not self.activo
+        self.activo = False if encender else self.activo
+        self.muestreo = float(muestreo)
+        self.seleccion = frozenset(nombre for nombre in seleccion if nombre)
+        self.modo = modo
+        if encender:
+            # Cada vez que se enciende se empieza a juntar desde cero
+            with self._candado:
+                self._pilas = {}
+                self._estadisticas = {}
+                self._llamadas = Counter()
+        self.activo = activo
+
+    def volcar(self, directorio=None):
+        # Escribe lo juntado hasta ahora por este proceso; regresa las rutas
+        directorio = directorio or self.directorio or "perfiles"
+        os.makedirs(directorio, exist_ok=True)
+        with self._candado:
+            pilas = {flujo: dict(conteo) for flujo, conteo in self._pilas.items()}
+            estadisticas = dict(self._estadisticas)
+        archivos = []
+        for flujo, conteo in sorted(pilas.items()):
+            ruta = os.path.join(directorio, f"{flujo}.{os.getpid()}.txt")
+            with open(ruta, "w", encoding="utf-8") as archivo:
+                for pila, muestras in sorted(conteo.items()):
+                    archivo.write(f"{pila} {muestras}\n")
+            archivos.append(ruta)
+        for flujo, datos in sorted(estadisticas.items()):
+            ruta = os.path.join(directorio, f"{flujo}.{os.getpid()}.prof")
+            with self._candado:
+                datos.dump_stats(ruta)
+            archivos.append(ruta)
+        return archivos
+
+    def estado(self):
+        # Configuración y llamadas perfiladas por flujo de este proceso
+        with self._candado:
+            llamadas = dict(self._llamadas)
+            muestras = {flujo: sum(conteo.values()) for flujo, conteo in self._pilas.items()}
+        return {
+            "activo": self.activo,
+            "muestreo": self.muestreo,
+            "seleccion": sorted(self.seleccion),
+            "modo": self.modo,
+            "pid": os.getpid(),
+            "llamadas": llamadas,
+            "muestras": muestras,
+        }
+
+    # =========================================
+    # Control compartido entre workers
+    # =========================================
+
+    def _ruta_control(self):
+        return os.path.join(self.directorio, "control.json")
+
+    def _leer_control(self):
+        try:
+            with open(self._ruta_control(), encoding="utf-8") as archivo:
+                return json.load(archivo)
+        except (OSError, ValueError):
+            return None
+
+    def _escribir_control(self, volcar):
+        anterior = self._leer_control() or {}
+        volcado = anterior.get("volcado", 0) + (1 if volcar else 0)
+        if volcar:
+            self._volcado = volcado  # Este proceso vuelca en configurar()
+        control = {
+            "activo": self.activo,
+            "muestreo": self.muestreo,
+            "seleccion": sorted(self.seleccion),
+            "modo": self.modo,
+            "volcado": volcado,
+        }
+        os.makedirs(self.directorio, exist_ok=True)
+        temporal = f"{self._ruta_control()}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            json.dump(control, archivo)
+        os.replace(temporal, self._ruta_control())
+
+    def _vigilar_control(self):
+        primera = True
+        while True:
+            try:
+                self._revisar_control(primera)
+            except Exception:
+                traceback.print_exc()
+            primera = False
+            time.sleep(self.intervalo_control)
+
+    def _revisar_control(self, primera):
+        try:
+            mtime = os.stat(self._ruta_control()).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime_control:
+            return
+        self._mtime_control = mtime
+        control = self._leer_control()
+        if control is None:
+            return
+        self._aplicar(control["activo"], control["muestreo"], control["seleccion"], control["modo"])
+        volcado = control.get("volcado", 0)
+        # Un worker que arranca no vuelca lo que se pidió antes de existir
+        if volcado > self._volcado and not primera:
+            self.volcar()
+        self._volcado = max(self._volcado, volcado)
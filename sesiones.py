@@ -0,0 +1,543 @@
+# =========================================
+# Almacén de sesiones de conversación
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Guarda en qué paso va cada número de teléfono para que
+# varios workers de gunicorn (o varios servidores) compartan el estado
+# =========================================
+#
+# Todos los almacenes tienen la misma interfaz:
+#   obtener(numero)            -> dict con el contexto o None
+#   guardar(numero, contexto)  -> guarda y renueva la expiración
+#   borrar(numero)
+#   contar()                   -> sesiones activas
+#   limpiar_expiradas()
+#
+# Se elige con la variable ALMACEN_SESIONES:
+#   memoria                     (por defecto, un solo proceso)
+#   sqlite:///sesiones.db       (varios workers en la misma máquina;
+#                                sqlite:////ruta/absoluta.db)
+#   redis://host:6379/0         (varios servidores)
+
+import json
+import os
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from urllib.parse import urlparse
+
+TTL_SESION_SEGUNDOS = int(os.environ.get("TTL_SESION_SEGUNDOS", "3600"))
+
+# =========================================
+# Serialización del contexto (con Decimal)
+# =========================================
+
+def _a_json(valor):
+    if isinstance(valor, Decimal):
+        return {"__decimal__": str(valor)}
+    raise TypeError(f"No se puede guardar {type(valor).__name__} en la sesión")
+
+
+def _de_json(objeto):
+    if "__decimal__" in objeto and len(objeto) == 1:
+        return Decimal(objeto["__decimal__"])
+    return objeto
+
+
+def serializar_contexto(contexto):
+    return json.dumps(contexto, default=_a_json, ensure_ascii=False, separators=(",", ":"))
+
+
+def deserializar_contexto(texto):
+    return json.loads(texto, object_hook=_de_json)
+
+# =========================================
+# Rueda de tiempos jerárquica (expiración en O(1))
+# =========================================
+#
+# El tiempo avanza en ticks de "resolucion" segundos. El nivel 0 tiene
+# una ranura por tick; cada ranura del nivel k cubre ranuras^k ticks.
+# Un elemento va en el nivel más bajo cuyo bloque actual contiene su
+# tick de expiración; cuando el nivel 0 da la vuelta, la ranura que toca
+# del nivel 1 se reparte en el nivel 0, y así hacia arriba. Agregar y
+# quitar son O(1) y avanzar cuesta O(1) por tick más lo que vence.
+#
+# Los elementos deben tener los atributos "expira" (en segundos) y
+# "ranura" (la rueda la usa para poder quitarlos).
+
+class RuedaTiempos:
+    def __init__(self, ahora, resolucion=1.0, ranuras=64, niveles=4):
+        self.resolucion = resolucion
+        self.ranuras = ranuras
+        self.niveles = niveles
+        self._tick = int(ahora // resolucion)
+        self._ruedas = [[set() for _ in range(ranuras)] for _ in range(niveles)]
+        self._lejanos = set()  # Más allá de lo que cubre el último nivel
+        self._cantidad = 0
+
+    def __len__(self):
+        return self._cantidad
+
+    def agregar(self, elemento):
+        # -(-a // b) redondea hacia arriba: nunca vence antes de tiempo
+        tick = max(int(-(-elemento.expira // self.resolucion)), self._tick + 1)
+        self._colocar(elemento, tick)
+        self._cantidad += 1
+
+    def quitar(self, elemento):
+        if elemento.ranura is not None:
+            elemento.ranura.discard(elemento)
+            elemento.ranura = None
+            self._cantidad -= 1
+
+    def _colocar(self, elemento, tick):
+        bloque = 1
+        for nivel in range(self.niveles):
+            if tick // (bloque * self.ranuras) == self._tick // (bloque * self.ranuras):
+                ranura = self._ruedas[nivel][(tick // bloque) % self.ranuras]
+                break
+            bloque *= self.ranuras
+        else:
+            ranura = self._lejanos
+        ranura.add(elemento)
+        elemento.ranura = ranura
+
+    def avanzar(self, ahora):
+        # Regresa la lista de elementos vencidos hasta "ahora"
+        objetivo = int(ahora // self.resolucion)
+        if not self._cantidad:
+            self._tick = max(self._tick, objetivo)
+            return []
+        vencidos = []
+        while self._tick < objetivo and self._cantidad > len(vencidos):
+            self._tick += 1
+            self._repartir()
+            ranura = self._ruedas[0][self._tick % self.ranuras]
+            for elemento in ranura:
+                elemento.ranura = None
+            vencidos.extend(ranura)
+            ranura.clear()
+        self._tick = max(self._tick, objetivo)
+        self._cantidad -= len(vencidos)
+        return vencidos
+
+    def _repartir(self):
+        # Al cruzar el borde de un bloque, la ranura que empieza en este
+        # tick baja a los niveles inferiores (de arriba hacia abajo)
+        bloque = self.ranuras
+        niveles = 0
+        while niveles < self.niveles - 1 and self._tick % bloque == 0:
+            niveles += 1
+            bloque *= self.ranuras
+        if niveles == self.niveles - 1 and self._tick % bloque == 0:
+            pendientes = [self._lejanos]
+        else:
+            pendientes = []
+        bloque = self.ranuras ** niveles
+        for nivel in range(niveles, 0, -1):
+            pendientes.append(self._ruedas[nivel][(self._tick // bloque) % self.ranuras])
+            bloque //= self.ranuras
+        for ranura in pendientes:
+            elementos = list(ranura)
+            ranura.clear()
+            for elemento in elementos:
+                self._colocar(elemento, max(int(-(-elemento.expira // self.resolucion)), self._tick))
+
+# =========================================
+# Almacén en memoria (un solo proceso)
+# =========================================
+#
+# Cada sesión es un RegistroSesion de tamaño fijo: el paso pendiente va
+# como un entero chico y el resto del contexto como una tupla de
+# valores, con la tupla de nombres (la "forma") compartida entre todas
+# las sesiones que van en el mismo punto del flujo. Las sesiones
+# inactivas vencen con la rueda de tiempos y, si se llega a
+# MAX_SESIONES, se desaloja la usada hace más tiempo.
+
+MAX_SESIONES = int(os.environ.get("MAX_SESIONES", "100000"))
+
+
+class RegistroSesion:
+    __slots__ = ("numero", "estado", "forma", "valores", "expira", "ranura")
+
+    def __init__(self, numero):
+        self.numero = numero
+        self.estado = 0
+        self.forma = ()
+        self.valores = ()
+        self.expira = 0.0
+        self.ranura = None
+
+
+class AlmacenMemoria:
+    def __init__(self, ttl=TTL_SESION_SEGUNDOS, maximo=MAX_SESIONES):
+        self.ttl = ttl
+        self.maximo = maximo
+        self._sesiones = OrderedDict()  # numero -> RegistroSesion, de la menos a la más reciente
+        self._rueda = RuedaTiempos(time.monotonic())
+        self._candado = threading.Lock()
+        # Código 0 = sin paso pendiente
+        self._codigos = {None: 0}
+        self._nombres = [None]
+        self._formas = {}
+
+        self.creadas = 0
+        self.completadas = 0
+        self.expiradas = 0
+        self.desalojadas = 0
+
+    def obtener(self, numero):
+        ahora = time.monotonic()
+        with self._candado:
+            self._limpiar(ahora)
+            registro = self._sesiones.get(numero)
+            if registro is None:
+                return None
+            self._sesiones.move_to_end(numero)
+            contexto = dict(zip(registro.forma, registro.valores))
+            if registro.estado:
+                contexto["esperando"] = self._nombres[registro.estado]
+            return contexto
+
+    def guardar(self, numero, contexto):
+        ahora = time.monotonic()
+        contexto = dict(contexto)
+        esperando = contexto.pop("esperando", None)
+        with self._candado:
+            self._limpiar(ahora)
+            registro = self._sesiones.get(numero)
+            if registro is None:
+                registro = self._sesiones[numero] = RegistroSesion(numero)
+                self.creadas += 1
+                while len(self._sesiones) > self.maximo:
+                    _, desalojado = self._sesiones.popitem(last=False)
+                    self._rueda.quitar(desalojado)
+                    self.desalojadas += 1
+            else:
+                self._sesiones.move_to_end(numero)
+                self._rueda.quitar(registro)
+            registro.estado = self._codigo(esperando)
+            registro.forma = self._forma(tuple(contexto))
+            registro.valores = tuple(contexto.values())
+            registro.expira = ahora + self.ttl
+            self._rueda.agregar(registro)
+
+    def _codigo(self, esperando):
+        codigo = self._codigos.get(esperando)
+        if codigo is None:
+            codigo = self._codigos[esperando] = len(self._nombres)
+            self._nombres.append(esperando)
+        return codigo
+
+    def _forma(self, nombres):
+        return self._formas.setdefault(nombres, nombres)
+
+    def borrar(self, numero):
+        # Se usa al terminar un flujo: cuenta como sesión completada
+        with self._candado:
+            registro = self._sesiones.pop(numero, None)
+            if registro is not None:
+                self._rueda.quitar(registro)
+                self.completadas += 1
+
+    def contar(self):
+        with self._candado:
+            self._limpiar(time.monotonic())
+            return len(self._sesiones)
+
+    def limpiar_expiradas(self):
+        with self._candado:
+            return self._limpiar(time.monotonic())
+
+    def _limpiar(self, ahora):
+        # Con el candado tomado
+        vencidas = self._rueda.avanzar(ahora)
+        for registro in vencidas:
+            del self._sesiones[registro.numero]
+        self.expiradas += len(vencidas)
+        return len(vencidas)
+
+    def estadisticas(self):
+        with self._candado:
+            return {
+                "activas": len(self._sesiones),
+                "creadas": self.creadas,
+                "completadas": self.completadas,
+                "expiradas": self.expiradas,
+                "desalojadas": self.desalojadas,
+            }
+
+# =========================================
+# Almacén en SQLite (varios workers en la misma máquina)
+# =========================================
+
+_conexiones_heredadas = []
+
+
+def conexion_sqlite(local, ruta):
+    # sqlite3 no comparte conexiones entre hilos: una por hilo, guardada
+    # en el threading.local de quien la usa. Tampoco entre procesos: con
+    # gunicorn --preload el hilo principal de cada worker hereda la que
+    # abrió el padre al importar, y se abre otra. La heredada no se
+    # cierra (cerrarla en el hijo puede soltar candados del archivo).
+    conexion = getattr(local, "conexion", None)
+    if conexion is not None and local.pid != os.getpid():
+        _conexiones_heredadas.append(conexion)
+        conexion = None
+    if conexion is None:
+        conexion = sqlite3.connect(ruta, timeout=5, isolation_level=None)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute("PRAGMA synchronous=NORMAL")
+        local.conexion = conexion
+        local.pid = os.getpid()
+    return conexion
+
+
+class AlmacenSQLite:
+    def __init__(self, ruta, ttl=TTL_SESION_SEGUNDOS):
+        self.ruta = ruta
+        self.ttl = ttl
+        self._local = threading.local()
+        conexion = self._conexion()
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS sesiones ("
+            "numero TEXT PRIMARY KEY, contexto TEXT NOT NULL, expira REAL NOT NULL)"
+        )
+        conexion.execute("CREATE INDEX IF NOT EXISTS sesiones_expira ON sesiones (expira)")
+
+    def _conexion(self):
+        return conexion_sqlite(self._local, self.ruta)
+
+    def obtener(self, numero):
+        fila = self._conexion().execute(
+            "SELECT contexto FROM sesiones WHERE numero = ? AND expira > ?",
+            (numero, time.time())
+        ).fetchone()
+        if fila is None:
+            return None
+        return deserializar_contexto(fila[0])
+
+    def guardar(self, numero, contexto):
+        self._conexion().execute(
+            "INSERT OR REPLACE INTO sesiones (numero, contexto, expira) VALUES (?, ?, ?)",
+            (numero, serializar_contexto(contexto), time.time() + self.ttl)
+        )
+
+    def borrar(self, numero):
+        self._conexion().execute("DELETE FROM sesiones WHERE numero = ?", (numero,))
+
+    def contar(self):
+        return self._conexion().execute(
+            "SELECT COUNT(*) FROM sesiones WHERE expira > ?", (time.time(),)
+        ).fetchone()[0]
+
+    def limpiar_expiradas(self):
+        cursor = self._conexion().execute("DELETE FROM sesiones WHERE expira <= ?", (time.time(),))
+        return cursor.rowcount
+
+# =========================================
+# Almacén con protocolo de Redis (RESP)
+# =========================================
+#
+# Cliente mínimo de RESP sobre un socket por hilo. Solo usa GET, SET con
+# EX, DEL y SCAN, así que funciona contra Redis, Valkey, KeyDB o el
+# servidor local de pruebas que está más abajo. La expiración la hace
+# el propio servidor.
+
+class ErrorRedis(Exception):
+    pass
+
+
+class ClienteResp:
+    def __init__(self, host="localhost", puerto=6379, base=0, timeout=5):
+        self.host = host
+        self.puerto = puerto
+        self.base = base
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            sock = socket.create_connection((self.host, self.puerto), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conexion = (sock, sock.makefile("rb"))
+            self._local.conexion = conexion
+            if self.base:
+                self._enviar(conexion, ("SELECT", self.base))
+        return conexion
+
+    def _cerrar(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is not None:
+            conexion[1].close()
+            conexion[0].close()
+            self._local.conexion = None
+
+    def _enviar(self, conexion, argumentos):
+        partes = [b"*%d\r\n" % len(argumentos)]
+        for argumento in argumentos:
+            if not isinstance(argumento, bytes):
+                argumento = str(argumento).encode("utf-8")
+            partes.append(b"$%d\r\n%s\r\n" % (len(argumento), argumento))
+        conexion[0].sendall(b"".join(partes))
+        return _leer_respuesta(conexion[1])
+
+    def comando(self, *argumentos):
+        try:
+            return self._enviar(self._conexion(), argumentos)
+        except (OSError, EOFError):
+            # Conexión rota (reinicio del servidor, timeout): un reintento
+            self._cerrar()
+            return self._enviar(self._conexion(), argumentos)
+
+
+def _leer_respuesta(archivo):
+    linea = archivo.readline()
+    if not linea:
+        raise EOFError("El servidor cerró la conexión")
+    tipo, contenido = linea[:1], linea[1:-2]
+    if tipo == b"+":
+        return contenido.decode("utf-8")
+    if tipo == b"-":
+        raise ErrorRedis(contenido.decode("utf-8"))
+    if tipo == b":":
+        return int(contenido)
+    if tipo == b"$":
+        largo = int(contenido)
+        if largo < 0:
+            return None
+        datos = archivo.read(largo + 2)
+        return datos[:-2]
+    if tipo == b"*":
+        cantidad = int(contenido)
+        if cantidad < 0:
+            return None
+        return [_leer_respuesta(archivo) for _ in range(cantidad)]
+    raise ErrorRedis(f"Respuesta RESP inesperada: {linea!r}")
+
+
+class AlmacenRedis:
+    def __init__(self, cliente, ttl=TTL_SESION_SEGUNDOS, prefijo="sesion:"):
+        self.cliente = cliente
+        self.ttl = ttl
+        self.prefijo = prefijo
+
+    def obtener(self, numero):
+        datos = self.cliente.comando("GET", self.prefijo + numero)
+        if datos is None:
+            return None
+        return deserializar_contexto(datos.decode("utf-8"))
+
+    def guardar(self, numero, contexto):
+        self.cliente.comando("SET", self.prefijo + numero, serializar_contexto(contexto), "EX", self.ttl)
+
+    def borrar(self, numero):
+        self.cliente.comando("DEL", self.prefijo + numero)
+
+    def contar(self):
+        total = 0
+        cursor = "0"
+        while True:
+            cursor, llaves = self.cliente.comando("SCAN", cursor, "MATCH", self.prefijo + "*", "COUNT", 1000)
+            cursor = cursor.decode("utf-8")
+            total += len(llaves)
+            if cursor == "0":
+                return total
+
+    def limpiar_expiradas(self):
+        # Redis expira las llaves por su cuenta
+        return 0
+
+# =========================================
+# Servidor RESP local (para pruebas y corridas de carga)
+# =========================================
+#
+# Implementa lo que usan AlmacenRedis y el índice de mensajes
+# (GET, SET ... EX/NX, DEL, SCAN, SELECT, PING) en memoria. No es para
+# producción.
+
+class ServidorRespLocal(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, direccion=("127.0.0.1", 0)):
+        super().__init__(direccion, _ManejadorResp)
+        self.datos = {}
+        self.candado = threading.Lock()
+
+    def iniciar(self):
+        hilo = threading.Thread(target=self.serve_forever, daemon=True)
+        hilo.start()
+        return self.server_address
+
+    def ejecutar(self, argumentos):
+        comando = argumentos[0].upper()
+        ahora = time.monotonic()
+        with self.candado:
+            if comando == b"PING":
+                return b"+PONG\r\n"
+            if comando == b"SELECT":
+                return b"+OK\r\n"
+            if comando == b"GET":
+                registro = self.datos.get(argumentos[1])
+                if registro is None or (registro[1] is not None and registro[1] <= ahora):
+                    self.datos.pop(argumentos[1], None)
+                    return b"$-1\r\n"
+                return b"$%d\r\n%s\r\n" % (len(registro[0]), registro[0])
+            if comando == b"SET":
+                opciones = [argumento.upper() for argumento in argumentos[3:]]
+                expira = None
+                if b"EX" in opciones:
+                    expira = ahora + int(opciones[opciones.index(b"EX") + 1])
+                if b"NX" in opciones:
+                    registro = self.datos.get(argumentos[1])
+                    if registro is not None and (registro[1] is None or registro[1] > ahora):
+                        return b"$-1\r\n"
+                self.datos[argumentos[1]] = (argumentos[2], expira)
+                return b"+OK\r\n"
+            if comando == b"DEL":
+                borradas = sum(self.datos.pop(llave, None) is not None for llave in argumentos[1:])
+                return b":%d\r\n" % borradas
+            if comando == b"SCAN":
+                prefijo = b""
+                if b"MATCH" in argumentos:
+                    prefijo = argumentos[argumentos.index(b"MATCH") + 1].rstrip(b"*")
+                llaves = [
+                    llave for llave, (_, expira) in self.datos.items()
+                    if llave.startswith(prefijo) and (expira is None or expira > ahora)
+                ]
+                respuesta = [b"*2\r\n$1\r\n0\r\n*%d\r\n" % len(llaves)]
+                respuesta += [b"$%d\r\n%s\r\n" % (len(llave), llave) for llave in llaves]
+                return b"".join(respuesta)
+        return b"-ERR comando no soportado\r\n"
+
+
+class _ManejadorResp(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                argumentos = _leer_respuesta(self.rfile)
+            except (EOFError, ErrorRedis, ValueError):
+                return
+            self.wfile.write(self.server.ejecutar(argumentos))
+
+# =========================================
+# Selección del almacén
+# =========================================
+
+def crear_almacen_sesiones(url=None, ttl=TTL_SESION_SEGUNDOS):
+    url = url or os.environ.get("ALMACEN_SESIONES", "memoria")
+    if url == "memoria":
+        return AlmacenMemoria(ttl)
+    destino = urlparse(url)
+    if destino.scheme == "sqlite":
+        return AlmacenSQLite(destino.path[1:] or ":memory:", ttl)
+    if destino.scheme == "redis":
+        base = int(destino.path.strip("/") or 0)
+        cliente = ClienteResp(destino.hostname or "localhost", destino.port or 6379, base)
+        return AlmacenRedis(cliente, ttl)
+    raise ValueError(f"Almacén de sesiones desconocido: {url}")
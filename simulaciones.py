@@ -0,0 +1,233 @@
+# =========================================
+# Simulaciones en lote para la API
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Corre miles de escenarios de distintos tipos con los
+# mismos cálculos que usa el bot y genera una línea NDJSON por escenario,
+# en el orden recibido
+# =========================================
+#
+# Cada escenario es un diccionario con "tipo" y sus datos ("id" es
+# opcional y se regresa tal cual):
+#   pago_fijo       monto, tasa, plazo
+#   ahorro_abonos   monto, tasa, plazo, abono, desde (1 por defecto)
+#   credito_tienda  precio, pago, plazo, frecuencia (mensual por defecto)
+#   capacidad       ingreso, pagos_fijos, deuda_revolvente, riesgo (1 a 3)
+#                   y, opcionales, tasa y plazo para el monto máximo, o
+#                   monto, tasa y plazo para revisar si se puede pagar
+# Las tasas son por periodo, como en el resto del bot.
+#
+# Respuesta por escenario:
+#   {"indice": 1, "tipo": "pago_fijo", "resultado": {"pago": 4231.94}}
+#   {"indice": 2, "tipo": "pago_fijo", "error": "...", "motivo": "..."}
+# Un escenario con datos inválidos solo produce su línea de error. Con
+# entrada NDJSON cada línea se lee en el proceso que la calcula, así que
+# una línea que no es JSON también es solo un error más.
+#
+# Los escenarios se reparten en bloques de BLOQUE_SIMULACIONES. Si hay
+# más de un bloque y más de un proceso, los bloques van al grupo de
+# procesos de tasa_variable con a lo más SIMULACIONES_EN_VUELO bloques
+# pendientes, y se regresan en orden: la memoria no crece con el tamaño
+# del lote.
+
+import json
+import os
+from collections import deque
+from decimal import Decimal
+from itertools import chain, islice
+
+from calculos import (
+    calcular_pago_fijo_excel,
+    calcular_monto_maximo,
+    detalle_ahorro_por_abonos,
+    calcular_costo_credito_tienda
+)
+from capacidad import PORCENTAJE_POR_RIESGO, calcular_capacidad_mensual, plazos_minimos, tasas_maximas
+from ofertas import validar_frecuencia
+from tasa_variable import PROCESOS_SIMULACION, grupo_procesos
+from validacion import ErrorValidacion, validar_monto
+
+MAX_SIMULACIONES = int(os.environ.get("MAX_SIMULACIONES", "10000"))
+BLOQUE_SIMULACIONES = int(os.environ.get("BLOQUE_SIMULACIONES", "256"))
+SIMULACIONES_EN_VUELO = int(os.environ.get("SIMULACIONES_EN_VUELO", str(2 * PROCESOS_SIMULACION)))
+
+# =========================================
+# Cada tipo de escenario
+# =========================================
+
+def simular_pago_fijo(escenario):
+    return {"pago": calcular_pago_fijo_excel(escenario.get("monto"), escenario.get("tasa"), escenario.get("plazo"))}
+
+
+def simular_ahorro_abonos(escenario):
+    return detalle_ahorro_por_abonos(
+        escenario.get("monto"),
+        escenario.get("tasa"),
+        escenario.get("plazo"),
+        escenario.get("abono", 0),
+        escenario.get("desde", 1)
+    )
+
+
+def simular_credito_tienda(escenario):
+    periodos_por_ano = validar_frecuencia(escenario.get("frecuencia", "mensual"))
+    total, intereses, tasa_periodo, tasa_anual = calcular_costo_credito_tienda(
+        escenario.get("precio"), escenario.get("pago"), escenario.get("plazo"), periodos_por_ano
+    )
+    return {"total_pagado": total, "intereses": intereses, "tasa_periodo": tasa_periodo, "tasa_anual": tasa_anual}
+
+
+def simular_capacidad(escenario):
+    # Lo mismo que la opción "¿Cuánto me pueden prestar?" del bot
+    riesgo = str(escenario.get("riesgo"))
+    if riesgo not in PORCENTAJE_POR_RIESGO:
+        raise ErrorValidacion("riesgo", "El riesgo debe ser 1 (bajo), 2 (medio) o 3 (alto).")
+    capacidad = calcular_capacidad_mensual(
+        validar_monto(escenario.get("ingreso"), "El ingreso"),
+        validar_monto(escenario.get("pagos_fijos", 0), "Los pagos fijos", permitir_cero=True),
+        validar_monto(escenario.get("deuda_revolvente", 0), "La deuda revolvente", permitir_cero=True),
+        riesgo
+    )
+    resultado = {"capacidad_mensual": capacidad}
+    if "tasa" not in escenario or "plazo" not in escenario:
+        return resultado
+
+    tasa, plazo = escenario["tasa"], escenario["plazo"]
+    if "monto" not in escenario:
+        resultado["monto_maximo"] = calcular_monto_maximo(max(capacidad, Decimal("0")), tasa, plazo)
+        return resultado
+
+    monto = escenario["monto"]
+    pago = calcular_pago_fijo_excel(monto, tasa, plazo)
+    resultado["pago"] = pago
+    resultado["se_puede_pagar"] = pago <= capacidad
+    if pago > capacidad and capacidad > 0:
+        # 0 = ni con el plazo más largo / ni sin intereses alcanza
+        resultado["plazo_minimo"] = int(plazos_minimos(capacidad, monto, [tasa])[0])
+        resultado["tasa_maxima"] = float(tasas_maximas(capacidad, monto, [plazo])[0])
+    return resultado
+
+
+TIPOS = {
+    "pago_fijo": simular_pago_fijo,
+    "ahorro_abonos": simular_ahorro_abonos,
+    "credito_tienda": simular_credito_tienda,
+    "capacidad": simular_capacidad,
+}
+
+# =========================================
+# Escenarios a líneas NDJSON
+# =========================================
+
+def _a_json(valor):
+    # Como json.dumps, pero los Decimal van como números sin pasar por float
+    if isinstance(valor, dict):
+        return "{" + ",".join(f"{_a_json(str(clave))}:{_a_json(v)}" for clave, v in valor.items()) + "}"
+    if isinstance(valor, (list, tuple)):
+        return "[" + ",".join(_a_json(v) for v in valor) + "]"
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, str):
+        return json.dumps(valor, ensure_ascii=False)
+    return json.dumps(valor)
+
+
+def simular_escenario(indice, escenario):
+    # Regresa la línea NDJSON del escenario (resultado o error);
+    # escenario puede venir como texto de una línea NDJSON
+    if isinstance(escenario, (str, bytes)):
+        try:
+            escenario = json.loads(escenario)
+        except ValueError:
+            linea = {"indice": indice, "error": "La línea no es JSON válido.", "motivo": "formato"}
+            return _a_json(linea) + "\n"
+    if not isinstance(escenario, dict):
+        linea = {"indice": indice, "error": "Cada escenario debe ser un objeto con \"tipo\".", "motivo": "formato"}
+        return _a_json(linea) + "\n"
+    tipo = escenario.get("tipo")
+    linea = {"indice": indice}
+    if "id" in escenario:
+        linea["id"] = escenario["id"]
+    linea["tipo"] = tipo
+    simular = TIPOS.get(tipo) if isinstance(tipo, str) else None
+    try:
+        if simular is None:
+            raise ErrorValidacion("tipo", f"Tipo de escenario desconocido: {tipo} (usa {', '.join(TIPOS)})")
+        linea["resultado"] = simular(escenario)
+    except ErrorValidacion as e:
+        linea["error"] = e.mensaje
+        linea["motivo"] = e.motivo
+    except (TypeError, ValueError, ArithmeticError):
+        linea["error"] = "Datos con formato inválido."
+        linea["motivo"] = "formato"
+    return _a_json(linea) + "\n"
+
+
+def simular_bloque(inicio, escenarios):
+    # Un bloque ya convertido a texto, para que del proceso hijo regrese
+    # una sola cadena
+    return "".join(simular_escenario(inicio + i, escenario) for i, escenario in enumerate(escenarios))
+
+
+def _bloques(escenarios, limite):
+    # (índice del primero, [escenarios]) sin leer más de un bloque a la
+    # vez; si pasan del límite, al final (limite + 1, None)
+    escenarios = islice(escenarios, limite + 1)
+    inicio = 1
+    while True:
+        bloque = list(islice(escenarios, BLOQUE_SIMULACIONES))
+        if not bloque:
+            return
+        if inicio + len(bloque) - 1 > limite:
+            bloque = bloque[:limite - inicio + 1]
+            if bloque:
+                yield inicio, bloque
+            yield limite + 1, None
+            return
+        yield inicio, bloque
+        inicio += len(bloque)
+
+
+def _linea_limite(indice, limite):
+    return _a_json({
+        "indice": indice,
+        "error": f"Se pueden simular hasta {limite} escenarios por petición; los demás no se leyeron.",
+        "motivo": "demasiados_escenarios",
+    }) + "\n"
+
+
+def simular_lote(escenarios, paralelo=None, limite=MAX_SIMULACIONES):
+    # Genera el texto NDJSON por bloques y en el orden de entrada;
+    # escenarios puede ser una lista o un generador (líneas NDJSON).
+    # paralelo=None usa procesos si hay más de un bloque.
+    bloques = _bloques(escenarios, limite)
+    adelantados = list(islice(bloques, 2))
+    if paralelo is None:
+        paralelo = len(adelantados) > 1 and PROCESOS_SIMULACION > 1
+    bloques = chain(adelantados, bloques)
+
+    if not paralelo:
+        for inicio, bloque in bloques:
+            yield simular_bloque(inicio, bloque) if bloque is not None else _linea_limite(inicio, limite)
+        return
+
+    procesos = grupo_procesos()
+    en_vuelo = deque()
+    try:
+        for inicio, bloque in bloques:
+            if bloque is None:
+                en_vuelo.append(_linea_limite(inicio, limite))
+            else:
+                en_vuelo.append(procesos.submit(simular_bloque, inicio, bloque))
+            if len(en_vuelo) >= SIMULACIONES_EN_VUELO:
+                yield _texto(en_vuelo.popleft())
+        while en_vuelo:
+            yield _texto(en_vuelo.popleft())
+    finally:
+        # Si el cliente se desconecta no se calcula lo que falta
+        for pendiente in en_vuelo:
+            if not isinstance(pendiente, str):
+                pendiente.cancel()
+
+
+def _texto(pendiente):
+    return pendiente if isinstance(pendiente, str) else pendiente.result()
@@ -0,0 +1,187 @@
+# =========================================
+# Simulación de créditos con tasa variable
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Simula miles de trayectorias posibles de la tasa (Monte
+# Carlo) y reporta percentiles del pago más alto y de los intereses
+# totales, para ver qué tan caro puede salir un crédito a tasa variable
+# =========================================
+#
+# Cada periodo la tasa se mueve y, cuando cambia, el pago se recalcula
+# con el saldo del plan original y los pagos que faltan (como en los
+# créditos a tasa variable reales). Los abonos extra se aplican igual
+# que en calcular_ahorro_por_abonos: van a capital desde el periodo
+# "desde", no cambian el pago y acortan el plazo; el último pago es el
+# saldo que queda más sus intereses. Con la tasa fija el resultado es el
+# de calcular_ahorro_por_abonos (en float).
+# Modelos de la tasa, por periodo:
+#   reversion  r += reversion * (media - r) + volatilidad * N(0, 1)
+#   choques    lo mismo, más un alza de "choque" con probabilidad
+#              prob_choque (subidas bruscas como las de 2022)
+#
+# Todas las trayectorias avanzan juntas con NumPy. Se reparten en
+# bloques de CAMINOS_POR_BLOQUE, cada uno con su propia semilla derivada
+# de la semilla principal, así que el resultado es el mismo con o sin
+# procesos. Las corridas grandes se reparten en un grupo de procesos.
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+from validacion import (
+    ErrorValidacion,
+    TASA_MAXIMA,
+    TASA_MINIMA,
+    validar_monto,
+    validar_tasa,
+    validar_plazo,
+    validar_periodo
+)
+
+MODELOS = ("reversion", "choques")
+PERCENTILES = (5, 50, 95)
+
+CAMINOS_POR_DEFECTO = 10000
+CAMINOS_POR_BLOQUE = 5000
+MAX_CAMINOS = int(os.environ.get("MAX_CAMINOS", "100000"))
+# Desde cuántos caminos conviene pagar el costo de repartir en procesos
+UMBRAL_PARALELO = int(os.environ.get("UMBRAL_PARALELO", "20000"))
+PROCESOS_SIMULACION = int(os.environ.get("PROCESOS_SIMULACION", str(os.cpu_count() or 1)))
+
+# =========================================
+# Simulación de un bloque de trayectorias
+# =========================================
+
+def _simular_bloque(P, r0, n, abono, desde, modelo, media, reversion, volatilidad, choque, prob_choque,
+                    caminos, semilla):
+    # Regresa (pago más alto, intereses totales) de cada trayectoria.
+    # saldo_plan es el saldo sin abonos: de él sale el pago al cambiar
+    # la tasa, como pago_fijo en calcular_ahorro_por_abonos.
+    rng = np.random.default_rng(semilla)
+    saldo = np.full(caminos, P)
+    saldo_plan = np.full(caminos, P)
+    r = np.full(caminos, r0)
+    pago = np.full(caminos, round(P * r0 / -np.expm1(-n * np.log1p(r0)), 2))
+    pago_maximo = np.zeros(caminos)
+    intereses = np.zeros(caminos)
+    tasa_minima = float(TASA_MINIMA)
+    tasa_maxima = float(TASA_MAXIMA)
+
+    # Un periodo de más, como en calcular_ahorro_por_abonos, para lo que
+    # deje el redondeo del pago
+    for periodo in range(1, n + 2):
+        if 1 < periodo <= n:
+            # El primer periodo usa la tasa pactada
+            nueva = r + reversion * (media - r) + volatilidad * rng.standard_normal(caminos)
+            if modelo == "choques":
+                nueva = nueva + choque * (rng.random(caminos) < prob_choque)
+            nueva = np.clip(nueva, tasa_minima, tasa_maxima)
+            restantes = n - periodo + 1
+            recalculado = np.round(saldo_plan * nueva / -np.expm1(-restantes * np.log1p(nueva)), 2)
+            pago = np.where(nueva != r, recalculado, pago)
+            r = nueva
+
+        saldo_plan = saldo_plan * (1 + r) - pago
+        activos = saldo > 0
+        interes = np.where(activos, saldo * r, 0.0)
+        a_capital = pago - interes
+        if abono and periodo >= desde:
+            a_capital = a_capital + abono
+        # Último pago: cuando el abono a capital ya cubre el saldo
+        ultimo = activos & ((a_capital >= saldo) | (periodo > n))
+        pagado = np.where(ultimo, saldo + interes, np.where(activos, pago, 0.0))
+        saldo = np.where(ultimo, 0.0, np.where(activos, saldo - a_capital, 0.0))
+
+        np.maximum(pago_maximo, pagado, out=pago_maximo)
+        intereses += interes
+        if not saldo.any():
+            break
+
+    return pago_maximo, intereses
+
+
+def _simular_bloque_empacado(argumentos):
+    return _simular_bloque(*argumentos)
+
+# =========================================
+# Grupo de procesos
+# =========================================
+#
+# Se crea la primera vez que se necesita en cada proceso (igual que los
+# hilos de la cola); también lo usan las simulaciones en lote de la API
+# (simulaciones.py). Se usa "spawn" porque el worker ya tiene hilos
+# corriendo y hacer fork con hilos puede dejar candados tomados.
+
+_procesos = None
+_pid_procesos = None
+_candado_procesos = threading.Lock()
+
+
+def grupo_procesos():
+    global _procesos, _pid_procesos
+    with _candado_procesos:
+        if _pid_procesos != os.getpid():
+            _procesos = ProcessPoolExecutor(PROCESOS_SIMULACION, mp_context=get_context("spawn"))
+            _pid_procesos = os.getpid()
+    return _procesos
+
+# =========================================
+# Simulación completa
+# =========================================
+
+def simular_tasa_variable(monto, tasa, plazo, caminos=CAMINOS_POR_DEFECTO, modelo="reversion", semilla=0,
+                          abono_extra=0, desde_periodo=1, media=None, reversion=0.05, volatilidad=None,
+                          choque=None, prob_choque=0.02, paralelo=None):
+    # media, volatilidad y choque son tasas por periodo; por defecto se
+    # toman relativas a la tasa inicial. paralelo=None decide según
+    # UMBRAL_PARALELO.
+    if modelo not in MODELOS:
+        raise ValueError(f"Modelo de tasa desconocido: {modelo}")
+    P = float(validar_monto(monto, "El monto"))
+    r0 = float(validar_tasa(tasa))
+    n = validar_plazo(plazo)
+    abono = float(validar_monto(abono_extra, "El abono extra", permitir_cero=True))
+    desde = validar_periodo(desde_periodo, n)
+    if not 1 <= caminos <= MAX_CAMINOS:
+        raise ErrorValidacion("presupuesto", f"Se pueden simular de 1 a {MAX_CAMINOS} escenarios.")
+
+    parametros = (
+        P, r0, n, abono, desde, modelo,
+        r0 if media is None else float(media),
+        float(reversion),
+        r0 * 0.03 if volatilidad is None else float(volatilidad),
+        r0 * 0.25 if choque is None else float(choque),
+        float(prob_choque),
+    )
+
+    semillas = np.random.SeedSequence(semilla).spawn(-(-caminos // CAMINOS_POR_BLOQUE))
+    bloques = [
+        parametros + (min(CAMINOS_POR_BLOQUE, caminos - i * CAMINOS_POR_BLOQUE), semilla_bloque)
+        for i, semilla_bloque in enumerate(semillas)
+    ]
+    if paralelo is None:
+        paralelo = caminos >= UMBRAL_PARALELO and PROCESOS_SIMULACION > 1
+    if paralelo:
+        resultados = list(grupo_procesos().map(_simular_bloque_empacado, bloques))
+    else:
+        resultados = [_simular_bloque(*bloque) for bloque in bloques]
+    pago_maximo = np.concatenate([pagos for pagos, _ in resultados])
+    intereses = np.concatenate([total for _, total in resultados])
+
+    # Referencia: la misma tasa todo el plazo
+    _, fijo_intereses = _simular_bloque(*parametros[:7], 0.0, 0.0, 0.0, 0.0, 1, None)
+    fijo_pago = P * r0 / -np.expm1(-n * np.log1p(r0))
+    return {
+        "caminos": caminos,
+        "modelo": modelo,
+        "semilla": semilla,
+        "tasa_fija": {"pago": round(float(fijo_pago), 2), "intereses": round(float(fijo_intereses[0]), 2)},
+        "pago_maximo": _percentiles(pago_maximo),
+        "intereses": _percentiles(intereses),
+    }
+
+
+def _percentiles(valores):
+    return {f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(valores, PERCENTILES))}
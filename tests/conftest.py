@@ -0,0 +1,10 @@
+# =========================================
+# Configuración de las pruebas
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Permite importar los módulos de la raíz del repositorio
+# =========================================
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,92 @@
+# =========================================
+# Pruebas: cálculos con Decimal estilo Excel
+# Autora: Dra. Jazmín Sandoval
+# =========================================
+
+import random
+from decimal import Decimal, localcontext
+
+import pytest
+
+from calculos import (
+    CONTEXTO_EXCEL,
+    MODOS_AHORRO,
+    calcular_pago_fijo_excel,
+    detalle_ahorro_desde_punto,
+    detalle_ahorro_por_abonos,
+    factores_anualidad,
+    limpiar_cache_factores,
+    punto_de_control_ahorro,
+    tabla_amortizacion
+)
+from validacion import ErrorValidacion
+
+
+@pytest.mark.parametrize("precision", [5, 28, 50])
+def test_factores_con_precision_excel_sin_importar_el_contexto(precision):
+    limpiar_cache_factores()
+    with localcontext() as contexto:
+        contexto.prec = precision
+        factores = factores_anualidad(Decimal("0.0123"), 37)
+    with localcontext(CONTEXTO_EXCEL):
+        esperados = (Decimal("1.0123") ** 37, 1 - 1 / Decimal("1.0123") ** 37)
+    assert factores == esperados
+    assert factores_anualidad("0.0123", "37") == esperados
+
+
+@pytest.mark.parametrize("monto, tasa, plazo, pago", [
+    (100000, "0.02", 24, Decimal("5287.11")),
+    (10000, "0.02", 12, Decimal("945.60")),
+    (1000, "1", 1, Decimal("2000.00")),
+])
+def test_pago_fijo(monto, tasa, plazo, pago):
+    assert calcular_pago_fijo_excel(monto, tasa, plazo) == pago
+
+
+def casos_de_abonos(cantidad, semilla):
+    aleatorio = random.Random(semilla)
+    for _ in range(cantidad):
+        plazo = aleatorio.randint(1, 600)
+        yield (
+            round(10 ** aleatorio.uniform(2, 8), 2),
+            round(10 ** aleatorio.uniform(-4, -0.5), 6),
+            plazo,
+            aleatorio.choice([0, round(10 ** aleatorio.uniform(0, 6), 2)]),
+            aleatorio.randint(1, plazo),
+        )
+
+
+@pytest.mark.parametrize("monto, tasa, plazo, abono, desde", [
+    (100000, "0.02", 24, 500, 3),
+    (100000, "0.02", 24, 0, 1),
+    (50000, "0.015", 36, 100000, 1),      # el primer abono liquida
+    (250000, "0.01", 360, 1000, 300),     # abonos casi al final
+    (1000000, "0.0001", 600, 1, 1),
+    *casos_de_abonos(300, 2024),
+])
+def test_abonos_cerrado_igual_que_recorrido(monto, tasa, plazo, abono, desde):
+    # Si un modo rechaza los datos, el otro también y por el mismo motivo
+    resultados = []
+    for modo in ("cerrado", "referencia"):
+        try:
+            resultados.append(detalle_ahorro_por_abonos(monto, tasa, plazo, abono, desde, modo=modo))
+        except ErrorValidacion as e:
+            resultados.append(e.motivo)
+    assert resultados[0] == resultados[1]
+
+
+def test_punto_de_control_da_lo_mismo_con_varios_abonos():
+    punto = punto_de_control_ahorro(300000, "0.012", 240)
+    for abono, desde in [(1000, 100), (500, 30), (2000, 200), (0, 1)]:
+        for modo in MODOS_AHORRO:
+            esperado = detalle_ahorro_por_abonos(300000, "0.012", 240, abono, desde, modo=modo)
+            assert detalle_ahorro_desde_punto(punto, abono, desde, modo=modo) == esperado
+
+
+def test_tabla_cuadra_con_el_resumen():
+    filas = list(tabla_amortizacion(100000, "0.02", 24, 500, 3))
+    detalle = detalle_ahorro_por_abonos(100000, "0.02", 24, 500, 3)
+    assert len(filas) == detalle["periodo_liquidacion"]
+    assert filas[-1]["saldo"] == 0
+    assert filas[-1]["pago"] == detalle["ultimo_pago"]
+    assert sum(fila["interes"] for fila in filas) == pytest.approx(detalle["intereses_totales"], abs=Decimal("0.05"))
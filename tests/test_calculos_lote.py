@@ -0,0 +1,72 @@
+# =========================================
+# Pruebas: pago fijo por lote contra Decimal
+# Autora: Dra. Jazmín Sandoval
+# =========================================
+
+import numpy as np
+import pytest
+
+from calculos import calcular_pago_fijo_excel
+from calculos_lote import calcular_pagos_lote, malla_pagos, verificar_pagos_lote
+
+
+@pytest.mark.parametrize("monto, tasa, plazo", [
+    (293366244.54, 0.75, 728),
+    (100000, 0.02, 24),
+    (1000, 0.000001, 1200),
+    (999999999.99, 1, 1),
+])
+def test_coincide_al_centavo_con_decimal(monto, tasa, plazo):
+    pago = calcular_pagos_lote(monto, tasa, plazo)["pago"]
+    assert round(float(pago) * 100) == int(calcular_pago_fijo_excel(monto, tasa, plazo) * 100)
+
+
+def test_lote_aleatorio_sin_diferencias():
+    aleatorio = np.random.default_rng(2024)
+    montos = np.round(10 ** aleatorio.uniform(0, 9, 3000), 2)
+    tasas = np.round(10 ** aleatorio.uniform(-6, 0, 3000), 6)
+    plazos = aleatorio.integers(1, 1201, 3000).astype(float)
+    assert verificar_pagos_lote(montos, tasas, plazos) == []
+
+
+def test_total_e_intereses_salen_del_pago_redondeado():
+    resultado = calcular_pagos_lote([10000, 5000], 0.02, 12)
+    assert resultado["pago"].tolist() == [945.6, 472.8]
+    assert resultado["total_pagado"].tolist() == [11347.2, 5673.6]
+    assert resultado["intereses"].tolist() == pytest.approx([1347.2, 673.6])
+
+
+def test_malla_tasa_por_plazo():
+    malla = malla_pagos(10000, [0.01, 0.02], [6, 12, 24])["pago"]
+    assert malla.shape == (2, 3)
+    for i, tasa in enumerate([0.01, 0.02]):
+        for j, plazo in enumerate([6, 12, 24]):
+            assert malla[i, j] == float(calcular_pago_fijo_excel(10000, tasa, plazo))
+
+
+def test_celdas_invalidas_quedan_en_nan():
+    pago = calcular_pagos_lote(1000, [0.01, -1, 0.01, 0], [12, 12, 0, 4])["pago"]
+    assert np.isnan(pago[1]) and np.isnan(pago[2])
+    assert pago[3] == 250
+
+
+@pytest.mark.parametrize("montos, tasas, plazos", [
+    (5e9, 0.02, 12),
+    (1e11, 0.02, [12, 24, 36]),
+    (0.01, -0.5, 1),
+    (1000, [1.5, 3, -0.999], [12, 5, 3]),
+    (1000, 1e-20, 12),
+])
+def test_fuera_de_los_limites_del_bot_no_lanza(montos, tasas, plazos):
+    # El lote solo rechaza (con NaN) plazo < 1 o tasa <= -1
+    pago = calcular_pagos_lote(montos, tasas, plazos)["pago"]
+    assert np.isfinite(pago).all()
+    assert verificar_pagos_lote(montos, tasas, plazos) == []
+
+
+def test_montos_grandes_y_tasas_fuera_de_rango_cuadran_con_decimal():
+    aleatorio = np.random.default_rng(3)
+    montos = np.round(10 ** aleatorio.uniform(9, 12, 2000), 2)
+    tasas = np.round(aleatorio.uniform(-0.9, 3, 2000), 6)
+    plazos = aleatorio.integers(1, 1201, 2000).astype(float)
+    assert verificar_pagos_lote(montos, tasas, plazos) == []
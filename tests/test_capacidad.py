@@ -0,0 +1,73 @@
+# =========================================
+# Pruebas: capacidad de pago y montos máximos
+# Autora: Dra. Jazmín Sandoval
+# =========================================
+
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from calculos import calcular_pago_fijo_excel
+from calculos_lote import calcular_pagos_lote
+from capacidad import calcular_capacidad_mensual, plazos_minimos, tabla_montos_maximos, tasas_maximas
+from validacion import PLAZO_MAXIMO
+
+
+def plazo_minimo_lineal(capacidad, monto, tasa):
+    # Referencia: el primer plazo, de 1 a PLAZO_MAXIMO, cuyo pago cabe
+    plazos = np.arange(1, PLAZO_MAXIMO + 1, dtype=float)
+    caben = np.nonzero(calcular_pagos_lote(monto, tasa, plazos)["pago"] <= capacidad)[0]
+    return int(plazos[caben[0]]) if len(caben) else 0
+
+
+@pytest.mark.parametrize("capacidad, monto, tasa", [
+    (6700, 126723.30, 0.02),
+    (9700, 300000, 0.02),
+    (1000, 5000, 0.5),
+    (50, 100000, 0.01),         # no cubre los intereses
+    (100000, 5000, 0.03),       # cabe en un pago
+    # Cerca de P r = c el pago redondeado se queda igual muchos periodos
+    (4070.15, 282641, 0.0144),
+    (132.54, 18141, 0.0073),
+    (166.15, 5411, 0.0307),
+])
+def test_plazos_minimos_contra_busqueda_lineal(capacidad, monto, tasa):
+    assert plazos_minimos(capacidad, monto, [tasa])[0] == plazo_minimo_lineal(capacidad, monto, tasa)
+
+
+def test_plazos_minimos_aleatorios_contra_busqueda_lineal():
+    rng = np.random.default_rng(7)
+    montos = rng.integers(1000, 2_000_000, 200).astype(float)
+    tasas = np.round(rng.uniform(0.0005, 0.06, 200), 4)
+    # La mitad con la capacidad pegada a los intereses del primer periodo
+    holgura = np.where(np.arange(200) % 2, rng.uniform(0, 0.002, 200), rng.uniform(0, 1, 200))
+    capacidades = np.round(montos * tasas * (1 + holgura), 2)
+    for capacidad, monto, tasa in zip(capacidades, montos, tasas):
+        assert plazos_minimos(capacidad, monto, [tasa])[0] == plazo_minimo_lineal(capacidad, monto, tasa)
+
+
+def test_plazos_minimos_varias_tasas_a_la_vez():
+    tasas = [0.01, 0.02, 0.05, 0.2]
+    plazos = plazos_minimos(3000, 100000, tasas)
+    assert list(plazos) == [plazo_minimo_lineal(3000, 100000, tasa) for tasa in tasas]
+    assert plazos[-1] == 0
+
+
+def test_tasas_maximas_el_pago_cabe_y_una_centesima_mas_no():
+    for plazo, tasa in zip((12, 24, 60), tasas_maximas(9700, 150000, [12, 24, 60])):
+        if tasa == 0:
+            continue
+        assert calcular_pago_fijo_excel(150000, Decimal(str(tasa)), plazo) <= 9700
+        assert calcular_pago_fijo_excel(150000, Decimal(str(round(tasa + 0.0001, 4))), plazo) > 9700
+
+
+def test_tabla_montos_maximos_coincide_con_el_pago():
+    tabla = tabla_montos_maximos(6700, [Decimal("0.02")], [24])
+    assert tabla["montos"][0, 0] == pytest.approx(126723.30, abs=0.01)
+
+
+@pytest.mark.parametrize("riesgo, esperado", [("1", "9700.00"), ("2", "6700.00"), ("3", "3700.00")])
+def test_capacidad_mensual(riesgo, esperado):
+    capacidad = calcular_capacidad_mensual(Decimal("20000"), Decimal("2000"), Decimal("5000"), riesgo)
+    assert capacidad == Decimal(esperado)
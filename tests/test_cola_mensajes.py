@@ -0,0 +1,99 @@
+# =========================================
+# Pruebas: cola de mensajes entrantes
+# Autora: Dra. Jazmín Sandoval
+# =========================================
+
+import random
+import threading
+import time
+
+from cola_mensajes import ColaMensajes
+
+
+def test_cada_numero_en_orden_y_todos_en_paralelo():
+    atendidos = {}
+    candado = threading.Lock()
+    aleatorio = random.Random(5)
+
+    def atender(numero, mensaje):
+        time.sleep(aleatorio.random() / 2000)
+        with candado:
+            atendidos.setdefault(numero, []).append(mensaje)
+
+    cola = ColaMensajes(atender, num_trabajadores=4, max_pendientes=10000)
+    enviados = {}
+    for i in range(2000):
+        numero = f"52{i % 37}"
+        enviados.setdefault(numero, []).append(i)
+        if i % 3:
+            assert cola.encolar(numero, i)
+        else:
+            assert cola.encolar_lote({numero: [i]})
+    assert cola.esperar_vacia(10)
+    assert atendidos == enviados
+    estadisticas = cola.estadisticas()
+    assert (estadisticas["procesados"], estadisticas["pendientes"], estadisticas["errores"]) == (2000, 0, 0)
+
+
+def test_un_solo_hilo_por_numero():
+    activos = {}
+    maximo = {}
+    candado = threading.Lock()
+
+    def atender(numero, mensaje):
+        with candado:
+            activos[numero] = activos.get(numero, 0) + 1
+            maximo[numero] = max(maximo.get(numero, 0), activos[numero])
+        time.sleep(0.001)
+        with candado:
+            activos[numero] -= 1
+
+    cola = ColaMensajes(atender, num_trabajadores=8)
+    for i in range(200):
+        cola.encolar(str(i % 3), i)
+    assert cola.esperar_vacia(10)
+    assert maximo == {"0": 1, "1": 1, "2": 1}
+
+
+def test_limite_de_pendientes_todo_o_nada():
+    liberar = threading.Event()
+    cola = ColaMensajes(lambda numero, mensaje: liberar.wait(5), num_trabajadores=1, max_pendientes=3)
+    assert cola.encolar("1", "a")
+    assert cola.encolar_lote({"2": ["b"], "3": ["c"]})
+    # Un lote que no cabe completo no deja ninguno de sus mensajes
+    assert not cola.encolar_lote({"4": ["d"], "5": ["e", "f"]})
+    assert cola.estadisticas()["rechazados"] == 3
+    liberar.set()
+    assert cola.esperar_vacia(5)
+    assert cola.encolar_lote({"4": ["d"], "5": ["e", "f"]})
+    assert cola.esperar_vacia(5)
+    assert cola.estadisticas()["procesados"] == 6
+
+
+def test_hilos_al_primer_uso_y_otra_vez_tras_un_fork():
+    cola = ColaMensajes(lambda numero, mensaje: None, num_trabajadores=2)
+    assert cola._hilos == []
+    cola.encolar("1", "a")
+    primeros = list(cola._hilos)
+    assert len(primeros) == 2 and all(hilo.is_alive() for hilo in primeros)
+    cola.encolar("1", "b")
+    assert cola._hilos == primeros
+    # En el hijo de un fork los hilos del padre no existen: el pid cambia
+    cola._pid = -1
+    cola.encolar("1", "c")
+    assert len(cola._hilos) == 2 and cola._hilos != primeros
+    assert cola.esperar_vacia(5)
+
+
+def test_errores_van_al_log_y_la_cola_sigue(caplog):
+    def atender(numero, mensaje):
+        if mensaje == "falla":
+            raise RuntimeError("sin conexión")
+
+    cola = ColaMensajes(atender, num_trabajadores=1)
+    with caplog.at_level("ERROR", logger="cola_mensajes"):
+        cola.encolar_lote({"1": ["falla", "ok"]})
+        assert cola.esperar_vacia(5)
+    assert cola.estadisticas()["errores"] == 1
+    assert cola.estadisticas()["procesados"] == 2
+    assert "sin conexión" in caplog.text
@@ -0,0 +1,126 @@
+# =========================================
+# Pruebas: índice de mensajes ya recibidos
+# Autora: Dra. Jazmín Sandoval
+# =========================================
+
+import pytest
+
+import bot_credito
+import deduplicacion
+import sesiones
+from cola_mensajes import ColaMensajes
+from deduplicacion import IndiceMemoria, crear_indice_mensajes
+from sesiones import ServidorRespLocal
+
+
+class RelojFalso:
+    def __init__(self, inicio=1000.0):
+        self.ahora = inicio
+
+    def monotonic(self):
+        return self.ahora
+
+    def time(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = RelojFalso()
+    monkeypatch.setattr(deduplicacion, "time", reloj)
+    monkeypatch.setattr(sesiones, "time", reloj)  # el servidor RESP local
+    return reloj
+
+
+@pytest.fixture(params=["memoria", "sqlite", "redis"])
+def indice(request, reloj, tmp_path):
+    if request.param == "memoria":
+        yield crear_indice_mensajes("memoria", ventana=60)
+    elif request.param == "sqlite":
+        yield crear_indice_mensajes(f"sqlite:///{tmp_path / 'mensajes.db'}", ventana=60)
+    else:
+        servidor = ServidorRespLocal()
+        host, puerto = servidor.iniciar()
+        yield crear_indice_mensajes(f"redis://{host}:{puerto}/0", ventana=60)
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def test_reclamar_y_liberar(indice):
+    assert indice.reclamar(["a", "b"]) == {"a", "b"}
+    assert indice.reclamar(["a", "c"]) == {"c"}
+    indice.liberar(["a"])
+    assert indice.reclamar(["a"]) == {"a"}
+    assert indice.contar() == 3
+
+
+def test_ventana_de_tiempo(indice, reloj):
+    indice.reclamar(["a"])
+    reloj.ahora += 30
+    assert indice.reclamar(["b"]) == {"b"}
+    reloj.ahora += 31
+    # "a" vence; "b" sigue dentro de su ventana
+    assert indice.reclamar(["a", "b"]) == {"a"}
+
+
+def test_memoria_renueva_la_ventana_de_los_repetidos(reloj):
+    indice = IndiceMemoria(ventana=60)
+    indice.reclamar(["a"])
+    reloj.ahora += 50
+    assert indice.reclamar(["a"]) == set()
+    reloj.ahora += 50
+    assert indice.reclamar(["a"]) == set()
+
+
+def test_memoria_olvida_los_menos_recientes_al_llenarse(reloj):
+    indice = IndiceMemoria(ventana=60, maximo=3)
+    indice.reclamar(["a", "b", "c"])
+    indice.reclamar(["a"])         # "b" queda como el menos reciente
+    assert indice.reclamar(["d"]) == {"d"}
+    assert indice.contar() == 3
+    assert indice.reclamar(["b"]) == {"b"}
+    assert indice.reclamar(["a", "d"]) == set()
+
+# =========================================
+# recibir_entrega
+# =========================================
+
+def entrega(*mensajes):
+    return {"entry": [{"changes": [{"value": {"messages": [
+        {"from": numero, "id": id_mensaje, "timestamp": "1", "type": "text", "text": {"body": texto}}
+        for numero, id_mensaje, texto in mensajes
+    ]}}]}]}
+
+
+@pytest.fixture
+def cola(monkeypatch):
+    atendidos = []
+    cola = ColaMensajes(lambda numero, mensaje: atendidos.append((numero, mensaje)), num_trabajadores=1)
+    cola.atendidos = atendidos
+    monkeypatch.setattr(bot_credito, "cola_mensajes", cola)
+    monkeypatch.setattr(bot_credito, "indice_mensajes", IndiceMemoria())
+    return cola
+
+
+def test_repetidos_en_la_misma_entrega_y_reintentos(cola):
+    cliente = bot_credito.app.test_client()
+    datos = entrega(("521", "wamid.1", "hola"), ("521", "wamid.1", "hola"), ("522", "wamid.2", "menú"))
+    assert bot_credito.recibir_entrega(datos) == "encolado"
+    assert bot_credito.recibir_entrega(datos) == "duplicado"
+    assert cliente.post("/webhook", json=datos).status_code == 200
+    assert cola.esperar_vacia(5)
+    assert sorted(cola.atendidos) == [("521", "hola"), ("522", "menú")]
+
+
+def test_cola_llena_libera_los_ids_para_el_reintento(cola, monkeypatch):
+    cliente = bot_credito.app.test_client()
+    datos = entrega(("521", "wamid.10", "hola"), ("522", "wamid.11", "1"))
+    llena = ColaMensajes(lambda numero, mensaje: None, num_trabajadores=1, max_pendientes=1)
+    with monkeypatch.context() as cambio:
+        cambio.setattr(bot_credito, "cola_mensajes", llena)
+        assert cliente.post("/webhook", json=datos).status_code == 503
+    assert bot_credito.indice_mensajes.contar() == 0
+    # El reintento de Meta llega cuando ya hay lugar y sí se procesa
+    assert cliente.post("/webhook", json=datos).status_code == 200
+    assert cola.esperar_vacia(5)
+    assert sorted(cola.atendidos) == [("521", "hola"), ("522", "1")]
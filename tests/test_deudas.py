@@ -0,0 +1,134 @@
+# =========================================
+# Pruebas: plan para pagar varias deudas
+# Autora: Dra. Jazmín Sandoval
+# =========================================
+#
+# La simulación por eventos se compara con una referencia que avanza
+# mes por mes: cada mes se cargan los intereses, todas las deudas pagan
+# su mínimo y lo que queda del presupuesto va a las deudas en el orden
+# de prioridad.
+
+import pytest
+
+from deudas import comparar_estrategias, orden_estrategia, preparar_deudas, simular_plan, simular_solo_minimos
+from validacion import ErrorValidacion
+
+MAX_MESES_REFERENCIA = 1200
+
+
+def plan_mes_a_mes(deudas, presupuesto, orden):
+    saldos = [saldo for saldo, _, _ in deudas]
+    liquidaciones = [None] * len(deudas)
+    pagado = 0.0
+    mes = 0
+    while None in liquidaciones:
+        mes += 1
+        assert mes <= MAX_MESES_REFERENCIA
+        activas = [i for i, liquidada in enumerate(liquidaciones) if liquidada is None]
+        disponible = presupuesto
+        for i in activas:
+            saldos[i] *= 1 + deudas[i][1]
+            pago = min(deudas[i][2], saldos[i])
+            saldos[i] -= pago
+            disponible -= pago
+        for i in orden:
+            if liquidaciones[i] is None and disponible > 0:
+                pago = min(disponible, saldos[i])
+                saldos[i] -= pago
+                disponible -= pago
+        for i in activas:
+            if saldos[i] <= 1e-9:
+                liquidaciones[i] = mes
+        pagado += presupuesto - disponible
+    return liquidaciones, pagado
+
+
+def minimos_mes_a_mes(deudas):
+    liquidaciones = []
+    pagado = 0.0
+    for saldo, tasa, minimo in deudas:
+        mes = 0
+        while saldo > 1e-9:
+            mes += 1
+            if mes > MAX_MESES_REFERENCIA:
+                return None
+            saldo *= 1 + tasa
+            pago = min(minimo, saldo)
+            saldo -= pago
+            pagado += pago
+        liquidaciones.append(mes)
+    return liquidaciones, pagado
+
+
+CARTERAS = {
+    "ejemplo_del_bot": ([(15000, "0.035", 900), (8000, "0.02", 400)], 2000),
+    "tres_con_tasa_cero": ([(12000, "0.045", 600), (3000, "0", 300), (25000, "0.015", 700)], 2500),
+    "minimo_sin_amortizar": ([(40000, "0.05", 1500), (6000, "0.03", 250), (9000, "0.06", 300)], 4500),
+    "liquidaciones_el_mismo_mes": ([(1000, "0.01", 500), (1000, "0.01", 500), (20000, "0.02", 800)], 2500),
+    "presupuesto_justo": ([(5000, "0.03", 400), (7000, "0.025", 500)], 900),
+}
+
+
+@pytest.mark.parametrize("nombre", sorted(CARTERAS))
+def test_estrategias_contra_simulacion_mes_a_mes(nombre):
+    deudas, presupuesto = CARTERAS[nombre]
+    preparadas, presupuesto_float = preparar_deudas(deudas, presupuesto)
+    saldo_inicial = sum(saldo for saldo, _, _ in preparadas)
+
+    comparacion = comparar_estrategias(deudas, presupuesto)
+    for estrategia, plan in comparacion["estrategias"].items():
+        assert plan["orden"] == orden_estrategia(preparadas, estrategia)
+        liquidaciones, pagado = plan_mes_a_mes(preparadas, presupuesto_float, plan["orden"])
+        assert plan["liquidaciones"] == liquidaciones, estrategia
+        assert plan["meses"] == max(liquidaciones)
+        assert plan["total_pagado"] == pytest.approx(pagado, abs=0.01)
+        assert plan["intereses"] == pytest.approx(pagado - saldo_inicial, abs=0.01)
+
+
+@pytest.mark.parametrize("nombre", sorted(CARTERAS))
+def test_solo_minimos_contra_simulacion_mes_a_mes(nombre):
+    preparadas, _ = preparar_deudas(*CARTERAS[nombre])
+    referencia = minimos_mes_a_mes(preparadas)
+    resultado = simular_solo_minimos(preparadas)
+    if referencia is None:
+        assert resultado is None
+        return
+    liquidaciones, pagado = referencia
+    assert resultado["liquidaciones"] == liquidaciones
+    assert resultado["meses"] == max(liquidaciones)
+    assert resultado["total_pagado"] == pytest.approx(pagado, abs=0.01)
+
+
+def test_orden_propio_contra_simulacion_mes_a_mes():
+    deudas, presupuesto = CARTERAS["minimo_sin_amortizar"]
+    preparadas, presupuesto = preparar_deudas(deudas, presupuesto)
+    for orden in ([1, 2, 0], [2, 0, 1], [0, 1, 2]):
+        plan = simular_plan(preparadas, presupuesto, orden)
+        liquidaciones, pagado = plan_mes_a_mes(preparadas, presupuesto, orden)
+        assert plan["liquidaciones"] == liquidaciones
+        assert plan["total_pagado"] == pytest.approx(pagado, abs=0.01)
+
+
+def test_minimo_que_no_cubre_intereses_no_tiene_solo_minimos():
+    comparacion = comparar_estrategias(*CARTERAS["minimo_sin_amortizar"])
+    assert comparacion["solo_minimos"] is None
+    assert all(plan["ahorro_intereses"] is None for plan in comparacion["estrategias"].values())
+
+
+def test_avalancha_no_paga_mas_intereses_que_bola_de_nieve():
+    for deudas, presupuesto in CARTERAS.values():
+        planes = comparar_estrategias(deudas, presupuesto)["estrategias"]
+        assert planes["avalancha"]["intereses"] <= planes["bola_de_nieve"]["intereses"] + 0.01
+
+
+def test_presupuesto_menor_a_los_minimos():
+    with pytest.raises(ErrorValidacion) as error:
+        comparar_estrategias([(5000, "0.03", 400), (7000, "0.025", 500)], 800)
+    assert error.value.motivo == "presupuesto_insuficiente"
+
+
+def test_orden_incompleto():
+    preparadas, presupuesto = preparar_deudas(*CARTERAS["ejemplo_del_bot"])
+    with pytest.raises(ErrorValidacion) as error:
+        simular_plan(preparadas, presupuesto, [0, 0])
+    assert error.value.motivo == "orden_invalido"
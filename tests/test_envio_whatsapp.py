@@ -0,0 +1,66 @@
+# =========================================
+# Pruebas: cliente de la Graph API
+# Autora: Dra. Jazmín Sandoval
+# =========================================
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import bot_credito
+from envio_whatsapp import MAX_ESPERA_REINTENTO, ClienteWhatsApp, ServidorStubWhatsApp, dividir_texto
+
+
+@pytest.mark.parametrize("retry_after, esperado", [
+    ("5", 5.0),
+    ("-3", 0.0),
+    ("inf", MAX_ESPERA_REINTENTO),
+    ("1e9", MAX_ESPERA_REINTENTO),
+])
+def test_retry_after_acotado(retry_after, esperado):
+    assert ClienteWhatsApp(token="x")._espera(0, retry_after) == esperado
+
+
+@pytest.mark.parametrize("retry_after", ["nan", "mañana", None])
+def test_retry_after_invalido_usa_espera_exponencial(retry_after):
+    cliente = ClienteWhatsApp(token="x", espera_base=0.5)
+    assert 0.25 <= cliente._espera(1, retry_after) <= 1.5
+
+
+def test_dividir_texto_respeta_el_limite():
+    texto = "\n\n".join(["a" * 30] * 5) + "\n" + "b" * 70
+    partes = dividir_texto(texto, limite=50)
+    assert all(len(parte) <= 50 for parte in partes)
+    assert "".join(partes).replace("\n", "") == texto.replace("\n", "")
+
+
+def test_cuentas_con_envios_en_paralelo():
+    servidor = ServidorStubWhatsApp(codigos=[400] * 5)
+    url = servidor.iniciar()
+    try:
+        cliente = ClienteWhatsApp(url_api=url, phone_number_id="1", token="x", reintentos=0)
+
+        def enviar(i):
+            try:
+                cliente.enviar_texto(f"52{i}", "hola")
+            except Exception:
+                pass
+
+        with ThreadPoolExecutor(8) as hilos:
+            list(hilos.map(enviar, range(40)))
+        estadisticas = cliente.estadisticas()
+        assert (estadisticas["enviados"], estadisticas["fallidos"]) == (35, 5)
+        assert len(servidor.recibidos) == 35
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def test_sin_token_solo_se_registra_sin_el_numero_completo(monkeypatch, caplog, capsys):
+    monkeypatch.setattr(bot_credito, "cliente_whatsapp", ClienteWhatsApp(token=""))
+    with caplog.at_level("DEBUG", logger="bot_credito"):
+        bot_credito.enviar_mensaje("5215512345678", "Hola")
+    assert capsys.readouterr().out == ""
+    [linea] = [r.getMessage() for r in caplog.records if r.name == "bot_credito"]
+    assert "5678" in linea and "Hola" in linea
+    assert "5215512345678" not in linea
@@ -0,0 +1,282 @@
+# =========================================
+# Pruebas: máquina de estados de la conversación
+# Autora: Dra. Jazmín Sandoval
+# =========================================
+#
+# Cada conversación recorre un flujo del menú de principio a fin con
+# procesar_mensaje y compara las respuestas con las de la cadena de if
+# original. Los números (pagos, ahorros, tasas, capacidad) son los que
+# daban las funciones de cálculo de esa versión. Cuando el flujo nuevo
+# agrega algo al final de una respuesta (la tabla de plazos, las
+# alternativas, "otro abono"), se compara el inicio.
+
+import pytest
+
+import bot_credito
+from bot_credito import (
+    ESTADOS, FIN, FLUJO_POR_ESTADO, MENU, SIN_CAMBIO, Estado, Opcion,
+    flujos_por_estado, procesar_mensaje, validar_flujo,
+)
+from sesiones import AlmacenMemoria
+
+PREGUNTA_TASA = (
+    "¿Cuál es la tasa de interés en el mismo periodo en que harás los pagos?\n"
+    "📌 Por ejemplo, si pagarás cada mes, la tasa debe ser mensual."
+)
+PREGUNTA_RIESGO = (
+    "4️⃣ Según tu experiencia, ¿cómo calificarías tu nivel de riesgo como cliente?\n"
+    "Escribe el número que mejor te describa:\n"
+    "1. Bajo: Siempre pago a tiempo y mantengo buen control\n"
+    "2. Medio: A veces me atraso o uso mucho mis tarjetas\n"
+    "3. Alto: Me atraso seguido o ya tengo deudas grandes"
+)
+SUBOPCIONES_PRESTAMO = (
+    "¿Qué te gustaría hacer ahora?\n"
+    "1. Calcular el monto máximo de crédito que podrías solicitar\n"
+    "2. Validar si un crédito que te interesa podría ser aprobado\n"
+    "Escribe 1 o 2 para continuar."
+)
+PASOS_CAPACIDAD = [
+    ("4", "Vamos a calcular cuánto podrías solicitar como crédito, con base en tu capacidad de pago.\n\n"
+          "Primero necesito saber:\n"
+          "1️⃣ ¿Cuál es tu ingreso neto mensual? (Después de impuestos y deducciones)"),
+    ("20000", "2️⃣ ¿Cuánto pagas mensualmente en créditos formales o instituciones financieras?\n"
+              "(No incluyas comida, renta, etc.)"),
+    ("2000", "3️⃣ ¿Cuánto debes actualmente en tarjetas de crédito u otras deudas revolventes?"),
+    ("5000", PREGUNTA_RIESGO),
+]
+
+CONVERSACIONES = {
+    "credito_con_abonos": [
+        ("1", "Perfecto. Para comenzar, dime el monto del crédito que deseas simular."),
+        ("100000", "¿A cuántos pagos (periodos) lo piensas pagar?"),
+        ("24", PREGUNTA_TASA),
+        ("0.02", "✅ Tu pago por periodo sería de: $5287.11\n"
+                 "💰 Pagarías en total: $126890.64\n"
+                 "📉 De los cuales $26890.64 serían intereses.\n\n"
+                 "¿Te gustaría ver cuánto podrías ahorrar si haces pagos extra a capital?\n"
+                 "Responde *sí* o *no*."),
+        ("sí", "¿Cuánto deseas abonar extra por periodo? (Ejemplo: 500)"),
+        ("500", "¿A partir de qué periodo comenzarás a abonar esa cantidad? (Ejemplo: 4)"),
+        ("4", "💸 Si pagaras este crédito sin hacer abonos extra, terminarías pagando $126890.64 en total.\n\n"
+              "Pero si decides abonar $500 adicionales por periodo desde el periodo 4...\n"
+              "✅ Terminarías de pagar en menos tiempo (¡te ahorras 2 pagos!)\n"
+              "💰 Pagarías $115661.38 en total\n"
+              "🧮 Y te ahorrarías $11229.26 solo en intereses"),
+        ("otro abono", "¿Cuánto deseas abonar extra por periodo? (Ahora: $500)"),
+        ("1000", "💸 Si pagaras este crédito sin hacer abonos extra, terminarías pagando $126890.64 en total.\n\n"
+                 "Pero si decides abonar $1000 adicionales por periodo desde el periodo 4..."),
+        ("otro periodo", "¿A partir de qué periodo comenzarás a abonar? (Ahora: 4)"),
+        ("4", "💸 Si pagaras este crédito sin hacer abonos extra, terminarías pagando $126890.64 en total.\n\n"
+              "Pero si decides abonar $1000 adicionales por periodo desde el periodo 4..."),
+    ],
+    "credito_sin_abonos": [
+        ("simular un crédito", "Perfecto. Para comenzar, dime el monto del crédito que deseas simular."),
+        ("100000", "¿A cuántos pagos (periodos) lo piensas pagar?"),
+        ("24", PREGUNTA_TASA),
+        ("0.02", "✅ Tu pago por periodo sería de: $5287.11\n"),
+        ("no", "Ok, pero si gustas reconsiderarlo porque realmente es algo útil, lo revisamos después 😊"),
+    ],
+    "compra_en_tienda": [
+        ("3", "Vamos a calcular el costo real de una compra a pagos fijos.\n"
+              "Por favor dime lo siguiente:\n\n"
+              "1️⃣ ¿Cuál es el precio de contado del producto?"),
+        ("1800", "2️⃣ ¿De cuánto será cada pago (por ejemplo: 250)?"),
+        ("250", "3️⃣ ¿Cuántos pagos harás en total?"),
+        ("10", "📊 Aquí tienes los resultados:\n"
+               "💰 Precio de contado: $1800\n"
+               "📆 Pagos fijos de $250 durante 10 periodos\n\n"
+               "💸 Total pagado: $2500.00\n"
+               "🧮 Intereses pagados: $700.00\n"
+               "📈 Tasa por periodo: 6.47%\n"
+               "📅 Tasa anual equivalente (aproximada): 112.12%"),
+    ],
+    "monto_maximo": PASOS_CAPACIDAD + [
+        ("2", "✅ Según tus datos, podrías pagar hasta $6700.00 al mes en un nuevo crédito.\n\n" + SUBOPCIONES_PRESTAMO),
+        ("1", "📆 ¿A cuántos pagos (meses, quincenas, etc.) deseas simular el crédito?"),
+        ("24", "📈 ¿Cuál es la tasa de interés por periodo? Ejemplo: para 2.5%, escribe 0.025"),
+        ("0.02", "✅ Con base en tu capacidad de pago de $6700.00, podrías aspirar a un crédito de hasta "
+                 "aproximadamente $126723.30.\n\n"),
+    ],
+    "credito_viable": PASOS_CAPACIDAD + [
+        ("1", "✅ Según tus datos, podrías pagar hasta $9700.00 al mes en un nuevo crédito.\n\n" + SUBOPCIONES_PRESTAMO),
+        ("2", "💰 ¿De cuánto sería el crédito que te interesa solicitar?"),
+        ("50000", "📆 ¿En cuántos pagos (meses, quincenas, etc.) planeas pagarlo?"),
+        ("24", "📈 ¿Cuál es la tasa de interés por periodo? Ejemplo: para 2.5%, escribe 0.025"),
+        ("0.02", "✅ Buenas noticias: podrías pagar este crédito.\n"
+                 "Tu pago mensual estimado sería de $2643.55, lo cual está dentro de tu capacidad de pago mensual ($9700.00).\n\n"
+                 "¿Deseas volver al menú? Escribe *menú*."),
+    ],
+    "credito_no_viable": PASOS_CAPACIDAD + [
+        ("1", "✅ Según tus datos, podrías pagar hasta $9700.00 al mes en un nuevo crédito.\n\n"),
+        ("2", "💰 ¿De cuánto sería el crédito que te interesa solicitar?"),
+        ("300000", "📆 ¿En cuántos pagos (meses, quincenas, etc.) planeas pagarlo?"),
+        ("24", "📈 ¿Cuál es la tasa de interés por periodo? Ejemplo: para 2.5%, escribe 0.025"),
+        ("0.02", "❌ Actualmente no podrías pagar ese crédito.\n"
+                 "El pago mensual estimado sería de $15861.33, pero tu capacidad máxima es de $9700.00.\n\n"
+                 "🔧 Algunas alternativas para hacerlo viable:\n"
+                 "1. Reducir tus pagos fijos en al menos $6161.33.\n"
+                 "2. Aumentar tus ingresos mensuales en aproximadamente $10268.88.\n"
+                 "3. Pagar tus deudas revolventes (como tarjetas) en al menos $102688.83.\n\n"),
+    ],
+    "buro": [
+        ("8", "🟡 *Entender el Buró de Crédito*\n"),
+        ("sí", "📂 *Submenú: ¿Cómo mejorar mi historial crediticio?*\n"),
+        ("reporte", "Aquí tienes el enlace oficial para consultar tu reporte gratuito de Buró de Crédito: "
+                    "https://www.burodecredito.com.mx"),
+    ],
+    "textos_fijos": [
+        ("5", "🟡 *Consejos para pagar un crédito sin ahogarte*\n"),
+        ("7", "🟡 *Errores comunes al solicitar un crédito*\n"),
+        ("hola", "👋 Hola 😊"),
+    ],
+    "ofertas": [
+        ("6", "🟡 *Cómo identificar un crédito caro*\n"),
+        ("sí", "Escríbeme cada crédito en una línea con estos datos separados por /:\n"),
+        ("100000 / 0.02 / 24 / 2000 / 150\n100000 / 0.015 / 24",
+         "📊 Tus créditos del más barato al más caro, según su costo anual total (CAT):\n\n"
+         "🥇 *Crédito 2*: CAT 19.56%\n"),
+    ],
+    "varias_deudas": [
+        ("9", "Vamos a comparar formas de pagar tus deudas 💳\n\n"),
+        ("15000 / 0.035 / 900\n8000 / 0.02 / 400",
+         "Anoté 2 deuda(s); sus pagos mínimos suman $1300.00 al mes.\n\n"
+         "¿Cuánto puedes destinar en total cada mes a pagarlas?"),
+        ("2000", "📊 Así pagarías tus deudas con $2000 al mes:\n\n🏔️ *Avalancha* (primero la tasa más alta)\n"),
+    ],
+    "tasa_variable": [
+        ("10", "Vamos a ver qué tanto podría subir un crédito a tasa variable 📈\n\n"),
+        ("100000 / 0.01 / 24", "📊 Simulé "),
+    ],
+    "datos_invalidos": [
+        ("1", "Perfecto. Para comenzar, dime el monto del crédito que deseas simular."),
+        ("abc", "Por favor, escribe solo el monto del crédito en números (ejemplo: 100000)"),
+        ("-5", "La cantidad debe ser mayor que $0"),
+        ("100000", "¿A cuántos pagos (periodos) lo piensas pagar?"),
+        ("24", PREGUNTA_TASA),
+        ("x", "Por favor escribe la tasa como un número decimal. Ejemplo: 0.025 para 2.5%"),
+        ("0.02", "✅ Tu pago por periodo sería de: $5287.11\n"),
+    ],
+    "riesgo_invalido": PASOS_CAPACIDAD + [
+        ("4", "Por favor, escribe 1, 2 o 3 para indicar tu nivel de riesgo."),
+        ("2", "✅ Según tus datos, podrías pagar hasta $6700.00 al mes en un nuevo crédito.\n\n"),
+        ("3", "Por favor, escribe 1 para simular el monto máximo o 2 para validar un crédito que ya tienes en mente."),
+    ],
+    "menu_a_media_conversacion": [
+        ("1", "Perfecto. Para comenzar, dime el monto del crédito que deseas simular."),
+        ("100000", "¿A cuántos pagos (periodos) lo piensas pagar?"),
+        ("menú", "👋 Hola 😊"),
+        ("3", "Vamos a calcular el costo real de una compra a pagos fijos.\n"),
+    ],
+}
+
+# Estado en que queda la sesión al final de cada conversación
+# (None: el flujo terminó y la sesión se borró)
+ESTADO_FINAL = {
+    "credito_con_abonos": "repetir_abono",
+    "datos_invalidos": "ver_si_abonos",
+    "riesgo_invalido": "subopcion_prestamo",
+    "menu_a_media_conversacion": "precio_contado",
+}
+
+
+@pytest.fixture
+def almacen(monkeypatch):
+    almacen = AlmacenMemoria()
+    monkeypatch.setattr(bot_credito, "almacen_sesiones", almacen)
+    return almacen
+
+
+@pytest.mark.parametrize("nombre", sorted(CONVERSACIONES))
+def test_recorre_cada_flujo_del_menu(almacen, nombre):
+    numero = f"52155{nombre}"
+    for paso, (mensaje, esperado) in enumerate(CONVERSACIONES[nombre]):
+        respuesta = procesar_mensaje(mensaje, numero)
+        assert respuesta is not None, f"paso {paso}: {mensaje!r} sin respuesta"
+        assert respuesta.startswith(esperado), f"paso {paso}: {mensaje!r}"
+
+    sesion = almacen.obtener(numero)
+    esperando = sesion.get("esperando") if sesion else None
+    assert esperando == ESTADO_FINAL.get(nombre)
+
+
+def test_las_conversaciones_no_se_mezclan_entre_numeros(almacen):
+    procesar_mensaje("1", "521")
+    procesar_mensaje("3", "522")
+    assert procesar_mensaje("100000", "521") == "¿A cuántos pagos (periodos) lo piensas pagar?"
+    assert procesar_mensaje("1800", "522") == "2️⃣ ¿De cuánto será cada pago (por ejemplo: 250)?"
+
+
+def test_mensaje_fuera_de_flujo_no_tiene_respuesta(almacen):
+    assert procesar_mensaje("qué tal", "521") is None
+    assert almacen.obtener("521") is None
+
+
+def test_tabla_de_pagos_con_varios_plazos_y_tasas(almacen):
+    for mensaje in ("1", "100000", "12/24"):
+        procesar_mensaje(mensaje, "521")
+    respuesta = procesar_mensaje("0.02/0.03", "521")
+    assert "• 24 pagos de $5287.11 (total $126890.64, intereses $26890.64)" in respuesta
+    assert "📈 Tasa 0.03 por periodo:" in respuesta
+    assert almacen.obtener("521") is None
+
+# =========================================
+# Validación de la tabla de estados
+# =========================================
+
+def test_la_tabla_real_es_valida():
+    validar_flujo(ESTADOS, bot_credito.COMANDOS + MENU)
+    for estado in ESTADOS.values():
+        for siguiente in estado.siguientes:
+            assert siguiente in (FIN, SIN_CAMBIO) or siguiente in ESTADOS
+
+
+def test_validar_flujo_rechaza_estados_no_definidos():
+    estados = {"a": Estado("a", siguientes=("b",))}
+    with pytest.raises(ValueError, match="no definidos.*'b'"):
+        validar_flujo(estados, [Opcion(["1"], None, siguientes=("a",))])
+
+
+def test_validar_flujo_rechaza_estados_inalcanzables():
+    estados = {
+        "a": Estado("a", siguientes=(FIN,)),
+        "huerfano": Estado("huerfano", siguientes=("a",)),
+    }
+    with pytest.raises(ValueError, match="inalcanzables.*'huerfano'"):
+        validar_flujo(estados, [Opcion(["1"], None, siguientes=("a",))])
+
+
+def test_validar_flujo_acepta_ciclos_y_sin_cambio():
+    estados = {
+        "a": Estado("a", siguientes=("b", SIN_CAMBIO)),
+        "b": Estado("b", siguientes=("a", FIN)),
+    }
+    validar_flujo(estados, [Opcion(["1"], None, siguientes=("a",))])
+
+
+def test_flujos_por_estado_asigna_cada_paso_a_su_opcion():
+    estados = {
+        "a": Estado("a", siguientes=("b",)),
+        "b": Estado("b", siguientes=("a", FIN)),
+        "c": Estado("c", siguientes=(FIN,)),
+    }
+    opciones = [Opcion(["1", "uno"], None, siguientes=("a",)), Opcion(["2"], None, siguientes=("c",))]
+    assert flujos_por_estado(estados, opciones) == {"a": "opcion_1", "b": "opcion_1", "c": "opcion_2"}
+
+
+@pytest.mark.parametrize("estado, flujo", [
+    ("monto_credito", "opcion_1"),
+    ("repetir_abono", "opcion_1"),
+    ("numero_pagos", "opcion_3"),
+    ("tasa_deseada", "opcion_4"),
+    ("ofertas_lista", "opcion_6"),
+    ("submenu_buro", "opcion_8"),
+    ("deudas_presupuesto", "opcion_9"),
+    ("variable_datos", "opcion_10"),
+])
+def test_flujos_por_estado_en_el_menu_real(estado, flujo):
+    assert FLUJO_POR_ESTADO[estado] == flujo
+
+
+def test_todos_los_estados_pertenecen_a_un_flujo():
+    assert set(FLUJO_POR_ESTADO) == set(ESTADOS)
@@ -0,0 +1,73 @@
+# =========================================
+# Pruebas: lectura de las notificaciones del webhook
+# Autora: Dra. Jazmín Sandoval
+# =========================================
+
+import pytest
+
+from mensajes_webhook import agrupar_mensajes, recorrer_mensajes
+
+
+def notificacion(*mensajes):
+    return {"entry": [{"changes": [{"value": {"messages": list(mensajes)}}]}]}
+
+
+def mensaje(numero, texto, timestamp="1", id_mensaje=None):
+    datos = {"from": numero, "timestamp": timestamp, "type": "text", "text": {"body": texto}}
+    if id_mensaje is not None:
+        datos["id"] = id_mensaje
+    return datos
+
+
+def test_lee_todos_los_mensajes_de_texto():
+    data = {"entry": [
+        {"changes": [{"value": {"messages": [mensaje("521", " Hola ", "5", "wamid.1")]}}]},
+        {"changes": [{"value": {"statuses": [{"status": "read"}]}},
+                     {"value": {"messages": [mensaje("522", "1", "6", "wamid.2"), {"from": "523", "type": "image"}]}}]},
+    ]}
+    assert list(recorrer_mensajes(data)) == [("521", "hola", 5, "wamid.1"), ("522", "1", 6, "wamid.2")]
+
+
+@pytest.mark.parametrize("data", [
+    None,
+    5,
+    [1],
+    {"entry": 5},
+    {"entry": {"changes": []}},
+    {"entry": [5, "x"]},
+    {"entry": [{"changes": 5}]},
+    {"entry": [{"changes": [5, {"value": 5}]}]},
+    {"entry": [{"changes": [{"value": {"messages": 5}}]}]},
+    {"entry": [{"changes": [{"value": {"messages": {"from": "521"}}}]}]},
+    notificacion(5, "x", [1], {"from": 5, "text": {"body": "hola"}}, {"from": "521", "text": "hola"}),
+])
+def test_entregas_con_otra_forma_se_saltan(data):
+    assert list(recorrer_mensajes(data)) == []
+
+
+def test_timestamp_invalido_queda_en_cero():
+    data = notificacion(mensaje("521", "hola", "ayer"), mensaje("521", "menú", float("inf")))
+    assert [timestamp for _, _, timestamp, _ in recorrer_mensajes(data)] == [0, 0]
+
+
+def test_agrupa_por_remitente_en_orden_de_timestamp():
+    data = notificacion(
+        mensaje("521", "segundo", "2"), mensaje("522", "otro", "1"),
+        mensaje("521", "primero", "1"), mensaje("521", "tercero", "2"),
+    )
+    assert agrupar_mensajes(recorrer_mensajes(data)) == {
+        "521": ["primero", "segundo", "tercero"],
+        "522": ["otro"],
+    }
+
+
+@pytest.mark.parametrize("data", [
+    {"entry": 5},
+    {"entry": [{"changes": [{"value": {"messages": 5}}]}]},
+    notificacion(5, {"from": 5, "text": {"body": "hola"}}),
+])
+def test_webhook_responde_200_a_entregas_mal_formadas(data):
+    import bot_credito
+
+    respuesta = bot_credito.app.test_client().post("/webhook", json=data)
+    assert respuesta.status_code == 200
@@ -0,0 +1,151 @@
+# =========================================
+# Pruebas: métricas estilo Prometheus
+# Autora: Dra. Jazmín Sandoval
+# =========================================
+
+import json
+import logging
+import os
+import threading
+from multiprocessing import get_context
+
+import pytest
+
+from metricas import Registro
+
+
+def lineas_de(texto):
+    # {"nombre{etiquetas}": "valor"} sin los comentarios HELP/TYPE
+    return dict(linea.rsplit(" ", 1) for linea in texto.splitlines() if not linea.startswith("#"))
+
+
+def registro_de_prueba(directorio=""):
+    metricas = Registro(directorio=directorio, intervalo=3600)
+    metricas.contador("pruebas_total", "Mensajes de prueba", ("tipo",))
+    metricas.histograma("pruebas_segundos", "Duración", ("paso",), limites=(0.1, 1.0))
+    return metricas
+
+
+def test_suma_los_fragmentos_de_cada_hilo():
+    metricas = registro_de_prueba()
+    contador = metricas._metricas["pruebas_total"]
+    histograma = metricas._metricas["pruebas_segundos"]
+    listos = threading.Barrier(9)
+    salir = threading.Event()
+
+    def trabajar(i):
+        for _ in range(100):
+            contador.incrementar("texto")
+        histograma.observar(0.05 if i % 2 else 0.5, "paso")
+        listos.wait()
+        salir.wait()
+
+    hilos = [threading.Thread(target=trabajar, args=(i,)) for i in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    listos.wait()
+    contador.incrementar("texto", cantidad=5)
+
+    lineas = lineas_de(metricas.exponer())
+    assert lineas['pruebas_total{tipo="texto"}'] == "805"
+    assert lineas['pruebas_segundos_bucket{paso="paso",le="0.1"}'] == "4"
+    assert lineas['pruebas_segundos_bucket{paso="paso",le="1"}'] == "8"
+    assert lineas['pruebas_segundos_bucket{paso="paso",le="+Inf"}'] == "8"
+    assert lineas['pruebas_segundos_count{paso="paso"}'] == "8"
+    assert float(lineas['pruebas_segundos_sum{paso="paso"}']) == pytest.approx(2.2)
+
+    # Al terminar, sus fragmentos se juntan en uno sin perder nada
+    salir.set()
+    for hilo in hilos:
+        hilo.join()
+    assert lineas_de(metricas.exponer())['pruebas_total{tipo="texto"}'] == "805"
+    assert len(metricas._fragmentos) == 1
+    assert lineas_de(metricas.exponer())['pruebas_segundos_count{paso="paso"}'] == "8"
+
+
+def _proceso_hijo(metricas):
+    # Tras el fork el hijo empieza de cero, cuenta lo suyo y lo vuelca
+    metricas._metricas["pruebas_total"].incrementar("texto", cantidad=7)
+    metricas._metricas["pruebas_segundos"].observar(2.0, "paso")
+    metricas.volcar()
+
+
+def escribir_volcado(directorio, pid, valores, medidores=()):
+    with open(os.path.join(directorio, f"{pid}.json"), "w", encoding="utf-8") as archivo:
+        json.dump({"valores": list(valores), "medidores": list(medidores)}, archivo)
+
+
+def test_suma_los_volcados_de_cada_proceso(tmp_path):
+    metricas = registro_de_prueba(str(tmp_path))
+    pendientes = {"valor": 3}
+    metricas.medidor("pruebas_pendientes", "Por proceso", lambda: pendientes["valor"], por_proceso=True)
+    metricas.medidor("pruebas_sesiones", "Compartido", lambda: 11)
+    metricas._metricas["pruebas_total"].incrementar("texto", cantidad=2)
+
+    # Un worker que ya terminó: sus contadores cuentan, sus medidores no
+    hijo = get_context("fork").Process(target=_proceso_hijo, args=(metricas,))
+    hijo.start()
+    hijo.join()
+    assert hijo.exitcode == 0
+    with open(tmp_path / f"{hijo.pid}.json", encoding="utf-8") as archivo:
+        volcado = json.load(archivo)
+    volcado["medidores"] = [["pruebas_pendientes", [], 100]]
+    escribir_volcado(tmp_path, hijo.pid, volcado["valores"], volcado["medidores"])
+
+    # Un worker vivo (el padre de pytest sirve) con sus propios valores
+    escribir_volcado(
+        tmp_path, os.getppid(),
+        [["pruebas_total", ["texto"], 10], ["pruebas_total", ["imagen"], 1],
+         ["pruebas_segundos", ["paso"], [1, 0, 0, 0.05]]],
+        [["pruebas_pendientes", [], 4]],
+    )
+    # Archivos que no son volcados se ignoran
+    (tmp_path / "notas.txt").write_text("x")
+    (tmp_path / "123.json.tmp").write_text("{")
+    escribir_volcado(tmp_path, os.getpid(), [["pruebas_total", ["texto"], 1000]])
+
+    lineas = lineas_de(metricas.exponer())
+    assert lineas['pruebas_total{tipo="texto"}'] == "19"
+    assert lineas['pruebas_total{tipo="imagen"}'] == "1"
+    assert lineas['pruebas_segundos_bucket{paso="paso",le="0.1"}'] == "1"
+    assert lineas['pruebas_segundos_bucket{paso="paso",le="+Inf"}'] == "2"
+    assert float(lineas['pruebas_segundos_sum{paso="paso"}']) == pytest.approx(2.05)
+    assert lineas["pruebas_pendientes"] == "7"
+    assert lineas["pruebas_sesiones"] == "11"
+
+
+def test_volcar_escribe_el_archivo_del_proceso(tmp_path):
+    metricas = registro_de_prueba(str(tmp_path))
+    metricas._metricas["pruebas_total"].incrementar("texto", cantidad=4)
+    metricas.volcar()
+    with open(tmp_path / f"{os.getpid()}.json", encoding="utf-8") as archivo:
+        assert json.load(archivo)["valores"] == [["pruebas_total", ["texto"], 4]]
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_medidor_con_error_se_registra_y_no_rompe_la_exposicion(caplog):
+    metricas = registro_de_prueba()
+    metricas.medidor("pruebas_roto", "Falla", lambda: 1 / 0)
+    metricas._metricas["pruebas_total"].incrementar("texto")
+    with caplog.at_level(logging.ERROR, logger="metricas"):
+        lineas = lineas_de(metricas.exponer())
+    assert lineas['pruebas_total{tipo="texto"}'] == "1"
+    assert "pruebas_roto" not in lineas
+    [error] = [r for r in caplog.records if r.name == "metricas"]
+    assert "pruebas_roto" in error.getMessage()
+    assert error.exc_info[0] is ZeroDivisionError
+
+
+def test_metrica_repetida():
+    metricas = registro_de_prueba()
+    with pytest.raises(ValueError):
+        metricas.contador("pruebas_total", "Otra vez")
+
+
+def test_etiquetas_y_ayuda_escapadas():
+    metricas = Registro(directorio="")
+    contador = metricas.contador("pruebas_escape_total", 'Línea 1\nruta C:\\x', ("texto",))
+    contador.incrementar('di "hola"\n')
+    texto = metricas.exponer()
+    assert "# HELP pruebas_escape_total Línea 1\\nruta C:\\\\x" in texto
+    assert 'pruebas_escape_total{texto="di \\"hola\\"\\n"} 1' in texto
@@ -0,0 +1,63 @@
+# =========================================
+# Pruebas: comparador de ofertas de crédito
+# Autora: Dra. Jazmín Sandoval
+# =========================================
+
+import json
+
+import pytest
+
+from ofertas import FRECUENCIAS, comparar_ofertas, preparar_oferta, validar_frecuencia
+from simulaciones import simular_escenario
+from validacion import ErrorValidacion
+
+
+def test_prepara_la_oferta_en_float():
+    oferta = {"monto": 10000, "tasa": "0.02", "plazo": 12, "comision_apertura": 200,
+              "comision_periodica": 10, "seguro": 5, "frecuencia": "quincenal"}
+    assert preparar_oferta(oferta) == (10000.0, 0.02, 12, 200.0, 15.0, 24)
+    assert preparar_oferta({"monto": 1, "tasa": 0.01, "plazo": 1})[-1] == FRECUENCIAS["mensual"]
+
+
+@pytest.mark.parametrize("frecuencia", ["diaria", ["mensual"], {"mensual": 12}, 12, None])
+def test_frecuencia_invalida(frecuencia):
+    with pytest.raises(ErrorValidacion) as error:
+        validar_frecuencia(frecuencia)
+    assert error.value.motivo == "frecuencia"
+
+
+def test_ordena_por_cat_y_separa_errores():
+    resultado = comparar_ofertas([
+        {"nombre": "Cara", "monto": 10000, "tasa": 0.03, "plazo": 12},
+        {"monto": 10000, "tasa": 0.02, "plazo": 12, "frecuencia": ["mensual"]},
+        {"nombre": "Barata", "monto": 10000, "tasa": 0.02, "plazo": 12},
+        "no es oferta",
+        {"nombre": "Con comisión", "monto": 10000, "tasa": 0.02, "plazo": 12, "comision_apertura": 500},
+    ])
+    assert [oferta["nombre"] for oferta in resultado["ofertas"]] == ["Barata", "Con comisión", "Cara"]
+    assert [oferta["lugar"] for oferta in resultado["ofertas"]] == [1, 2, 3]
+    assert all(oferta["convergio"] for oferta in resultado["ofertas"])
+    assert [(error["oferta"], error["motivo"]) for error in resultado["errores"]] == [(2, "frecuencia"), (4, "formato")]
+
+
+def test_cat_sin_comisiones_es_la_tasa_efectiva():
+    oferta = comparar_ofertas([{"monto": 10000, "tasa": 0.02, "plazo": 12}])["ofertas"][0]
+    assert oferta["pago_credito"] == 945.6
+    assert oferta["cat"] == pytest.approx((1.02 ** 12 - 1) * 100, abs=0.01)
+
+
+def test_api_reporta_frecuencia_no_texto_como_error():
+    import bot_credito
+
+    cliente = bot_credito.app.test_client()
+    respuesta = cliente.post("/comparar-ofertas", json={"ofertas": [
+        {"monto": 10000, "tasa": 0.02, "plazo": 12, "frecuencia": {"a": 1}},
+    ]})
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()["errores"][0]["motivo"] == "frecuencia"
+
+
+def test_simulacion_de_credito_tienda_con_frecuencia_lista():
+    linea = json.loads(simular_escenario(1, {"tipo": "credito_tienda", "precio": 1000, "pago": 100,
+                                             "plazo": 12, "frecuencia": ["semanal"]}))
+    assert linea["motivo"] == "frecuencia"
@@ -0,0 +1,186 @@
+# =========================================
+# Pruebas: almacenes de sesiones
+# Autora: Dra. Jazmín Sandoval
+# =========================================
+
+import math
+import random
+from decimal import Decimal
+
+import pytest
+
+import sesiones
+from sesiones import (
+    AlmacenMemoria,
+    RuedaTiempos,
+    ServidorRespLocal,
+    crear_almacen_sesiones,
+    deserializar_contexto,
+    serializar_contexto
+)
+
+
+class Elemento:
+    def __init__(self, nombre, expira):
+        self.nombre = nombre
+        self.expira = expira
+        self.ranura = None
+
+
+class RelojFalso:
+    def __init__(self, inicio=1000.0):
+        self.ahora = inicio
+
+    def monotonic(self):
+        return self.ahora
+
+    def time(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = RelojFalso()
+    monkeypatch.setattr(sesiones, "time", reloj)
+    return reloj
+
+# =========================================
+# Rueda de tiempos contra un diccionario de referencia
+# =========================================
+
+@pytest.mark.parametrize("semilla", range(5))
+def test_rueda_vence_igual_que_la_referencia(semilla):
+    # Rueda chica (4 ranuras, 3 niveles = 64 ticks) para que haya
+    # repartos entre niveles y elementos lejanos
+    aleatorio = random.Random(semilla)
+    ahora = 37.0
+    rueda = RuedaTiempos(ahora, resolucion=1.0, ranuras=4, niveles=3)
+    referencia = {}
+    contador = 0
+    for _ in range(3000):
+        accion = aleatorio.random()
+        if accion < 0.5:
+            contador += 1
+            elemento = Elemento(contador, ahora + aleatorio.choice([0.2, 1, 3.5, 15, 63, 64, 200, 5000]) * aleatorio.random())
+            rueda.agregar(elemento)
+            referencia[contador] = elemento
+        elif accion < 0.6 and referencia:
+            elemento = referencia.pop(aleatorio.choice(list(referencia)))
+            rueda.quitar(elemento)
+        else:
+            ahora += aleatorio.choice([0.3, 1, 2, 7, 70, 300])
+            vencidos = {elemento.nombre for elemento in rueda.avanzar(ahora)}
+            # Vence cuando su tick (hacia arriba) ya pasó: ni antes ni después
+            esperados = {
+                nombre for nombre, elemento in referencia.items()
+                if max(math.ceil(elemento.expira), 0) <= math.floor(ahora)
+            }
+            assert vencidos == esperados
+            for nombre in vencidos:
+                del referencia[nombre]
+        assert len(rueda) == len(referencia)
+
+
+def test_rueda_nunca_vence_antes_de_tiempo():
+    rueda = RuedaTiempos(0.0, resolucion=1.0, ranuras=4, niveles=2)
+    elemento = Elemento("a", 10.5)
+    rueda.agregar(elemento)
+    assert rueda.avanzar(10.9) == []
+    assert rueda.avanzar(11.0) == [elemento]
+    assert len(rueda) == 0 and elemento.ranura is None
+
+# =========================================
+# Almacén en memoria
+# =========================================
+
+def test_memoria_expira_y_cuenta(reloj):
+    almacen = AlmacenMemoria(ttl=60, maximo=10)
+    almacen.guardar("521", {"esperando": "monto", "tasa": 1})
+    almacen.guardar("522", {})
+    reloj.ahora += 30
+    assert almacen.obtener("521") == {"esperando": "monto", "tasa": 1}
+    almacen.guardar("521", {"esperando": "plazo"})  # renueva la expiración
+    reloj.ahora += 31
+    assert almacen.obtener("522") is None
+    assert almacen.obtener("521") == {"esperando": "plazo"}
+    almacen.borrar("521")
+    assert almacen.contar() == 0
+    assert almacen.estadisticas() == {
+        "activas": 0, "creadas": 2, "completadas": 1, "expiradas": 1, "desalojadas": 0,
+    }
+
+
+def test_memoria_desaloja_la_usada_hace_mas_tiempo(reloj):
+    almacen = AlmacenMemoria(ttl=60, maximo=3)
+    for numero in ("1", "2", "3"):
+        almacen.guardar(numero, {"n": numero})
+        reloj.ahora += 1
+    almacen.obtener("1")           # "2" queda como la menos reciente
+    almacen.guardar("4", {"n": "4"})
+    assert almacen.obtener("2") is None
+    assert [almacen.obtener(numero) for numero in ("1", "3", "4")] == [{"n": "1"}, {"n": "3"}, {"n": "4"}]
+    assert almacen.estadisticas()["desalojadas"] == 1
+    # Lo desalojado ya no está en la rueda: no vence dos veces
+    reloj.ahora += 120
+    assert almacen.limpiar_expiradas() == 3
+    assert almacen.estadisticas()["expiradas"] == 3
+
+
+def test_memoria_comparte_las_formas_del_contexto(reloj):
+    almacen = AlmacenMemoria(ttl=60)
+    almacen.guardar("1", {"esperando": "plazo", "monto": 1, "tasa": 2})
+    almacen.guardar("2", {"esperando": "plazo", "monto": 3, "tasa": 4})
+    assert almacen._sesiones["1"].forma is almacen._sesiones["2"].forma
+    assert almacen._sesiones["1"].estado == almacen._sesiones["2"].estado
+
+# =========================================
+# Almacenes compartidos: SQLite y RESP
+# =========================================
+
+CONTEXTO = {
+    "esperando": "plazo",
+    "monto": Decimal("150000.50"),
+    "tasas": [Decimal("0.0125"), Decimal("0.02")],
+    "punto": {"pago_fijo": Decimal("5287.11"), "puntos": [[Decimal("100000"), Decimal("0.00")]]},
+    "nombre": "Ñandú",
+}
+
+
+@pytest.fixture(params=["memoria", "sqlite", "redis"])
+def almacen(request, reloj, tmp_path):
+    if request.param == "memoria":
+        yield AlmacenMemoria(ttl=60)
+    elif request.param == "sqlite":
+        yield crear_almacen_sesiones(f"sqlite:///{tmp_path / 'sesiones.db'}", ttl=60)
+    else:
+        servidor = ServidorRespLocal()
+        host, puerto = servidor.iniciar()
+        yield crear_almacen_sesiones(f"redis://{host}:{puerto}/0", ttl=60)
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def test_contexto_con_decimal_ida_y_vuelta(almacen):
+    almacen.guardar("521", CONTEXTO)
+    recuperado = almacen.obtener("521")
+    assert recuperado == CONTEXTO
+    assert isinstance(recuperado["monto"], Decimal)
+    assert str(recuperado["punto"]["puntos"][0][1]) == "0.00"
+    assert almacen.obtener("522") is None
+
+
+def test_borrar_expirar_y_contar(almacen, reloj):
+    almacen.guardar("521", {"esperando": "monto"})
+    almacen.guardar("522", {"esperando": "tasa"})
+    assert almacen.contar() == 2
+    almacen.borrar("521")
+    assert almacen.obtener("521") is None
+    reloj.ahora += 61
+    assert almacen.obtener("522") is None
+    assert almacen.contar() == 0
+
+
+def test_contexto_que_no_es_json():
+    with pytest.raises(TypeError):
+        serializar_contexto({"fecha": object()})
+    assert deserializar_contexto(serializar_contexto(CONTEXTO)) == CONTEXTO
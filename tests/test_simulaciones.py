@@ -0,0 +1,204 @@
+# =========================================
+# Pruebas: simulaciones en lote y /api/v1/simular
+# Autora: Dra. Jazmín Sandoval
+# =========================================
+
+import json
+
+import pytest
+
+import bot_credito
+import simulaciones
+from simulaciones import simular_escenario, simular_lote
+
+
+class PendienteFalso:
+    # Como un Future del grupo de procesos, pero el bloque se calcula
+    # hasta que se pide el resultado
+    def __init__(self, funcion, argumentos):
+        self.funcion = funcion
+        self.argumentos = argumentos
+        self.cancelado = False
+        self.calculado = False
+
+    def result(self):
+        assert not self.cancelado
+        self.calculado = True
+        return self.funcion(*self.argumentos)
+
+    def cancel(self):
+        self.cancelado = True
+        return True
+
+
+class GrupoFalso:
+    def __init__(self):
+        self.enviados = []
+
+    def submit(self, funcion, *argumentos):
+        pendiente = PendienteFalso(funcion, argumentos)
+        self.enviados.append(pendiente)
+        return pendiente
+
+
+@pytest.fixture
+def grupo(monkeypatch):
+    grupo = GrupoFalso()
+    monkeypatch.setattr(simulaciones, "grupo_procesos", lambda: grupo)
+    monkeypatch.setattr(simulaciones, "PROCESOS_SIMULACION", 4)
+    monkeypatch.setattr(simulaciones, "BLOQUE_SIMULACIONES", 2)
+    monkeypatch.setattr(simulaciones, "SIMULACIONES_EN_VUELO", 3)
+    return grupo
+
+
+def pago_fijo(monto, indice=None):
+    escenario = {"tipo": "pago_fijo", "monto": monto, "tasa": 0.02, "plazo": 24}
+    if indice is not None:
+        escenario["id"] = indice
+    return escenario
+
+
+ESCENARIOS_MIXTOS = [
+    pago_fijo(100000, "a"),
+    {"tipo": "pago_fijo", "monto": -5, "tasa": 0.02, "plazo": 24},
+    {"tipo": "hipoteca"},
+    ["no", "es", "objeto"],
+    {"tipo": "pago_fijo", "monto": "cien", "tasa": 0.02, "plazo": 24},
+    {"tipo": "credito_tienda", "precio": 1800, "pago": 250, "plazo": 10},
+    {"tipo": "capacidad", "ingreso": 20000, "pagos_fijos": 2000, "deuda_revolvente": 5000, "riesgo": 1,
+     "monto": 300000, "tasa": 0.02, "plazo": 24},
+]
+
+
+def lineas(texto):
+    return [json.loads(linea) for linea in texto.splitlines()]
+
+# =========================================
+# Orden y errores por línea
+# =========================================
+
+def test_errores_por_linea_sin_detener_el_resto():
+    resultado = lineas("".join(simular_lote(ESCENARIOS_MIXTOS, paralelo=False)))
+    assert [linea["indice"] for linea in resultado] == list(range(1, len(ESCENARIOS_MIXTOS) + 1))
+    assert resultado[0] == {"indice": 1, "id": "a", "tipo": "pago_fijo", "resultado": {"pago": 5287.11}}
+    assert [linea.get("motivo") for linea in resultado] == [
+        None, "monto_fuera_de_rango", "tipo", "formato", "no_numero", None, None
+    ]
+    assert resultado[5]["resultado"]["total_pagado"] == 2500.0
+    assert resultado[6]["resultado"]["se_puede_pagar"] is False
+    assert resultado[6]["resultado"]["pago"] == 15861.33
+
+
+def test_con_y_sin_procesos_da_lo_mismo_y_en_orden(grupo):
+    escenarios = [pago_fijo(1000 * (i + 1), i) for i in range(11)] + ESCENARIOS_MIXTOS
+    en_serie = "".join(simular_lote(escenarios, paralelo=False))
+    assert "".join(simular_lote(escenarios, paralelo=True)) == en_serie
+    assert [linea["id"] for linea in lineas(en_serie)[:11]] == list(range(11))
+    assert len(grupo.enviados) == 9
+
+
+def test_lineas_ndjson_que_no_son_json():
+    texto = "".join(simular_lote([json.dumps(pago_fijo(1000)), "{no es json", b'{"tipo": "pago_fijo"}']))
+    resultado = lineas(texto)
+    assert [linea["indice"] for linea in resultado] == [1, 2, 3]
+    assert "resultado" in resultado[0]
+    assert resultado[1]["motivo"] == "formato"
+    assert "error" in resultado[2]
+
+
+def test_limite_de_escenarios_no_lee_los_demas(grupo):
+    leidos = []
+
+    def escenarios():
+        for i in range(100):
+            leidos.append(i)
+            yield pago_fijo(1000 + i)
+
+    resultado = lineas("".join(simular_lote(escenarios(), paralelo=False, limite=5)))
+    assert [linea["indice"] for linea in resultado] == [1, 2, 3, 4, 5, 6]
+    assert resultado[-1]["motivo"] == "demasiados_escenarios"
+    assert len(leidos) <= 6
+
+# =========================================
+# Bloques en vuelo y cancelación
+# =========================================
+
+def test_no_hay_mas_de_simulaciones_en_vuelo_bloques_pendientes(grupo):
+    leidos = []
+
+    def escenarios():
+        for i in range(40):
+            leidos.append(i)
+            yield pago_fijo(1000 + i)
+
+    generador = simular_lote(escenarios(), paralelo=True)
+    for entregados in range(1, 21):
+        next(generador)
+        # Cada bloque entregado ya se calculó; los demás siguen pendientes
+        pendientes = [p for p in grupo.enviados if not p.calculado]
+        assert len(pendientes) <= simulaciones.SIMULACIONES_EN_VUELO
+        assert len(grupo.enviados) <= entregados + simulaciones.SIMULACIONES_EN_VUELO
+        assert len(leidos) <= 2 * (entregados + simulaciones.SIMULACIONES_EN_VUELO)
+    with pytest.raises(StopIteration):
+        next(generador)
+
+
+def test_al_desconectarse_se_cancelan_los_bloques_pendientes(grupo):
+    generador = simular_lote([pago_fijo(1000 + i) for i in range(40)], paralelo=True)
+    next(generador)
+    generador.close()
+    pendientes = [p for p in grupo.enviados if not p.calculado]
+    assert pendientes
+    assert all(p.cancelado for p in pendientes)
+    assert len(grupo.enviados) < 20
+
+# =========================================
+# POST /api/v1/simular
+# =========================================
+
+def test_api_con_json(grupo):
+    respuesta = bot_credito.app.test_client().post("/api/v1/simular", json={"escenarios": ESCENARIOS_MIXTOS})
+    assert respuesta.status_code == 200
+    assert respuesta.mimetype == "application/x-ndjson"
+    assert respuesta.get_data(as_text=True) == "".join(simular_lote(ESCENARIOS_MIXTOS, paralelo=False))
+
+
+def test_api_con_ndjson_en_orden(grupo):
+    cuerpo = "\n".join(json.dumps(pago_fijo(1000 + i, i)) for i in range(9)) + "\n{roto\n\n"
+    respuesta = bot_credito.app.test_client().post(
+        "/api/v1/simular", data=cuerpo, content_type="application/x-ndjson"
+    )
+    resultado = lineas(respuesta.get_data(as_text=True))
+    assert [linea["indice"] for linea in resultado] == list(range(1, 11))
+    assert [linea.get("id") for linea in resultado[:9]] == list(range(9))
+    assert resultado[-1]["motivo"] == "formato"
+
+
+def test_api_al_desconectarse_cancela(grupo):
+    escenarios = "".join(json.dumps(pago_fijo(1000 + i)) + "\n" for i in range(40))
+    respuesta = bot_credito.app.test_client().post(
+        "/api/v1/simular", data=escenarios, content_type="application/x-ndjson", buffered=False
+    )
+    primera = next(iter(respuesta.response))
+    assert json.loads(primera.splitlines()[0])["indice"] == 1
+    respuesta.close()
+    pendientes = [p for p in grupo.enviados if not p.calculado]
+    assert pendientes and all(p.cancelado for p in pendientes)
+
+
+@pytest.mark.parametrize("cuerpo", [{"escenarios": "no"}, {"otra": []}, []])
+def test_api_rechaza_cuerpos_sin_lista(cuerpo):
+    respuesta = bot_credito.app.test_client().post("/api/v1/simular", json=cuerpo)
+    assert respuesta.status_code == 400
+
+
+def test_api_rechaza_demasiados_escenarios(monkeypatch):
+    monkeypatch.setattr(bot_credito, "MAX_SIMULACIONES", 3)
+    respuesta = bot_credito.app.test_client().post("/api/v1/simular", json={"escenarios": [pago_fijo(1)] * 4})
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()["motivo"] == "demasiados_escenarios"
+
+
+def test_simular_escenario_conserva_el_id():
+    linea = json.loads(simular_escenario(7, pago_fijo(100000, "x-1")))
+    assert (linea["indice"], linea["id"]) == (7, "x-1")
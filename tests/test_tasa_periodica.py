@@ -0,0 +1,78 @@
+# =========================================
+# Pruebas: tasa implícita (RATE de Excel), escalar y por lote
+# Autora: Dra. Jazmín Sandoval
+# =========================================
+
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from calculos import calcular_costo_credito_tienda, resolver_tasa_periodica
+from calculos_lote import calcular_costo_credito_tienda_lote, resolver_tasas_periodicas
+
+CASOS = [
+    (10000, 945.60, 12, 0.02),
+    (1000, 100, 10, 0.0),
+    (1e9, 2e6, 1200, None),
+    (293366244.54, 220024683.40, 728, 0.75),
+    (35959536065.73, 97341.21, 651, None),   # tasa muy negativa
+    (6272.27, 0.06, 347, None),
+]
+
+
+@pytest.mark.parametrize("precio, cuota, plazo, esperada", CASOS)
+def test_converge_y_cuadra_con_la_cuota(precio, cuota, plazo, esperada):
+    tasa, _, convergio = resolver_tasa_periodica(precio, cuota, plazo)
+    assert convergio
+    if esperada is not None:
+        assert tasa == pytest.approx(esperada, abs=1e-6)
+    if abs(tasa) > 1e-8:
+        assert cuota * (1 - (1 + tasa) ** -plazo) / tasa == pytest.approx(precio, rel=1e-9)
+
+
+def test_lote_igual_a_la_version_escalar():
+    aleatorio = np.random.default_rng(7)
+    precios = np.round(10 ** aleatorio.uniform(0, 12, 2000), 2)
+    plazos = aleatorio.integers(1, 1201, 2000).astype(float)
+    cuotas = np.maximum(np.round(precios / plazos * 10 ** aleatorio.uniform(-3, 4, 2000), 2), 0.01)
+    tasas, _, convergio = resolver_tasas_periodicas(precios, cuotas, plazos)
+    assert convergio.all()
+    for i in range(0, 2000, 50):
+        tasa, _, _ = resolver_tasa_periodica(precios[i], cuotas[i], int(plazos[i]))
+        assert tasas[i] == pytest.approx(tasa, abs=1e-11)
+
+
+def test_datos_no_positivos():
+    with pytest.raises(ValueError):
+        resolver_tasa_periodica(0, 100, 12)
+    with pytest.raises(ValueError):
+        resolver_tasas_periodicas([1000, 1000], [100, -1], 12)
+
+
+def test_costo_tienda_por_lote_igual_al_de_una_oferta():
+    ofertas = [
+        (1800, 250, 10),
+        (Decimal("12999.90"), Decimal("749"), 24),
+        (1800, 250, 10),                  # repetida
+        (-5, 100, 12),                    # fuera de límites
+        (5000, 100, 50),                  # sin intereses
+        (10000, 945.60, 12),
+        (1000, 10, 12),                   # tasa negativa
+    ]
+    resultados = calcular_costo_credito_tienda_lote(ofertas, periodos_por_anio=24)
+    assert len(resultados) == len(ofertas)
+    assert "error" in resultados[3]
+    for oferta, resultado in zip(ofertas, resultados):
+        if "error" in resultado:
+            continue
+        assert resultado["convergio"] and resultado["iteraciones"] >= 1
+        esperado = calcular_costo_credito_tienda(*oferta, periodos_por_anio=24)
+        obtenido = (resultado["total_pagado"], resultado["intereses"], resultado["tasa_periodo"], resultado["tasa_anual"])
+        assert obtenido == esperado
+    assert resultados[0] == resultados[2]
+
+
+def test_costo_tienda_por_lote_sin_ofertas_validas():
+    assert calcular_costo_credito_tienda_lote([]) == []
+    assert [list(r) for r in calcular_costo_credito_tienda_lote([(0, 100, 12), (100, 10, 0)])] == [["error"], ["error"]]
@@ -0,0 +1,62 @@
+# =========================================
+# Pruebas: simulación de créditos con tasa variable
+# Autora: Dra. Jazmín Sandoval
+# =========================================
+
+import pytest
+
+import tasa_variable
+from calculos import detalle_ahorro_por_abonos
+from tasa_variable import simular_tasa_variable
+from validacion import TASA_MINIMA, ErrorValidacion
+
+
+@pytest.mark.parametrize("monto, tasa, plazo, abono, desde", [
+    (100000, 0.02, 24, 500, 3),
+    (1000000, 0.01, 240, 0, 1),
+    (1000000, 0.01, 240, 2500, 1),
+    (250000, 0.015, 120, 5000, 10),
+    (37691.02, 0.0057, 102, 0, 18),
+])
+def test_con_tasa_fija_da_lo_de_calcular_ahorro_por_abonos(monto, tasa, plazo, abono, desde):
+    simulacion = simular_tasa_variable(monto, tasa, plazo, caminos=10, abono_extra=abono, desde_periodo=desde,
+                                       volatilidad=0, choque=0)
+    detalle = detalle_ahorro_por_abonos(monto, tasa, plazo, abono, desde)
+    pago_mas_alto = float(max(detalle["pago_fijo"], detalle["ultimo_pago"]))
+    intereses = float(detalle["intereses_totales"])
+    assert simulacion["tasa_fija"]["intereses"] == pytest.approx(intereses, abs=0.05)
+    assert set(simulacion["intereses"].values()) == {simulacion["tasa_fija"]["intereses"]}
+    assert list(simulacion["pago_maximo"].values()) == pytest.approx([pago_mas_alto] * 3, abs=0.01)
+
+
+def test_los_abonos_bajan_los_intereses():
+    sin_abonos = simular_tasa_variable(500000, 0.012, 240, caminos=2000, modelo="choques")
+    con_abonos = simular_tasa_variable(500000, 0.012, 240, caminos=2000, modelo="choques",
+                                       abono_extra=2000, desde_periodo=12)
+    for p in ("p5", "p50", "p95"):
+        assert con_abonos["intereses"][p] < sin_abonos["intereses"][p]
+    assert sin_abonos["pago_maximo"]["p95"] > sin_abonos["tasa_fija"]["pago"]
+
+
+def test_misma_semilla_mismo_resultado():
+    primera = simular_tasa_variable(300000, 0.01, 180, caminos=3000, modelo="choques", semilla=7)
+    assert simular_tasa_variable(300000, 0.01, 180, caminos=3000, modelo="choques", semilla=7) == primera
+    assert simular_tasa_variable(300000, 0.01, 180, caminos=3000, modelo="choques", semilla=8) != primera
+
+
+def test_con_y_sin_procesos_da_lo_mismo(monkeypatch):
+    # Bloques chicos para que haya varios y se repartan entre procesos
+    monkeypatch.setattr(tasa_variable, "CAMINOS_POR_BLOQUE", 700)
+    argumentos = dict(monto=200000, tasa=0.015, plazo=60, caminos=3000, modelo="choques", semilla=3)
+    en_serie = simular_tasa_variable(**argumentos, paralelo=False)
+    assert simular_tasa_variable(**argumentos, paralelo=True) == en_serie
+
+
+def test_limites():
+    with pytest.raises(ErrorValidacion):
+        simular_tasa_variable(100000, 0.02, 24, caminos=0)
+    with pytest.raises(ValueError):
+        simular_tasa_variable(100000, 0.02, 24, modelo="otro")
+    # La tasa mínima del simulador es la de validación
+    simulacion = simular_tasa_variable(100000, TASA_MINIMA, 12, caminos=100, media=-1)
+    assert simulacion["intereses"]["p95"] == pytest.approx(simulacion["tasa_fija"]["intereses"], abs=0.01)
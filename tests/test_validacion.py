@@ -0,0 +1,81 @@
+# =========================================
+# Pruebas: límites de montos, tasas y plazos
+# Autora: Dra. Jazmín Sandoval
+# =========================================
+
+from decimal import Decimal
+
+import pytest
+
+from calculos import calcular_monto_maximo, calcular_pago_fijo_excel
+from validacion import (
+    MAX_VALORES_LISTA,
+    MONTO_MAXIMO,
+    PLAZO_MAXIMO,
+    TASA_MINIMA,
+    ErrorValidacion,
+    validar_lista,
+    validar_monto,
+    validar_periodo,
+    validar_plazo,
+    validar_tasa
+)
+
+
+def motivo(validar, *args, **kwargs):
+    with pytest.raises(ErrorValidacion) as error:
+        validar(*args, **kwargs)
+    return error.value.motivo
+
+
+def test_convierte_a_decimal_y_entero():
+    assert validar_monto("1500.50") == Decimal("1500.50")
+    assert validar_tasa(0.025) == Decimal("0.025")
+    assert validar_plazo("12") == 12
+    assert validar_periodo("3", 12) == 3
+
+
+@pytest.mark.parametrize("valor", ["abc", "", None, "NaN", "Infinity", float("inf")])
+def test_no_numeros(valor):
+    assert motivo(validar_monto, valor) == "no_numero"
+
+
+def test_monto():
+    assert motivo(validar_monto, 0) == "monto_fuera_de_rango"
+    assert motivo(validar_monto, -1) == "monto_fuera_de_rango"
+    assert motivo(validar_monto, MONTO_MAXIMO + 1) == "monto_fuera_de_rango"
+    assert validar_monto(0, permitir_cero=True) == 0
+    assert validar_monto(MONTO_MAXIMO) == MONTO_MAXIMO
+
+
+@pytest.mark.parametrize("tasa", [0, -0.01, "1e-20", TASA_MINIMA / 10, "1.01"])
+def test_tasa_fuera_de_rango(tasa):
+    assert motivo(validar_tasa, tasa) == "tasa_fuera_de_rango"
+
+
+def test_tasa_en_los_limites():
+    assert validar_tasa(TASA_MINIMA) == TASA_MINIMA
+    assert validar_tasa(1) == 1
+    assert validar_tasa(0, permitir_cero=True) == 0
+    assert motivo(validar_tasa, "1e-20", permitir_cero=True) == "tasa_fuera_de_rango"
+
+
+@pytest.mark.parametrize("calcular, valor", [(calcular_pago_fijo_excel, 1000), (calcular_monto_maximo, 100)])
+def test_tasa_diminuta_no_divide_entre_cero(calcular, valor):
+    assert motivo(calcular, valor, "1e-20", PLAZO_MAXIMO) == "tasa_fuera_de_rango"
+    assert calcular(valor, TASA_MINIMA, PLAZO_MAXIMO) > 0
+
+
+@pytest.mark.parametrize("plazo", [0, 1.5, "2.5", PLAZO_MAXIMO + 1])
+def test_plazo_fuera_de_rango(plazo):
+    assert motivo(validar_plazo, plazo) == "plazo_fuera_de_rango"
+
+
+def test_periodo_dentro_del_plazo():
+    assert motivo(validar_periodo, 13, 12) == "periodo_fuera_de_rango"
+    assert motivo(validar_periodo, 0, 12) == "periodo_fuera_de_rango"
+
+
+def test_lista():
+    assert validar_lista(["0.01", "0.02"], validar_tasa) == [Decimal("0.01"), Decimal("0.02")]
+    assert motivo(validar_lista, ["0.01"] * (MAX_VALORES_LISTA + 1), validar_tasa) == "demasiados_valores"
@@ -0,0 +1,103 @@
+# =========================================
+# Validación de datos y límites de cálculo
+# Autora: Dra. Jazmín Sandoval
+# Descripción: Límites de dominio para montos, tasas y plazos, para que
+# ningún dato (por error o a propósito) deje a un worker calculando sin fin
+# =========================================
+#
+# Cada validación regresa el valor ya convertido (Decimal o int) o lanza
+# ErrorValidacion, que trae un motivo corto (para las métricas) y un
+# mensaje listo para mostrarle a la persona.
+
+import os
+from decimal import Decimal, InvalidOperation
+
+MONTO_MAXIMO = Decimal(os.environ.get("MONTO_MAXIMO", "1000000000"))
+TASA_MINIMA = Decimal("0.000001")  # 0.0001% por periodo
+TASA_MAXIMA = Decimal("1")       # 100% por periodo
+PLAZO_MAXIMO = int(os.environ.get("PLAZO_MAXIMO", "1200"))
+MAX_VALORES_LISTA = 10           # Tasas o plazos separados por "/"
+
+
+class ErrorValidacion(ValueError):
+    def __init__(self, motivo, mensaje):
+        super().__init__(mensaje)
+        self.motivo = motivo
+        self.mensaje = mensaje
+
+
+def _numero(valor):
+    try:
+        numero = valor if isinstance(valor, Decimal) else Decimal(str(valor))
+    except InvalidOperation:
+        raise ErrorValidacion("no_numero", "Por favor escribe un número válido.")
+    if not numero.is_finite():
+        raise ErrorValidacion("no_numero", "Por favor escribe un número válido.")
+    return numero
+
+
+def validar_monto(valor, campo="La cantidad", permitir_cero=False):
+    monto = _numero(valor)
+    if permitir_cero:
+        if not 0 <= monto <= MONTO_MAXIMO:
+            raise ErrorValidacion(
+                "monto_fuera_de_rango", f"{campo} debe estar entre $0 y ${MONTO_MAXIMO:,}."
+            )
+    elif not 0 < monto <= MONTO_MAXIMO:
+        raise ErrorValidacion(
+            "monto_fuera_de_rango", f"{campo} debe ser mayor que $0 y de máximo ${MONTO_MAXIMO:,}."
+        )
+    return monto
+
+
+def validar_tasa(valor, permitir_cero=False):
+    # Con tasa cero o negativa las fórmulas de anualidad dividen entre
+    # cero; solo quien no las usa (deudas a meses sin intereses) acepta 0.
+    # Una tasa positiva pero diminuta también: con la precisión de los
+    # cálculos 1 + r queda en 1 y 1 - (1 + r)^-n en 0, por eso TASA_MINIMA
+    tasa = _numero(valor)
+    if permitir_cero and tasa == 0:
+        return tasa
+    if not TASA_MINIMA <= tasa <= TASA_MAXIMA:
+        raise ErrorValidacion(
+            "tasa_fuera_de_rango",
+            f"La tasa por periodo debe ser de al menos {TASA_MINIMA:f} y de máximo 1 (100%). "
+            "Ejemplo: 0.025 para 2.5%"
+        )
+    return tasa
+
+
+def validar_plazo(valor):
+    plazo = _numero(valor)
+    if plazo != plazo.to_integral_value() or not 1 <= plazo <= PLAZO_MAXIMO:
+        raise ErrorValidacion(
+            "plazo_fuera_de_rango", f"El número de pagos debe ser un entero entre 1 y {PLAZO_MAXIMO}."
+        )
+    return int(plazo)
+
+
+def validar_periodo(valor, plazo):
+    periodo = _numero(valor)
+    if periodo != periodo.to_integral_value() or not 1 <= periodo <= plazo:
+        raise ErrorValidacion(
+            "periodo_fuera_de_rango", f"El periodo debe ser un número entero entre 1 y {plazo}."
+        )
+    return int(periodo)
+
+
+def validar_lista(valores, validar):
+    if len(valores) > MAX_VALORES_LISTA:
+        raise ErrorValidacion(
+            "demasiados_valores", f"Puedes escribir hasta {MAX_VALORES_LISTA} valores separados por /."
+        )
+    return [validar(valor) for valor in valores]
+
+
+def validar_amortizacion(saldo, tasa, pago):
+    # Si el pago no cubre ni los intereses, el saldo nunca baja
+    if pago <= saldo * tasa:
+        raise ErrorValidacion(
+            "no_amortiza",
+            "Con esos datos el pago por periodo no alcanza a cubrir los intereses: "
+            "el crédito nunca se terminaría de pagar."
+        )